@@ -0,0 +1,78 @@
+import time
+from rate_limit import TokenBuckets
+from config import COMMAND_LIMITS, ADMISSION_NOTICE_SECONDS
+
+REJECT_MESSAGES = {
+    'duplicate': "⏳ Already working on that request.",
+    'rate': "🐢 Too many requests, please slow down.",
+    'busy': "🚦 The bot is busy, please try again in a moment.",
+}
+
+class AdmissionController:
+    """Decides whether a command may run now.
+
+    Commands belong to a class (see COMMAND_LIMITS). A request is rejected if
+    the same user already has an identical request in flight, if the class is
+    at its global concurrency cap, or if the user's token bucket for that
+    command is empty. Checks are O(1) and never wait.
+    """
+
+    def __init__(self, limits=COMMAND_LIMITS, notice_seconds=ADMISSION_NOTICE_SECONDS):
+        self.limits = limits
+        self.notice_seconds = notice_seconds
+        # Per class, keyed by (user_id, command)
+        self._buckets = {
+            name: TokenBuckets(limit['rate'], capacity=limit['burst']) for name, limit in limits.items()
+        }
+        self._running = {name: 0 for name in limits}
+        self._in_flight = set()
+        self._noticed = {}    # (user_id, command) -> monotonic time of the last rejection reply
+
+        self.admitted = {name: 0 for name in limits}
+        self.rejected = {name: {reason: 0 for reason in REJECT_MESSAGES} for name in limits}
+
+    def admit(self, command_class, user_id, command, args=()):
+        """Returns a ticket for release(), or the rejection reason as a string."""
+        request = (user_id, command, tuple(arg.upper() for arg in args))
+        limits = self.limits[command_class]
+
+        if request in self._in_flight:
+            reason = 'duplicate'
+        elif self._running[command_class] >= limits['concurrency']:
+            reason = 'busy'
+        elif not self._buckets[command_class].get((user_id, command)).try_acquire():
+            reason = 'rate'
+        else:
+            self._in_flight.add(request)
+            self._running[command_class] += 1
+            self.admitted[command_class] += 1
+            return (command_class, request)
+
+        self.rejected[command_class][reason] += 1
+        return reason
+
+    def release(self, ticket):
+        command_class, request = ticket
+        self._in_flight.discard(request)
+        self._running[command_class] -= 1
+
+    def should_notify(self, user_id, command):
+        """True if the user has not been told about a rejection of this command recently."""
+        key = (user_id, command)
+        now = time.monotonic()
+        if now - self._noticed.get(key, float('-inf')) < self.notice_seconds:
+            return False
+        if len(self._noticed) > 10000:
+            self._noticed = {k: t for k, t in self._noticed.items() if now - t < self.notice_seconds}
+        self._noticed[key] = now
+        return True
+
+    def stats(self):
+        return {
+            name: {
+                'running': self._running[name],
+                'admitted': self.admitted[name],
+                'rejected': dict(self.rejected[name])
+            }
+            for name in self.limits
+        }
@@ -0,0 +1,406 @@
+import asyncio
+import bisect
+import heapq
+import logging
+import math
+import threading
+import time
+from collections import deque, namedtuple
+
+_ANY_ID = float('inf')
+
+# Trigger options default to a one-shot price alarm, so plain 6-field rows still work
+Alarm = namedtuple(
+    'Alarm',
+    'id user_id symbol target_price condition platform recurring cooldown hysteresis move_window',
+    defaults=(False, 0, 0.0, None)
+)
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def parse_duration(text):
+    """Parses '90s', '30m', '1h' or '2d' into seconds."""
+    text = text.strip().lower()
+    if text[-1:] in DURATION_UNITS:
+        return int(float(text[:-1]) * DURATION_UNITS[text[-1]])
+    return int(text)
+
+def valid_target(value):
+    """Targets and move thresholds must be positive, finite numbers; a NaN would break the sort order."""
+    return isinstance(value, (int, float)) and math.isfinite(value) and value > 0
+
+def format_duration(seconds):
+    for unit in ('d', 'h', 'm'):
+        if seconds >= DURATION_UNITS[unit] and seconds % DURATION_UNITS[unit] == 0:
+            return f"{seconds // DURATION_UNITS[unit]}{unit}"
+    return f"{seconds}s"
+
+class MoveWindow:
+    """Rolling minimum and maximum price over the last `seconds` (monotonic deques, O(1) amortized)."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._min = deque()  # (timestamp, price), prices increasing
+        self._max = deque()  # (timestamp, price), prices decreasing
+
+    def update(self, price, now):
+        while self._min and self._min[-1][1] >= price:
+            self._min.pop()
+        self._min.append((now, price))
+        while self._max and self._max[-1][1] <= price:
+            self._max.pop()
+        self._max.append((now, price))
+
+        horizon = now - self.seconds
+        while self._min[0][0] < horizon:
+            self._min.popleft()
+        while self._max[0][0] < horizon:
+            self._max.popleft()
+
+    def change(self, price):
+        """Largest move (percent, signed) from the window's low or high to price."""
+        up = (price / self._min[0][1] - 1.0) * 100
+        down = (1.0 - price / self._max[0][1]) * 100
+        return up if up >= down else -down
+
+class AlarmIndex:
+    """In-memory index of active alarms, sorted by target price per symbol.
+
+    'above' alarms are kept in ascending target order and 'below' alarms in
+    descending order (stored as negated targets), so the alarms triggered by
+    a price are always a prefix found with one bisect: O(log n + hits).
+
+    Recurring alarms stay in the index. After firing they wait, sorted by
+    their re-arm level (the target moved back by the hysteresis band), until
+    the price crosses back; then they wait out their cooldown on a heap.
+    Percent-move alarms are sorted by threshold per (symbol, window) and
+    compared against the window's rolling low/high. Every step is a bisect
+    or a heap operation, so a tick stays O(log n + hits) with re-arming.
+    State changes of recurring alarms are collected for batched writes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._above = {}   # symbol -> [(target_price, alarm_id), ...] ascending
+        self._below = {}   # symbol -> [(-target_price, alarm_id), ...] ascending
+        self._alarms = {}  # alarm_id -> Alarm
+
+        self._rearm_above = {}  # symbol -> [(rearm_level, alarm_id), ...]; re-arms when price < level
+        self._rearm_below = {}  # symbol -> [(rearm_level, alarm_id), ...]; re-arms when price > level
+        self._next_eligible = {}  # alarm_id -> earliest re-trigger time of a parked alarm
+        self._cooling = []      # heap of (eligible_at, alarm_id); stale entries are skipped
+        self._cooling_at = {}   # alarm_id -> eligible_at of its live heap entry
+        self._moves = {}        # (symbol, window) -> [(threshold_pct, alarm_id), ...] armed move alarms
+        self._windows = {}      # symbol -> {window: [MoveWindow, number of move alarms using it]}
+        self._symbol_counts = {}
+        self._pending_state = {}  # alarm_id -> [armed, next_eligible_at, last_triggered_at, new triggers]
+
+    def __len__(self):
+        return len(self._alarms)
+
+    def __contains__(self, alarm_id):
+        return alarm_id in self._alarms
+
+    def _side(self, condition):
+        return self._above if condition == 'above' else self._below
+
+    @staticmethod
+    def _key(alarm_id, target_price, condition):
+        return (target_price if condition == 'above' else -target_price, alarm_id)
+
+    @staticmethod
+    def _rearm_level(alarm):
+        band = alarm.hysteresis / 100
+        return alarm.target_price * (1 - band if alarm.condition == 'above' else 1 + band)
+
+    def load(self, rows):
+        """Bulk-loads alarm rows (as returned by Database.get_all_active_alarms)."""
+        with self._lock:
+            self._reset()
+            self._load_rows(rows)
+
+    def extend(self, rows):
+        """Bulk-loads alarm rows on top of the current ones; alarms already indexed are skipped."""
+        with self._lock:
+            self._load_rows(row for row in rows if row[0] not in self._alarms)
+
+    def remove_symbols(self, symbols):
+        """Removes every alarm on the given symbols; returns how many there were."""
+        symbols = set(symbols)
+        with self._lock:
+            alarm_ids = [alarm.id for alarm in self._alarms.values() if alarm.symbol in symbols]
+        for alarm_id in alarm_ids:
+            self.remove(alarm_id)
+        return len(alarm_ids)
+
+    def _load_rows(self, rows):
+        # Callers hold the lock
+        now = time.time()
+        for row in rows:
+            alarm = Alarm(*row[:len(Alarm._fields)])
+            if not valid_target(alarm.target_price):
+                logging.warning(f"⚠️ Alarm {alarm.id} skipped: invalid target {alarm.target_price!r}")
+                continue
+            armed, next_eligible_at = row[len(Alarm._fields):len(Alarm._fields) + 2] or (1, 0)
+            self._register(alarm)
+            if not armed:
+                self._park(alarm, next_eligible_at or 0)
+            elif next_eligible_at and next_eligible_at > now:
+                self._cool(alarm.id, next_eligible_at)
+            elif alarm.condition == 'move':
+                key = (alarm.symbol, alarm.move_window)
+                self._moves.setdefault(key, []).append((alarm.target_price, alarm.id))
+            else:
+                self._side(alarm.condition).setdefault(alarm.symbol, []).append(
+                    self._key(alarm.id, alarm.target_price, alarm.condition)
+                )
+
+        for side in (self._above, self._below, self._moves, self._rearm_above, self._rearm_below):
+            for entries in side.values():
+                entries.sort()
+
+    def _reset(self):
+        for structure in (self._above, self._below, self._alarms, self._rearm_above, self._rearm_below,
+                          self._next_eligible, self._cooling_at, self._moves, self._windows,
+                          self._symbol_counts, self._pending_state):
+            structure.clear()
+        self._cooling = []
+
+    def add(self, alarm):
+        alarm = Alarm(*alarm[:len(Alarm._fields)])
+        if not valid_target(alarm.target_price):
+            logging.warning(f"⚠️ Alarm {alarm.id} skipped: invalid target {alarm.target_price!r}")
+            return
+        with self._lock:
+            if alarm.id in self._alarms:
+                return
+            self._register(alarm)
+            self._arm(alarm)
+
+    def _register(self, alarm):
+        self._alarms[alarm.id] = alarm
+        self._symbol_counts[alarm.symbol] = self._symbol_counts.get(alarm.symbol, 0) + 1
+        if alarm.condition == 'move':
+            windows = self._windows.setdefault(alarm.symbol, {})
+            windows.setdefault(alarm.move_window, [MoveWindow(alarm.move_window), 0])[1] += 1
+
+    def _unregister(self, alarm):
+        del self._alarms[alarm.id]
+        self._pending_state.pop(alarm.id, None)
+        self._cooling_at.pop(alarm.id, None)
+        self._next_eligible.pop(alarm.id, None)
+
+        self._symbol_counts[alarm.symbol] -= 1
+        if not self._symbol_counts[alarm.symbol]:
+            del self._symbol_counts[alarm.symbol]
+        if alarm.condition == 'move':
+            windows = self._windows[alarm.symbol]
+            windows[alarm.move_window][1] -= 1
+            if not windows[alarm.move_window][1]:
+                del windows[alarm.move_window]
+            if not windows:
+                del self._windows[alarm.symbol]
+
+    def _arm(self, alarm):
+        if alarm.condition == 'move':
+            key = (alarm.symbol, alarm.move_window)
+            bisect.insort(self._moves.setdefault(key, []), (alarm.target_price, alarm.id))
+        else:
+            bisect.insort(
+                self._side(alarm.condition).setdefault(alarm.symbol, []),
+                self._key(alarm.id, alarm.target_price, alarm.condition)
+            )
+
+    def _park(self, alarm, eligible_at):
+        """Waits for the price to cross back over the re-arm level."""
+        self._next_eligible[alarm.id] = eligible_at
+        side = self._rearm_above if alarm.condition == 'above' else self._rearm_below
+        bisect.insort(side.setdefault(alarm.symbol, []), (self._rearm_level(alarm), alarm.id))
+
+    def _cool(self, alarm_id, eligible_at):
+        self._cooling_at[alarm_id] = eligible_at
+        heapq.heappush(self._cooling, (eligible_at, alarm_id))
+
+    @staticmethod
+    def _discard(lists, name, key):
+        entries = lists.get(name, [])
+        i = bisect.bisect_left(entries, key)
+        if i < len(entries) and entries[i] == key:
+            del entries[i]
+        if not entries:
+            lists.pop(name, None)
+
+    def remove(self, alarm_id):
+        with self._lock:
+            alarm = self._alarms.get(alarm_id)
+            if alarm is None:
+                return None
+
+            if alarm.condition == 'move':
+                self._discard(self._moves, (alarm.symbol, alarm.move_window), (alarm.target_price, alarm_id))
+            else:
+                self._discard(self._side(alarm.condition), alarm.symbol,
+                              self._key(alarm_id, alarm.target_price, alarm.condition))
+                rearm = self._rearm_above if alarm.condition == 'above' else self._rearm_below
+                self._discard(rearm, alarm.symbol, (self._rearm_level(alarm), alarm_id))
+            self._unregister(alarm)
+            return alarm
+
+    def symbols(self):
+        with self._lock:
+            return set(self._symbol_counts)
+
+    def pop_triggered(self, symbol, price, now=None):
+        """Returns (alarm, move_pct) for every alarm on symbol the price triggers.
+
+        One-shot alarms are removed; recurring ones are disarmed and will re-arm
+        by themselves. move_pct is the signed window move for 'move' alarms and
+        None for price alarms.
+        """
+        now = time.time() if now is None else now
+        triggered = []
+        with self._lock:
+            self._release_cooled(now)
+            self._rearm_crossed(symbol, price, now)
+
+            for side, key in ((self._above, price), (self._below, -price)):
+                entries = side.get(symbol)
+                if not entries:
+                    continue
+
+                hits = bisect.bisect_right(entries, (key, _ANY_ID))
+                if not hits:
+                    continue
+
+                for _, alarm_id in entries[:hits]:
+                    triggered.append((self._fire(alarm_id, now), None))
+                del entries[:hits]
+                if not entries:
+                    del side[symbol]
+
+            for window, (tracker, _) in list(self._windows.get(symbol, {}).items()):
+                tracker.update(price, now)
+                entries = self._moves.get((symbol, window))
+                if not entries:
+                    continue
+
+                change = tracker.change(price)
+                hits = bisect.bisect_right(entries, (abs(change), _ANY_ID))
+                if not hits:
+                    continue
+
+                fired = entries[:hits]
+                del entries[:hits]
+                if not entries:
+                    del self._moves[(symbol, window)]
+                for _, alarm_id in fired:
+                    triggered.append((self._fire(alarm_id, now), change))
+
+        return triggered
+
+    def _fire(self, alarm_id, now):
+        alarm = self._alarms[alarm_id]
+        if not alarm.recurring:
+            self._unregister(alarm)
+            return alarm
+
+        state = self._pending_state.setdefault(alarm_id, [1, 0, None, 0])
+        state[2] = int(now)
+        state[3] += 1
+        if alarm.condition == 'move':
+            # A move stays inside its window for a while; never fire twice on it
+            eligible_at = int(now + max(alarm.cooldown, alarm.move_window))
+            self._cool(alarm_id, eligible_at)
+            state[0], state[1] = 1, eligible_at
+        else:
+            eligible_at = int(now + alarm.cooldown)
+            self._park(alarm, eligible_at)
+            state[0], state[1] = 0, eligible_at
+        return alarm
+
+    def _rearm_crossed(self, symbol, price, now):
+        crossed = []
+        entries = self._rearm_above.get(symbol)
+        if entries:
+            first = bisect.bisect_right(entries, (price, _ANY_ID))
+            crossed.extend(alarm_id for _, alarm_id in entries[first:])
+            del entries[first:]
+            if not entries:
+                del self._rearm_above[symbol]
+
+        entries = self._rearm_below.get(symbol)
+        if entries:
+            hits = bisect.bisect_left(entries, (price, -_ANY_ID))
+            crossed.extend(alarm_id for _, alarm_id in entries[:hits])
+            del entries[:hits]
+            if not entries:
+                del self._rearm_below[symbol]
+
+        for alarm_id in crossed:
+            eligible_at = self._next_eligible.pop(alarm_id)
+            state = self._pending_state.setdefault(alarm_id, [1, eligible_at, None, 0])
+            state[0], state[1] = 1, eligible_at
+            if eligible_at > now:
+                self._cool(alarm_id, eligible_at)
+            else:
+                self._arm(self._alarms[alarm_id])
+
+    def _release_cooled(self, now):
+        while self._cooling and self._cooling[0][0] <= now:
+            eligible_at, alarm_id = heapq.heappop(self._cooling)
+            if self._cooling_at.get(alarm_id) != eligible_at:
+                continue  # removed or re-queued since
+            del self._cooling_at[alarm_id]
+            self._arm(self._alarms[alarm_id])
+
+    def drain_state_changes(self):
+        """Returns (armed, next_eligible_at, last_triggered_at, new_triggers, alarm_id) rows changed since the last call."""
+        with self._lock:
+            rows = [(*state, alarm_id) for alarm_id, state in self._pending_state.items()]
+            self._pending_state.clear()
+        return rows
+
+class AlarmSync:
+    """Keeps an index in step with alarms that another process adds and deletes.
+
+    Used when alarms are evaluated in a different process than the one taking
+    commands (main.py --role alarms). Each poll reads the rows whose changed_at
+    is at or after the last second seen, skipping the ones already applied in
+    that second.
+    """
+
+    def __init__(self, db, index, interval):
+        self.db = db
+        self.index = index
+        self.interval = interval
+        # Everything before now is covered by the index's initial load
+        self.since = int(time.time())
+        self._seen = set()  # (id, active) applied with changed_at == since
+        self.applied = 0
+
+    async def sync(self):
+        applied = 0
+        for row in await self.db.run(self.db.get_alarm_changes, self.since):
+            *alarm, active, changed_at = row
+            if changed_at == self.since and (alarm[0], active) in self._seen:
+                continue
+            if changed_at > self.since:
+                self.since = changed_at
+                self._seen = set()
+            self._seen.add((alarm[0], active))
+
+            if active:
+                self.index.add(alarm)
+            else:
+                self.index.remove(alarm[0])
+            applied += 1
+        self.applied += applied
+        return applied
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logging.error(f"🚫 Alarm sync error: {e}")
@@ -1,14 +1,109 @@
-import requests
+import asyncio
+import logging
+import time
+import httpx
+from config import PRICE_CACHE_TTL
+from price_providers import ProviderRouter, build_providers
 
 class APIHandler:
-    def get_price(self, symbol):
+    """Price client over the configured providers, with a shared per-symbol TTL cache.
+
+    Concurrent requests for a symbol that is not cached share one in-flight
+    HTTP call instead of each making their own. Prices seen elsewhere (the
+    price stream, the scheduler) can be pushed in with update_prices().
+    """
+
+    def __init__(self, timeout=10.0, cache_ttl=PRICE_CACHE_TTL, providers=None):
+        # One pooled keep-alive client shared by the scheduler and the bot handlers
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+        )
+        self.router = ProviderRouter(providers if providers is not None else build_providers(self.client))
+        self.cache_ttl = cache_ttl
+        self._cache = {}      # symbol -> (price, monotonic time it was seen)
+        self._in_flight = {}  # symbol -> future of the fetch that covers it
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.requests = 0
+
+    async def get_price(self, symbol):
+        return (await self.get_prices([symbol])).get(symbol)
+
+    async def get_prices(self, symbols, max_age=None):
+        """Returns prices for the given symbols, fetching only those not cached within max_age seconds."""
+        max_age = self.cache_ttl if max_age is None else max_age
+        now = time.monotonic()
+        prices = {}
+        waiting = {}
+        missing = []
+
+        for symbol in sorted(set(symbols)):
+            cached = self._cache.get(symbol)
+            if cached is not None and now - cached[1] <= max_age:
+                prices[symbol] = cached[0]
+                self.hits += 1
+            elif symbol in self._in_flight:
+                waiting[symbol] = self._in_flight[symbol]
+                self.coalesced += 1
+            else:
+                missing.append(symbol)
+                self.misses += 1
+
+        if missing:
+            prices.update(await self._fetch_shared(missing))
+
+        for symbol, future in waiting.items():
+            price = (await asyncio.shield(future)).get(symbol)
+            if price is not None:
+                prices[symbol] = price
+
+        return prices
+
+    async def _fetch_shared(self, symbols):
+        future = asyncio.get_running_loop().create_future()
+        for symbol in symbols:
+            self._in_flight[symbol] = future
+
+        fetched = {}
         try:
-            # Binance sembolü doğrudan API ile uyumlu (örneğin: BTCUSDT)
-            url = f"https://api.binance.com/api/v3/ticker/price?symbol={symbol}"
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            return float(data['price'])
-        except Exception as e:
-            print(f"Binance price not found: {e}")
-            return None
+            fetched = await self._fetch(symbols)
+            self.update_prices(fetched)
+        finally:
+            # Waiters always get an answer, even if this caller was cancelled
+            future.set_result(fetched)
+            for symbol in symbols:
+                if self._in_flight.get(symbol) is future:
+                    del self._in_flight[symbol]
+        return fetched
+
+    async def _fetch(self, symbols):
+        """Fetches a price snapshot for all given symbols from the fastest healthy provider."""
+        self.requests += 1
+        prices = await self.router.fetch(symbols)
+        if not prices:
+            logging.warning(f"⚠️ Prices not found for {', '.join(symbols)}")
+        return prices
+
+    def update_prices(self, prices):
+        """Stores prices observed elsewhere (stream ticks, scheduler polls) in the cache."""
+        now = time.monotonic()
+        for symbol, price in prices.items():
+            self._cache[symbol] = (price, now)
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'cached_symbols': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'requests': self.requests,
+            'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            **self.router.stats()
+        }
+
+    async def close(self):
+        await self.client.aclose()
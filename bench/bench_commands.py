@@ -0,0 +1,219 @@
+"""
+Command latency benchmark.
+
+Runs the /alarm, /alarms, /delete_alarm and /price handlers (with admission
+control, as registered on the Application) against a temporary database
+holding N alarms, while a background writer plays the scheduler: batched
+price_data flushes and alarm deactivations. Commands arrive on a fixed
+schedule (--rate per second) and their latency is counted from the moment
+they were due, so time spent waiting for a blocked event loop is included.
+Replies go to a recording stub.
+
+Each run is done twice: with Database.run on its dedicated thread (the
+bot's behaviour) and with every query executed inline on the event loop,
+which is how handlers used to reach SQLite. Reported per mode: handler
+latency percentiles per command, and event loop lag (how late a 10 ms timer
+fires), which is what update polling and the alarm loop feel.
+
+    python bench/bench_commands.py --alarms 100000 --commands 2000 --json results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:bench')
+
+SYMBOLS = ["BTCUSDT", "ETHUSDT", "ADAUSDT", "BNBUSDT", "XRPUSDT"] + [f"SYN{i:03d}USDT" for i in range(45)]
+
+class Message:
+    def __init__(self):
+        self.replies = 0
+
+    async def reply_text(self, text, **kwargs):
+        self.replies += 1
+
+def command(user_id, args):
+    update = SimpleNamespace(effective_chat=SimpleNamespace(id=user_id), message=Message())
+    return update, SimpleNamespace(args=args)
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def summary(seconds):
+    return {
+        'count': len(seconds),
+        'p50_ms': round(percentile(seconds, 50) * 1000, 3),
+        'p95_ms': round(percentile(seconds, 95) * 1000, 3),
+        'p99_ms': round(percentile(seconds, 99) * 1000, 3),
+        'max_ms': round(max(seconds) * 1000, 3)
+    }
+
+def populate(db, alarms, users, rng):
+    now = int(time.time())
+    db.conn.executemany(
+        "INSERT INTO alarms (user_id, symbol, target_price, condition, changed_at) VALUES (?, ?, ?, ?, ?)",
+        ((rng.randint(1, users), rng.choice(SYMBOLS), rng.uniform(1, 100000), rng.choice(("above", "below")), now)
+         for _ in range(alarms))
+    )
+    db.conn.commit()
+
+async def background_writes(db, stop, args, rng):
+    """Scheduler-like write load: one price flush and one batch of deactivations per cycle."""
+    cycles = 0
+    while not stop.is_set():
+        now = time.time()
+        rows = [(rng.choice(SYMBOLS), rng.uniform(1, 100000), now) for _ in range(args.flush_rows)]
+        await db.run(db.add_price_data_many, rows)
+        await db.run(db.deactivate_alarms, [rng.randint(1, args.alarms) for _ in range(args.deactivate)])
+        cycles += 1
+        await asyncio.sleep(args.write_interval)
+    return cycles
+
+async def loop_lag(stop, lags, interval=0.01):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+
+async def run_mode(args, inline):
+    from alarm_index import AlarmIndex
+    from api_handler import APIHandler
+    from bot_telegram import TelegramBot
+    from database import Database
+    from price_providers import StubProvider
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        db = Database(os.path.join(workdir, "bench.db"))
+        populate(db, args.alarms, args.users, rng)
+        if inline:
+            # Queries straight on the event loop, as before the database thread
+            async def run_inline(func, *a, **kw):
+                return func(*a, **kw)
+            db.run = run_inline
+
+        index = AlarmIndex()
+        index.load(db.get_all_active_alarms())
+        api = APIHandler(providers=[StubProvider({symbol: 100.0 for symbol in SYMBOLS})])
+        bot = TelegramBot(alarm_index=index, api=api, db=db)
+        handlers = {
+            'alarm': bot.admitted("light", "alarm", bot.set_alarm),
+            'alarms': bot.admitted("light", "alarms", bot.list_alarms),
+            'delete_alarm': bot.admitted("light", "delete_alarm", bot.delete_alarm),
+            'price': bot.admitted("light", "price", bot.get_price),
+        }
+
+        stop = asyncio.Event()
+        lags = []
+        writer = asyncio.create_task(background_writes(db, stop, args, rng))
+        lag_task = asyncio.create_task(loop_lag(stop, lags))
+
+        latencies = {name: [] for name in handlers}
+        loop = asyncio.get_running_loop()
+        begin = loop.time()
+
+        async def one(i):
+            due = begin + i / args.rate
+            await asyncio.sleep(due - loop.time())
+            # Distinct users, so per-user rate limits never reject
+            user_id = args.users + i
+            name = rng.choice(list(handlers))
+            if name == 'alarm':
+                cmd_args = [rng.choice(SYMBOLS), f"{rng.uniform(1, 100000):.2f}", rng.choice(("above", "below"))]
+            elif name == 'delete_alarm':
+                cmd_args = [str(rng.randint(1, args.alarms))]
+            elif name == 'price':
+                cmd_args = [rng.choice(SYMBOLS)]
+            else:
+                cmd_args = []
+                user_id = rng.randint(1, args.users)
+            update, context = command(user_id, cmd_args)
+            await handlers[name](update, context)
+            latencies[name].append(loop.time() - due)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.commands)))
+        elapsed = time.perf_counter() - started
+
+        stop.set()
+        cycles = await writer
+        await lag_task
+        await api.close()
+        db.close()
+
+    everything = [value for values in latencies.values() for value in values]
+    return {
+        'database_calls': 'inline' if inline else 'thread',
+        'commands_per_second': round(args.commands / elapsed, 1),
+        'write_cycles': cycles,
+        'all': summary(everything),
+        'commands': {name: summary(values) for name, values in latencies.items() if values},
+        'loop_lag': summary(lags)
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--alarms", type=int, default=100000, help="alarms in the database")
+    parser.add_argument("--users", type=int, default=5000, help="users owning them")
+    parser.add_argument("--commands", type=int, default=2000, help="commands to run per mode")
+    parser.add_argument("--rate", type=float, default=500, help="commands arriving per second")
+    parser.add_argument("--flush-rows", type=int, default=5000, help="price rows per background flush")
+    parser.add_argument("--deactivate", type=int, default=200, help="alarms deactivated per background cycle")
+    parser.add_argument("--write-interval", type=float, default=0.05, help="seconds between background cycles")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the results here ('-' for stdout)")
+    args = parser.parse_args()
+
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+
+    results = [asyncio.run(run_mode(args, inline)) for inline in (True, False)]
+    report = {
+        'benchmark': 'commands',
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'settings': {key: value for key, value in vars(args).items() if key != 'json'},
+        'results': results
+    }
+    if args.json == '-':
+        print(json.dumps(report, indent=2))
+        return
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{'queries':>8}{'cmd/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'lag p99 ms':>12}{'lag max ms':>12}")
+    for r in results:
+        print(
+            f"{r['database_calls']:>8}{r['commands_per_second']:>9}{r['all']['p50_ms']:>9}{r['all']['p99_ms']:>9}"
+            f"{r['all']['max_ms']:>9}{r['loop_lag']['p99_ms']:>12}{r['loop_lag']['max_ms']:>12}"
+        )
+    for r in results:
+        for name, stats in r['commands'].items():
+            print(f"  {r['database_calls']:>6} /{name:<13} p50 {stats['p50_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms")
+
+if __name__ == "__main__":
+    main()
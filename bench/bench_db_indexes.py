@@ -0,0 +1,103 @@
+"""
+Index benchmark for the alarms and price_data tables.
+
+Populates a temporary database with N alarms and N price rows, then runs the
+bot's hot queries with the migration indexes dropped and again with them in
+place, printing query plans and timings.
+
+    python bench/bench_db_indexes.py --rows 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, _migration_alarm_indexes  # noqa: E402
+
+SYMBOLS = [f"SYM{i}USDT" for i in range(200)]
+INDEXES = ["idx_alarms_active_symbol", "idx_alarms_active_user", "idx_price_data_symbol_time"]
+
+def populate(db, rows):
+    rng = random.Random(42)
+    now = int(time.time())
+    c = db.conn.cursor()
+
+    c.executemany(
+        "INSERT INTO alarms (user_id, symbol, target_price, condition, active) VALUES (?, ?, ?, ?, ?)",
+        (
+            (rng.randrange(rows // 10 or 1), rng.choice(SYMBOLS), rng.uniform(1, 100000),
+             rng.choice(("above", "below")), 1 if rng.random() < 0.2 else 0)
+            for _ in range(rows)
+        )
+    )
+    c.executemany(
+        "INSERT INTO price_data (symbol, price, timestamp) VALUES (?, ?, ?)",
+        ((rng.choice(SYMBOLS), rng.uniform(1, 100000), now - rng.randrange(86400 * 30)) for _ in range(rows))
+    )
+    db.conn.commit()
+    c.execute("ANALYZE")
+
+def queries(rows):
+    now = int(time.time())
+    return {
+        "active alarms for a user": (
+            "SELECT id, symbol, target_price, condition FROM alarms WHERE user_id = ? AND active = 1",
+            (rows // 20,)
+        ),
+        "active 'above' alarms hit by a price": (
+            "SELECT id FROM alarms WHERE symbol = ? AND condition = 'above' AND target_price <= ? AND active = 1",
+            (SYMBOLS[0], 5000.0)
+        ),
+        "one day of a symbol's prices": (
+            "SELECT timestamp, price FROM price_data WHERE symbol = ? AND timestamp >= ? AND timestamp < ? "
+            "ORDER BY timestamp",
+            (SYMBOLS[0], now - 86400 * 2, now - 86400)
+        ),
+    }
+
+def measure(db, rows, repeat):
+    results = {}
+    for name, (sql, params) in queries(rows).items():
+        plan = " | ".join(row[3] for row in db.conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+        started = time.perf_counter()
+        for _ in range(repeat):
+            db.conn.execute(sql, params).fetchall()
+        results[name] = (plan, (time.perf_counter() - started) / repeat * 1000)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+
+        started = time.perf_counter()
+        populate(db, args.rows)
+        print(f"Populated {args.rows:,} alarms and {args.rows:,} price rows in {time.perf_counter() - started:.1f}s\n")
+
+        for index in INDEXES:
+            db.conn.execute(f"DROP INDEX {index}")
+        before = measure(db, args.rows, args.repeat)
+
+        _migration_alarm_indexes(db.conn.cursor())
+        db.conn.execute("CREATE INDEX idx_price_data_symbol_time ON price_data (symbol, timestamp)")
+        db.conn.execute("ANALYZE")
+        after = measure(db, args.rows, args.repeat)
+
+        for name in before:
+            print(name)
+            print(f"  without indexes: {before[name][1]:9.3f} ms  {before[name][0]}")
+            print(f"  with indexes:    {after[name][1]:9.3f} ms  {after[name][0]}")
+
+        db.close()
+
+if __name__ == "__main__":
+    main()
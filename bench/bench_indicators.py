@@ -0,0 +1,82 @@
+"""
+Indicator benchmark.
+
+Times the vectorized functions in indicators.py against the Python loops that
+/performance and /predict used before, over many symbols at once. Their
+results are checked against those loops and pandas in tests/test_indicators.py.
+
+    python bench/bench_indicators.py --symbols 500 --bars 365
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import indicators  # noqa: E402
+
+def legacy_moving_averages(prices):
+    ma_7 = sum(prices[-7:]) / 7
+    ma_14 = sum(prices[-14:]) / 14
+    ma_30 = sum(prices) / len(prices)
+    return ma_7, ma_14, ma_30
+
+def legacy_volatility(prices):
+    returns = [prices[i] / prices[i - 1] - 1 for i in range(1, len(prices))]
+    mean = sum(returns) / len(returns)
+    return (sum((r - mean) ** 2 for r in returns) / (len(returns) - 1)) ** 0.5
+
+def legacy_rsi(prices):
+    # The old /performance RSI: plain averages of the last 14 gains/losses
+    recent = prices[-15:]
+    gains, losses = [], []
+    for i in range(1, len(recent)):
+        change = recent[i] - recent[i - 1]
+        gains.append(max(change, 0))
+        losses.append(max(-change, 0))
+    avg_gain = sum(gains) / len(gains)
+    avg_loss = sum(losses) / len(losses)
+    return 100.0 if avg_loss == 0 else 100 - 100 / (1 + avg_gain / avg_loss)
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--bars", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    closes = 100 * np.cumprod(1 + rng.normal(0, 0.02, size=(args.symbols, args.bars)), axis=1)
+    rows = [list(row) for row in closes]
+
+    def legacy():
+        for prices in rows:
+            legacy_moving_averages(prices)
+            legacy_volatility(prices)
+            legacy_rsi(prices)
+
+    def vectorized():
+        indicators.sma(closes, 7)
+        indicators.sma(closes, 14)
+        indicators.sma(closes, 30)
+        indicators.volatility(closes)
+        indicators.rsi(closes, 14)
+
+    legacy_ms = timed(legacy, args.repeat)
+    vectorized_ms = timed(vectorized, args.repeat)
+    print(f"{args.symbols} symbols x {args.bars} bars")
+    print(f"  legacy loops: {legacy_ms:9.2f} ms")
+    print(f"  vectorized:   {vectorized_ms:9.2f} ms  ({legacy_ms / vectorized_ms:.1f}x)")
+
+if __name__ == "__main__":
+    main()
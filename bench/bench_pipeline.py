@@ -0,0 +1,363 @@
+"""
+Replay benchmark for the alarm pipeline.
+
+Generates a synthetic alarm population in a temporary SQLite database and
+replays a price stream through the real code paths: AlarmScheduler.check_alarms
+fetches every tick through APIHandler from a fake Binance server, evaluates
+the AlarmIndex, writes price rows and alarm state through Database, and
+NotificationDispatcher delivers the messages with python-telegram-bot to a
+fake Telegram server. Nothing leaves 127.0.0.1.
+
+The price stream is a random walk per symbol, or the price_data table of an
+existing database (--replay), bucketed into ticks. Every population size
+runs in its own interpreter, so peak RSS is per size.
+
+Reported per size: alarms checked per second, ticks per second, triggers,
+trigger-to-notification latency percentiles (from the start of the tick that
+triggered the alarm to the fake Telegram receiving the message), database
+time and rows per second per operation, and peak RSS.
+
+    python bench/bench_pipeline.py --alarms 10000 100000 1000000 --json results.json
+
+Notification rate limits default far above Telegram's so the pipeline, not
+the limiter, is measured; pass --notify-rate/--chat-rate to use real ones.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def universe(count):
+    from config import SUPPORTED_CRYPTO
+    symbols = list(SUPPORTED_CRYPTO)
+    symbols += [f"SYN{i:04d}USDT" for i in range(max(0, count - len(symbols)))]
+    return symbols[:count]
+
+def synthetic_stream(symbols, ticks, volatility, seed):
+    rng = random.Random(seed)
+    prices = {symbol: rng.uniform(1, 50000) for symbol in symbols}
+    stream = [dict(prices)]
+    for _ in range(ticks - 1):
+        prices = {symbol: price * (1 + rng.gauss(0, volatility)) for symbol, price in prices.items()}
+        stream.append(prices)
+    return stream
+
+def recorded_stream(path, bucket_seconds, ticks):
+    """Ticks of {symbol: last price} from a price_data table, `bucket_seconds` apart."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    rows = conn.execute("SELECT symbol, price, timestamp FROM price_data ORDER BY timestamp, id").fetchall()
+    conn.close()
+
+    stream, current, bucket = [], {}, None
+    for symbol, price, timestamp in rows:
+        if isinstance(timestamp, str):
+            # Rows from before the schema used epoch seconds
+            timestamp = datetime.fromisoformat(timestamp).timestamp()
+        key = int(timestamp) // bucket_seconds
+        if bucket is not None and key != bucket:
+            stream.append(dict(current))
+        bucket = key
+        current[symbol] = price
+    if current:
+        stream.append(dict(current))
+    return stream[:ticks] if ticks else stream
+
+def populate(db, count, base_prices, users, seed):
+    """Inserts `count` alarms: mostly one-shot price alarms within ±5%, some recurring and move alarms."""
+    rng = random.Random(seed)
+    symbols = list(base_prices)
+    now = int(time.time())
+    rows = []
+    for _ in range(count):
+        symbol = rng.choice(symbols)
+        user_id = rng.randint(1, users)
+        kind = rng.random()
+        if kind < 0.05:
+            rows.append((user_id, symbol, rng.uniform(0.2, 2.0), 'move', 1, 300, 0.0, 3600, now))
+            continue
+        target = base_prices[symbol] * (1 + rng.choice((-1, 1)) * rng.uniform(0.0005, 0.05))
+        condition = 'above' if target > base_prices[symbol] else 'below'
+        if kind < 0.15:
+            rows.append((user_id, symbol, target, condition, 1, 60, 0.005, None, now))
+        else:
+            rows.append((user_id, symbol, target, condition, 0, 0, 0.0, None, now))
+
+    db.conn.executemany(
+        "INSERT INTO alarms (user_id, symbol, target_price, condition, recurring, cooldown, hysteresis, "
+        "move_window, changed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    db.conn.commit()
+
+class MarkedSender:
+    """Stands in for TelegramBot: tags each message with a sequence number before queueing it."""
+
+    def __init__(self, notifier):
+        self.notifier = notifier
+        self.tick_started = 0.0
+        self.started = {}  # sequence -> perf_counter() at the start of the triggering tick
+
+    async def send_notification(self, user_id, message):
+        seq = len(self.started)
+        self.started[seq] = self.tick_started
+        self.notifier.submit(user_id, f"{message}\n#{seq}")
+
+async def run_single(args):
+    binance_port, telegram_port = free_port(), free_port()
+    os.environ.update({
+        'PRICE_PROVIDERS': 'binance',
+        'BINANCE_API_URL': f"http://127.0.0.1:{binance_port}",
+        'TELEGRAM_BOT_TOKEN': '123456:bench',
+    })
+
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+    from alarm_index import AlarmIndex
+    from api_handler import APIHandler
+    from config import PRICE_FLUSH_MAX_ROWS
+    from database import CALL_SECONDS, Database
+    from fake_services import FakeBinance, FakeTelegram
+    from indicator_state import IndicatorBook
+    from notifier import NotificationDispatcher
+    from price_recorder import PriceRecorder
+    from scheduler import AlarmScheduler
+
+    if args.replay:
+        stream = recorded_stream(args.replay, args.replay_bucket, args.ticks)
+    else:
+        stream = synthetic_stream(universe(args.symbols), args.ticks, args.volatility, args.seed)
+    if not stream:
+        raise SystemExit("The price stream is empty")
+
+    binance, telegram = FakeBinance(), FakeTelegram()
+    await binance.start(binance_port)
+    await telegram.start(telegram_port)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db = Database(os.path.join(workdir, "bench.db"))
+        started = time.perf_counter()
+        populate(db, args.alarms_single, stream[0], args.users, args.seed)
+        populate_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index = AlarmIndex()
+        index.load(db.get_all_active_alarms())
+        load_seconds = time.perf_counter() - started
+        rss_loaded = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        # Same connection pool as the Application-built bot in production
+        bot = Bot(
+            '123456:bench', base_url=f"http://127.0.0.1:{telegram_port}/bot",
+            request=HTTPXRequest(connection_pool_size=256)
+        )
+        await bot.initialize()
+        notifier = NotificationDispatcher(
+            bot, rate=args.notify_rate, per_chat_rate=args.chat_rate, digest_window=args.digest_window
+        )
+        sender = MarkedSender(notifier)
+        api = APIHandler(cache_ttl=0)
+        scheduler = AlarmScheduler(
+            telegram_bot=sender, alarm_index=index, api=api, db=db, indicator_book=IndicatorBook()
+        )
+        await notifier.start()
+        scheduler.price_recorder.start()
+
+        tick_seconds = []
+        checked = 0
+        for prices in stream:
+            binance.prices.update(prices)
+            checked += len(index)
+            sender.tick_started = time.perf_counter()
+            await scheduler.check_alarms()
+            tick_seconds.append(time.perf_counter() - sender.tick_started)
+            if args.tick_interval:
+                await asyncio.sleep(max(0.0, args.tick_interval - tick_seconds[-1]))
+
+        await scheduler.stop_scheduler()
+        try:
+            await asyncio.wait_for(notifier.drain(), args.drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        await notifier.stop(timeout=1)
+        await api.close()
+        await bot.shutdown()
+
+        # The live recorder keeps one row per symbol per second, which a fast
+        # replay mostly collapses, so write throughput is measured separately
+        # with the whole stream, one row per symbol per minute
+        recorder = PriceRecorder(db, max_rows=PRICE_FLUSH_MAX_ROWS, interval=3600)
+        base = int(time.time()) - len(stream) * 60
+        write_started = time.perf_counter()
+        for tick, prices in enumerate(stream):
+            for symbol, price in prices.items():
+                recorder.record(symbol, price, base + tick * 60)
+            await asyncio.sleep(0)
+        await recorder.flush()
+        write_seconds = time.perf_counter() - write_started
+
+        latencies = [
+            (received - sender.started[seq]) * 1000
+            for seq, received in telegram.received.items() if seq in sender.started
+        ]
+        db_ops = {
+            values[0]: {
+                'calls': child.count,
+                'seconds': round(child.sum, 4),
+                'mean_ms': round(child.sum / child.count * 1000, 3) if child.count else None
+            }
+            for values, child in CALL_SECONDS._children.items() if child.count
+        }
+        db.close()
+
+    await binance.stop()
+    await telegram.stop()
+
+    total = sum(tick_seconds)
+    return {
+        'alarms': args.alarms_single,
+        'symbols': len(stream[0]),
+        'ticks': len(stream),
+        'populate_seconds': round(populate_seconds, 3),
+        'index_load_seconds': round(load_seconds, 3),
+        'alarms_checked_per_second': round(checked / total) if total else None,
+        'ticks_per_second': round(len(stream) / total, 2) if total else None,
+        'tick_ms': {
+            'p50': round(percentile(tick_seconds, 50) * 1000, 2),
+            'p99': round(percentile(tick_seconds, 99) * 1000, 2),
+            'max': round(max(tick_seconds) * 1000, 2)
+        },
+        'triggers': len(sender.started),
+        'notifications_delivered': len(latencies),
+        'notifications_pending': len(sender.started) - len(latencies),
+        'notifications_per_second': _round(
+            len(latencies) / (max(telegram.received.values()) - min(sender.started.values()))
+            if latencies else None
+        ),
+        'telegram_messages': telegram.messages,
+        'binance_requests': binance.requests,
+        'notification_latency_ms': {
+            'p50': _round(percentile(latencies, 50)),
+            'p90': _round(percentile(latencies, 90)),
+            'p99': _round(percentile(latencies, 99)),
+            'max': _round(max(latencies) if latencies else None),
+            'mean': _round(statistics.fmean(latencies) if latencies else None)
+        },
+        'db': {
+            'price_rows_recorded_live': scheduler.price_recorder.rows_written,
+            'price_rows_written': recorder.rows_written,
+            'price_rows_per_second': round(recorder.rows_written / write_seconds) if write_seconds else None,
+            'operations': db_ops
+        },
+        'rss_mb': {
+            'after_load': round(rss_loaded, 1),
+            'peak': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        }
+    }
+
+def _round(value, digits=2):
+    return round(value, digits) if value is not None else None
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_table(results):
+    print(f"{'alarms':>9}{'checked/s':>14}{'ticks/s':>9}{'triggers':>10}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'db rows/s':>11}{'load s':>8}{'peak RSS':>10}")
+    for r in results:
+        latency = r['notification_latency_ms']
+        print(
+            f"{r['alarms']:>9}{r['alarms_checked_per_second'] or 0:>14,}{r['ticks_per_second'] or 0:>9}"
+            f"{r['triggers']:>10}{latency['p50'] or 0:>9}{latency['p99'] or 0:>9}"
+            f"{r['db']['price_rows_per_second'] or 0:>11,}{r['index_load_seconds']:>8}{r['rss_mb']['peak']:>7} MB"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--alarms", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="alarm population sizes, one run each")
+    parser.add_argument("--symbols", type=int, default=50, help="symbols in the synthetic universe")
+    parser.add_argument("--users", type=int, default=20000, help="distinct users owning the alarms")
+    parser.add_argument("--ticks", type=int, default=30, help="price ticks to replay")
+    parser.add_argument("--tick-interval", type=float, default=0.0,
+                        help="seconds from one tick to the next (0 replays back to back)")
+    parser.add_argument("--volatility", type=float, default=0.0005, help="per-tick stddev of synthetic returns")
+    parser.add_argument("--replay", help="replay price_data from this SQLite database instead")
+    parser.add_argument("--replay-bucket", type=int, default=300, help="seconds of recorded prices per tick")
+    parser.add_argument("--notify-rate", type=float, default=10000, help="global messages/s")
+    parser.add_argument("--chat-rate", type=float, default=1000, help="messages/s per chat")
+    parser.add_argument("--digest-window", type=float, default=0.0, help="seconds to coalesce per chat")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="seconds to wait for queued messages")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the results here ('-' for stdout)")
+    parser.add_argument("--alarms-single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.alarms_single is not None:
+        # Child run: one population size, result as JSON on stdout
+        import logging
+        logging.basicConfig(level=logging.WARNING)
+        print(json.dumps(asyncio.run(run_single(args))))
+        return
+
+    child_args = sys.argv[1:]
+    results = []
+    for count in args.alarms:
+        print(f"Running {count} alarms...", file=sys.stderr)
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *child_args, "--alarms-single", str(count)],
+            capture_output=True, text=True
+        )
+        if output.returncode:
+            sys.stderr.write(output.stderr)
+            raise SystemExit(f"Run with {count} alarms failed")
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    report = {
+        'benchmark': 'alarm_pipeline',
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('json', 'alarms_single')},
+        'results': results
+    }
+    if args.json == '-':
+        print(json.dumps(report, indent=2))
+        return
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    print_table(results)
+
+if __name__ == "__main__":
+    main()
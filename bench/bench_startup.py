@@ -0,0 +1,114 @@
+"""
+Startup time and memory benchmark.
+
+Starts a fresh interpreter per scenario (python -X importtime), imports main,
+builds the services for a --role and reports wall time, peak RSS, the
+heaviest top-level imports and which analytics/charting libraries got
+loaded. The "eager" scenario also imports what /chart, /performance and
+/predict need, i.e. the cost that is now paid on their first use.
+
+Runs in a temporary directory so the database and log file it creates do
+not touch the working copy; no network access is needed.
+
+    python bench/bench_startup.py --repeat 3 --top 8
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+HEAVY_MODULES = ("numpy", "pandas", "yfinance", "matplotlib", "aiohttp")
+
+SCENARIO = """
+import json, resource, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+bot = main.CryptoAlarmBot(role={role!r})
+bot.setup()
+ready = time.perf_counter()
+if {eager!r}:
+    import candle_store, indicators
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+done = time.perf_counter()
+bot.db.close()
+print(json.dumps({{
+    'import_s': imported - started,
+    'setup_s': ready - imported,
+    'total_s': done - started,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'loaded': [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+def parse_importtime(stderr, top):
+    """Imports made by the scenario and by main itself, by cumulative microseconds."""
+    totals = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented two spaces per level under the module that pulled them in
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth > 1 or not cumulative.strip().isdigit() or name.strip() == "main":
+            continue
+        totals.append((int(cumulative), name.strip()))
+    return [{'module': name, 'ms': round(us / 1000, 1)} for us, name in sorted(totals, reverse=True)[:top]]
+
+def run_scenario(role, eager, workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT, TELEGRAM_BOT_TOKEN="123456:benchmark", SCHEDULER_WORKERS="0")
+    code = SCENARIO.format(role=role, eager=eager, heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario; the median is reported")
+    parser.add_argument("--top", type=int, default=8, help="heaviest top-level imports to list")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    scenarios = [(role, False) for role in ("alarms", "commands", "all")] + [("all", True)]
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for role, eager in scenarios:
+            runs = [run_scenario(role, eager, workdir) for _ in range(args.repeat)]
+            samples = [sample for sample, _ in runs]
+            results.append({
+                'scenario': f"{role}{' + eager analytics' if eager else ''}",
+                'import_s': statistics.median(s['import_s'] for s in samples),
+                'setup_s': statistics.median(s['setup_s'] for s in samples),
+                'total_s': statistics.median(s['total_s'] for s in samples),
+                'rss_mb': statistics.median(s['rss_mb'] for s in samples),
+                'loaded': samples[-1]['loaded'],
+                'top_imports': parse_importtime(runs[-1][1], args.top),
+            })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'scenario':<26}{'import':>9}{'setup':>9}{'total':>9}{'peak RSS':>11}  heavy modules loaded")
+    for r in results:
+        print(
+            f"{r['scenario']:<26}{r['import_s']:>8.3f}s{r['setup_s']:>8.3f}s{r['total_s']:>8.3f}s"
+            f"{r['rss_mb']:>8.0f} MB  {', '.join(r['loaded']) or '-'}"
+        )
+    for r in results:
+        print(f"\nHeaviest top-level imports ({r['scenario']}):")
+        for item in r['top_imports']:
+            print(f"  {item['ms']:>8.1f} ms  {item['module']}")
+
+if __name__ == "__main__":
+    main()
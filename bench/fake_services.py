@@ -0,0 +1,205 @@
+"""
+Local stand-ins for the Binance REST API and miniTicker stream, CoinGecko
+and the Telegram Bot API, for offline benchmarks and tests. The HTTP fakes
+are small aiohttp servers and the stream a websockets server, all on
+127.0.0.1.
+"""
+
+import asyncio
+import json
+import re
+import time
+
+from aiohttp import web
+from websockets.asyncio.server import serve
+
+async def _serve(app, port):
+    """Starts `app` on 127.0.0.1:`port` (0 picks a free port) and returns its runner."""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+class FakeBinance:
+    """Serves GET /api/v3/ticker/price from a dict the benchmark updates between ticks.
+
+    `delay` slows every answer down and a `status` other than 200 fails it.
+    """
+
+    def __init__(self, prices=None, delay=0.0, status=200):
+        self.prices = dict(prices or {})
+        self.delay = delay
+        self.status = status
+        self.requests = 0
+        self.port = None
+        self._runner = None
+
+    async def ticker(self, request):
+        self.requests += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return web.json_response({'code': -1003, 'msg': 'Unavailable.'}, status=self.status)
+        wanted = request.query.get('symbols')
+        symbols = json.loads(wanted) if wanted else list(self.prices)
+        if any(symbol not in self.prices for symbol in symbols):
+            # Like Binance: one unknown symbol fails the whole filtered request
+            return web.json_response({'code': -1121, 'msg': 'Invalid symbol.'}, status=400)
+        return web.json_response([{'symbol': symbol, 'price': f"{self.prices[symbol]:.8f}"} for symbol in symbols])
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self, port=0):
+        # The symbols filter of a large universe makes for long request lines
+        app = web.Application(handler_args={'max_line_size': 1 << 20})
+        app.router.add_get('/api/v3/ticker/price', self.ticker)
+        self._runner = await _serve(app, port)
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+class FakeBinanceStream:
+    """Replays recorded ticks as a combined !miniTicker@arr stream.
+
+    `ticks` is a list of {symbol: price} batches, sent `interval` seconds
+    apart and continued from where the last connection left off. Every
+    connection is closed after `drop_after` messages, or goes silent
+    (stays open, sends nothing) after `stall_after`, to exercise reconnects
+    and stale-stream detection.
+    """
+
+    def __init__(self, ticks, interval=0.01, drop_after=None, stall_after=None):
+        self.ticks = list(ticks)
+        self.interval = interval
+        self.drop_after = drop_after
+        self.stall_after = stall_after
+        self.position = 0
+        self.sent = 0
+        self.connected_at = []  # loop time of every accepted connection
+        self.port = None
+        self._server = None
+
+    @staticmethod
+    def message(prices):
+        now = int(time.time() * 1000)
+        data = [{'e': '24hrMiniTicker', 'E': now, 's': symbol, 'c': f"{price:.8f}"} for symbol, price in prices.items()]
+        return json.dumps({'stream': '!miniTicker@arr', 'data': data})
+
+    async def handle(self, connection):
+        self.connected_at.append(asyncio.get_running_loop().time())
+        count = 0
+        while self.position < len(self.ticks):
+            if self.drop_after is not None and count >= self.drop_after:
+                return
+            if self.stall_after is not None and count >= self.stall_after:
+                await connection.wait_closed()
+                return
+            await connection.send(self.message(self.ticks[self.position]))
+            self.position += 1
+            self.sent += 1
+            count += 1
+            await asyncio.sleep(self.interval)
+        await connection.wait_closed()
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.port}/stream?streams=!miniTicker@arr"
+
+    async def start(self, port=0):
+        self._server = await serve(self.handle, '127.0.0.1', port or self.port or 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+class FakeCoinGecko:
+    """Serves GET /simple/price?ids=...&vs_currencies=usd from a {coin_id: price} dict.
+
+    `delay` and `status` work as for FakeBinance.
+    """
+
+    def __init__(self, prices=None, delay=0.0, status=200):
+        self.prices = dict(prices or {})
+        self.delay = delay
+        self.status = status
+        self.requests = []  # the ids asked for, per request
+        self.port = None
+        self._runner = None
+
+    async def simple_price(self, request):
+        ids = request.query.get('ids', '').split(',')
+        self.requests.append(ids)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return web.json_response({'status': {'error_code': self.status}}, status=self.status)
+        return web.json_response({coin_id: {'usd': self.prices[coin_id]} for coin_id in ids if coin_id in self.prices})
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/api/v3"
+
+    async def start(self, port=0):
+        app = web.Application()
+        app.router.add_get('/api/v3/simple/price', self.simple_price)
+        self._runner = await _serve(app, port)
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+class FakeTelegram:
+    """Answers Bot API calls and records when each sendMessage arrived.
+
+    Messages may carry `#<n>` markers; `received` maps every marker to the
+    perf_counter() time its message was received.
+    """
+
+    MARKER = re.compile(r"#(\d+)")
+
+    def __init__(self):
+        self.received = {}
+        self.messages = 0
+        self.port = None
+        self._runner = None
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        if request.content_type == 'application/json':
+            data = await request.json()
+        else:
+            data = dict(await request.post())
+
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        elif method == 'sendMessage':
+            now = time.perf_counter()
+            self.messages += 1
+            text = data.get('text', '')
+            for marker in self.MARKER.findall(text):
+                self.received[int(marker)] = now
+            result = {
+                'message_id': self.messages, 'date': int(time.time()),
+                'chat': {'id': int(data['chat_id']), 'type': 'private'}, 'text': text
+            }
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def start(self, port=0):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        self._runner = await _serve(app, port)
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
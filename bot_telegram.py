@@ -1,27 +1,77 @@
 import asyncio
-import matplotlib.pyplot as plt
-import yfinance as yf
+import importlib
+import logging
+import time
 from telegram import Update
+from telegram.error import BadRequest
 from telegram.ext import Application, CommandHandler, ContextTypes
-from config import TELEGRAM_BOT_TOKEN
+from config import TELEGRAM_BOT_TOKEN, INDICATOR_MAX_AGE_SECONDS, MAX_MOVE_WINDOW_SECONDS, CONCURRENT_UPDATES
 from database import Database
+from alarm_index import Alarm, format_duration, parse_duration, valid_target
+from chart_renderer import ChartBusyError, ChartCache, ChartRenderService
 from api_handler import APIHandler
-import pandas
+from notifier import NotificationDispatcher
+from admission import AdmissionController, REJECT_MESSAGES
+from metrics import Histogram
+
+COMMAND_SECONDS = Histogram("command_seconds", "Handler latency of admitted commands", ["command"])
 
 class TelegramBot:
-    def __init__(self):
-        self.application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    def __init__(self, alarm_index=None, api=None, db=None, indicator_book=None):
+        self.alarm_index = alarm_index
+        self.api = api or APIHandler()
+        self.db = db or Database()
+        # None when no scheduler in this process keeps indicators current
+        self.indicator_book = indicator_book
+        # Loaded on the first /chart, /performance or /predict that needs candles (pandas, yfinance)
+        self.candles = None
+        self.chart_cache = ChartCache()
+        self.chart_renderer = ChartRenderService()
+        self.application = (
+            Application.builder()
+            .token(TELEGRAM_BOT_TOKEN)
+            .concurrent_updates(CONCURRENT_UPDATES)
+            .build()
+        )
+        self.notifier = NotificationDispatcher(self.application.bot)
+        self.admission = AdmissionController()
 
         # Define commands
         self.application.add_handler(CommandHandler("start", self.start))
         self.application.add_handler(CommandHandler("help", self.help))
-        self.application.add_handler(CommandHandler("alarm", self.set_alarm))
-        self.application.add_handler(CommandHandler("alarms", self.list_alarms))
-        self.application.add_handler(CommandHandler("delete_alarm", self.delete_alarm))
-        self.application.add_handler(CommandHandler("price", self.get_price))
-        self.application.add_handler(CommandHandler("chart", self.get_chart))
-        self.application.add_handler(CommandHandler("performance", self.get_performance))
-        self.application.add_handler(CommandHandler("predict", self.get_prediction))
+        self.application.add_handler(CommandHandler("alarm", self.admitted("light", "alarm", self.set_alarm)))
+        self.application.add_handler(CommandHandler("alarms", self.admitted("light", "alarms", self.list_alarms)))
+        self.application.add_handler(
+            CommandHandler("delete_alarm", self.admitted("light", "delete_alarm", self.delete_alarm))
+        )
+        self.application.add_handler(CommandHandler("price", self.admitted("light", "price", self.get_price)))
+        # Downloads and CPU work: tighter per-user rate and a global concurrency cap
+        self.application.add_handler(CommandHandler("chart", self.admitted("heavy", "chart", self.get_chart)))
+        self.application.add_handler(
+            CommandHandler("performance", self.admitted("heavy", "performance", self.get_performance))
+        )
+        self.application.add_handler(
+            CommandHandler("predict", self.admitted("heavy", "predict", self.get_prediction))
+        )
+
+    def admitted(self, command_class, command, handler):
+        """Wraps a handler with admission control; rejected requests get a short reply at most once in a while."""
+        latency = COMMAND_SECONDS.labels(command)
+
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            user_id = update.effective_chat.id
+            ticket = self.admission.admit(command_class, user_id, command, context.args or ())
+            if isinstance(ticket, str):
+                if self.admission.should_notify(user_id, command):
+                    await update.message.reply_text(REJECT_MESSAGES[ticket])
+                return
+            started = time.perf_counter()
+            try:
+                await handler(update, context)
+            finally:
+                self.admission.release(ticket)
+                latency.observe(time.perf_counter() - started)
+        return wrapper
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(
@@ -33,7 +83,8 @@ class TelegramBot:
             "📚 Commands:\n"
             "/start - Start the bot\n"
             "/help - Display help commands\n"
-            "/alarm <symbol> <price> <above/below> - Set an alarm\n"
+            "/alarm <symbol> <price> <above/below> [repeat] [cooldown=30m] [band=1%] - Set an alarm\n"
+            "/alarm <symbol> move <percent> <window> [repeat] - Alarm on a % move within a window\n"
             "/alarms - List active alarms\n"
             "/delete_alarm <id> - Delete a specific alarm\n"
             "/price <symbol> - Get current price\n"
@@ -41,50 +92,111 @@ class TelegramBot:
             "/performance <symbol> - Performance analysis\n"
             "/predict <symbol> - Simple price prediction\n"
             "\nExample: /alarm BTCUSDT 65000 below\n"
+            "Example: /alarm BTCUSDT move 3% 1h repeat\n"
             "Example: /chart BTCUSDT 7d\n"
             "Example: /performance ETHUSDT"
         )
 
     async def set_alarm(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        usage = (
+            "❗ Correct usage: /alarm BTCUSDT 70000 above [repeat] [cooldown=30m] [band=1%]\n"
+            "or: /alarm BTCUSDT move 3% 1h [repeat] [cooldown=2h]"
+        )
         try:
             args = context.args
-            if len(args) != 3:
-                await update.message.reply_text("❗ Correct usage: /alarm BTCUSDT 70000 above")
+            if len(args) < 3:
+                await update.message.reply_text(usage)
                 return
 
             symbol = args[0].upper()
-            price = float(args[1])
-            condition = args[2].lower()
 
-            if condition not in ["above", "below"]:
-                await update.message.reply_text("❗ Condition must be 'above' or 'below'.")
-                return
+            if args[1].lower() == 'move':
+                # Percent-move alarm: target_price holds the threshold in percent
+                if len(args) < 4:
+                    await update.message.reply_text(usage)
+                    return
+                condition = 'move'
+                price = float(args[2].rstrip('%'))
+                move_window = parse_duration(args[3])
+                options = args[4:]
+                if not valid_target(price) or not 60 <= move_window <= MAX_MOVE_WINDOW_SECONDS:
+                    await update.message.reply_text(
+                        f"❗ Move must be above 0% and the window between 1m and {format_duration(MAX_MOVE_WINDOW_SECONDS)}."
+                    )
+                    return
+            else:
+                price = float(args[1])
+                condition = args[2].lower()
+                move_window = None
+                options = args[3:]
+                if condition not in ["above", "below"]:
+                    await update.message.reply_text("❗ Condition must be 'above' or 'below'.")
+                    return
+                if not valid_target(price):
+                    await update.message.reply_text("❗ Price must be a positive number.")
+                    return
+
+            recurring, cooldown, hysteresis = False, 0, 0.0
+            for option in options:
+                key, _, value = option.lower().partition('=')
+                if key == 'repeat':
+                    recurring = True
+                elif key == 'cooldown' and value:
+                    cooldown = parse_duration(value)
+                    recurring = True
+                    if cooldown <= 0:
+                        await update.message.reply_text(usage)
+                        return
+                elif key == 'band' and value and condition != 'move':
+                    hysteresis = float(value.rstrip('%'))
+                    recurring = True
+                    # A band of 100% or more never re-arms an 'above' alarm
+                    if not 0 < hysteresis < 100:
+                        await update.message.reply_text(usage)
+                        return
+                else:
+                    await update.message.reply_text(usage)
+                    return
 
             user_id = update.effective_chat.id
 
-            db = Database()
-            db.conn.execute(
-                "INSERT INTO alarms (user_id, symbol, target_price, condition, platform) VALUES (?, ?, ?, ?, ?)",
-                (user_id, symbol, price, condition, 'telegram')
+            alarm_id = await self.db.run(
+                self.db.add_alarm, user_id, symbol, price, condition, 'telegram',
+                recurring=recurring, cooldown=cooldown, hysteresis=hysteresis, move_window=move_window
             )
-            db.conn.commit()
+
+            if self.alarm_index is not None:
+                self.alarm_index.add(
+                    Alarm(alarm_id, user_id, symbol, price, condition, 'telegram',
+                          recurring, cooldown, hysteresis, move_window)
+                )
 
             await update.message.reply_text(
-                f"✅ Alarm added:\n{symbol} {condition} {price}"
+                f"✅ Alarm added:\n{self._describe_alarm(symbol, price, condition, recurring, cooldown, hysteresis, move_window)}"
             )
 
         except Exception as e:
-            print(f"❌ Error adding alarm: {e}")
+            logging.error(f"❌ Error adding alarm: {e}")
             await update.message.reply_text("❌ Failed to add alarm. Please try again.")
 
+    @staticmethod
+    def _describe_alarm(symbol, price, condition, recurring, cooldown, hysteresis, move_window):
+        if condition == 'move':
+            text = f"{symbol} move ±{price}% within {format_duration(move_window)}"
+        else:
+            text = f"{symbol} {condition} {price}"
+        if recurring:
+            text += " 🔁"
+            if cooldown:
+                text += f" cooldown {format_duration(cooldown)}"
+            if hysteresis:
+                text += f" band {hysteresis}%"
+        return text
+
     async def list_alarms(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             user_id = update.effective_chat.id
-            db = Database()
-            alarms = db.conn.execute(
-                "SELECT id, symbol, target_price, condition FROM alarms WHERE user_id=? AND active=1",
-                (user_id,)
-            ).fetchall()
+            alarms = await self.db.run(self.db.get_user_alarms, user_id)
 
             if not alarms:
                 await update.message.reply_text("📭 You have no active alarms.")
@@ -92,14 +204,14 @@ class TelegramBot:
 
             message = "📋 *Your Active Alarms:*\n\n"
             for alarm in alarms:
-                alarm_id, symbol, price, condition = alarm
-                cond_icon = "📈" if condition == "above" else "📉"
-                message += f"#{alarm_id}: {symbol} - {price} {cond_icon} ({condition})\n"
+                alarm_id, symbol, price, condition, *options = alarm
+                cond_icon = {"above": "📈", "below": "📉"}.get(condition, "📐")
+                message += f"#{alarm_id}: {cond_icon} {self._describe_alarm(symbol, price, condition, *options)}\n"
 
             await update.message.reply_text(message, parse_mode="Markdown")
 
         except Exception as e:
-            print(f"❌ Error listing alarms: {e}")
+            logging.error(f"❌ Error listing alarms: {e}")
             await update.message.reply_text("❌ Failed to list alarms.")
 
     async def delete_alarm(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -111,22 +223,17 @@ class TelegramBot:
 
             alarm_id = int(args[0])
             user_id = update.effective_chat.id
-            db = Database()
 
-            result = db.conn.execute(
-                "SELECT id FROM alarms WHERE id = ? AND user_id = ? AND active = 1",
-                (alarm_id, user_id)
-            ).fetchone()
+            if await self.db.run(self.db.deactivate_user_alarm, alarm_id, user_id):
+                if self.alarm_index is not None:
+                    self.alarm_index.remove(alarm_id)
 
-            if result:
-                db.conn.execute("UPDATE alarms SET active = 0 WHERE id = ?", (alarm_id,))
-                db.conn.commit()
                 await update.message.reply_text(f"🗑️ Alarm deleted: #{alarm_id}")
             else:
                 await update.message.reply_text("❌ No active alarm found with this ID.")
 
         except Exception as e:
-            print(f"❌ Error deleting alarm: {e}")
+            logging.error(f"❌ Error deleting alarm: {e}")
             await update.message.reply_text("❌ Failed to delete alarm. Please try again.")
 
     async def get_price(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -136,8 +243,7 @@ class TelegramBot:
                 return
 
             symbol = context.args[0].upper()
-            api = APIHandler()
-            price = api.get_price(symbol)
+            price = await self.api.get_price(symbol)
 
             if price is None:
                 await update.message.reply_text(f"❌ Could not retrieve price for {symbol}.", parse_mode="Markdown")
@@ -146,7 +252,7 @@ class TelegramBot:
             await update.message.reply_text(f"💰 Current price of {symbol}: *${price:,.2f}*", parse_mode="Markdown")
 
         except Exception as e:
-            print(f"❌ Price query error: {e}")
+            logging.error(f"❌ Price query error: {e}")
             await update.message.reply_text("❌ An error occurred while fetching the price.")
 
     async def get_chart(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -163,8 +269,6 @@ class TelegramBot:
             if period not in valid_periods:
                 period = "1d"
 
-            yf_symbol = symbol.replace("USDT", "-USD")
-
             # Set interval based on period
             interval_map = {
                 "1d": "15m",
@@ -175,29 +279,45 @@ class TelegramBot:
             }
             interval = interval_map.get(period, "15m")
 
-            df = yf.download(tickers=yf_symbol, period=period, interval=interval)
+            candles = await self.candle_store()
+            df = await candles.get(symbol, interval, period)
             if df.empty:
                 await update.message.reply_text(f"❌ Chart data not found for: {symbol}")
                 return
 
-            plt.figure(figsize=(12, 6))
-            plt.plot(df.index, df['Close'], label=f"{symbol} Close", color='blue', linewidth=2)
-            plt.title(f"{symbol} - {period.upper()} Period", fontsize=16, fontweight='bold')
-            plt.xlabel("Time", fontsize=12)
-            plt.ylabel("Price ($)", fontsize=12)
-            plt.grid(True, alpha=0.3)
-            plt.legend()
-            plt.tight_layout()
-            
-            # Save the chart file
-            chart_filename = f"chart_{symbol}_{period}.png"
-            plt.savefig(chart_filename, dpi=300, bbox_inches='tight')
-            plt.close()
+            # Identical charts share one render (and one upload) until a new bar arrives
+            cache_key = (symbol, period, int(df.index[-1].timestamp()))
+            cached = self.chart_cache.get(cache_key)
 
-            await update.message.reply_photo(photo=open(chart_filename, "rb"))
+            if cached and cached[1]:
+                try:
+                    await update.message.reply_photo(photo=cached[1])
+                    return
+                except BadRequest:
+                    # The uploaded file is no longer usable; send the bytes again
+                    self.chart_cache.set_file_id(cache_key, None)
+
+            if cached:
+                png = cached[0]
+            else:
+                try:
+                    png = await self.chart_renderer.render(
+                        symbol, period, df.index.to_numpy(), df['Close'].to_numpy(), key=cache_key
+                    )
+                except ChartBusyError:
+                    await update.message.reply_text("⏳ Chart service is busy, please try again in a moment.")
+                    return
+                except asyncio.TimeoutError:
+                    await update.message.reply_text("⌛ Chart rendering took too long, please try again.")
+                    return
+                self.chart_cache.put(cache_key, png)
+
+            message = await update.message.reply_photo(photo=png)
+            if message and message.photo:
+                self.chart_cache.set_file_id(cache_key, message.photo[-1].file_id)
 
         except Exception as e:
-            print(f"❌ Chart error: {e}")
+            logging.error(f"❌ Chart error: {e}")
             await update.message.reply_text("❌ Could not generate chart.")
 
     async def get_performance(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -207,60 +327,20 @@ class TelegramBot:
                 return
 
             symbol = context.args[0].upper()
-            yf_symbol = symbol.replace("USDT", "-USD")
 
-            # Get 30 days of data
-            df = yf.download(tickers=yf_symbol, period="30d", interval="1d", progress=False)
-            if df.empty:
+            # Warm symbols are answered from the incremental indicator state
+            stats = await self._analysis(symbol, "performance")
+            if stats is None:
                 await update.message.reply_text(f"❌ Performance data not found for {symbol}.")
                 return
 
-            # Performance calculations
-            current_price = float(df['Close'].iloc[-1])
-            price_7d = float(df['Close'].iloc[-7]) if len(df) >= 7 else float(df['Close'].iloc[0])
-            price_30d = float(df['Close'].iloc[0])
-            
-            change_7d = ((current_price - price_7d) / price_7d) * 100
-            change_30d = ((current_price - price_30d) / price_30d) * 100
-            
-            # Volatility calculation (standard deviation of daily changes)
-            daily_returns = df['Close'].pct_change().dropna()
-            volatility = float(daily_returns.std() * 100)
-            
-            # Highest and lowest values
-            high_30d = float(df['High'].max())
-            low_30d = float(df['Low'].min())
-            
-            # RSI calculation (simplified)
-            if len(df) >= 15:
-                try:
-                    # Get closing prices for the last 14 days
-                    recent_closes = [float(x) for x in df['Close'].tail(15)]
-                    
-                    gains = []
-                    losses = []
-                    
-                    for i in range(1, len(recent_closes)):
-                        change = recent_closes[i] - recent_closes[i-1]
-                        if change > 0:
-                            gains.append(change)
-                            losses.append(0)
-                        else:
-                            gains.append(0)
-                            losses.append(abs(change))
-                    
-                    avg_gain = sum(gains) / len(gains) if gains else 0
-                    avg_loss = sum(losses) / len(losses) if losses else 0
-                    
-                    if avg_loss == 0:
-                        current_rsi = 100.0
-                    else:
-                        rs = avg_gain / avg_loss
-                        current_rsi = 100 - (100 / (1 + rs))
-                except:
-                    current_rsi = 50.0
-            else:
-                current_rsi = 50.0
+            current_price = stats['current_price']
+            change_7d = ((current_price - stats['price_7d']) / stats['price_7d']) * 100
+            change_30d = ((current_price - stats['price_30d']) / stats['price_30d']) * 100
+            high_30d = stats['high_30d']
+            low_30d = stats['low_30d']
+            volatility = stats['volatility']
+            current_rsi = stats['rsi']
 
             # Create message
             performance_msg = f"📊 *{symbol} Performance Analysis*\n\n"
@@ -285,7 +365,7 @@ class TelegramBot:
             await update.message.reply_text(performance_msg, parse_mode="Markdown")
 
         except Exception as e:
-            print(f"❌ Performance analysis error: {e}")
+            logging.error(f"❌ Performance analysis error: {e}")
             await update.message.reply_text(f"❌ Performance analysis could not be performed. Error: {str(e)}")
 
     async def get_prediction(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -295,33 +375,18 @@ class TelegramBot:
                 return
 
             symbol = context.args[0].upper()
-            yf_symbol = symbol.replace("USDT", "-USD")
 
-            # Get 30 days of data
-            df = yf.download(tickers=yf_symbol, period="30d", interval="1d", progress=False)
-            if df.empty:
+            stats = await self._analysis(symbol, "prediction")
+            if stats is None:
                 await update.message.reply_text(f"❌ Prediction data not found for {symbol}.")
                 return
 
             # Simple technical analysis based prediction
-            prices = [float(x) for x in df['Close'].values]
-            current_price = prices[-1]
-            
-            # Moving averages - simple calculation
-            ma_7 = sum(prices[-7:]) / 7 if len(prices) >= 7 else current_price
-            ma_14 = sum(prices[-14:]) / 14 if len(prices) >= 14 else current_price
-            ma_30 = sum(prices) / len(prices)
-            
-            # Simple trend calculation (average change over the last 7 days)
-            if len(prices) >= 7:
-                recent_prices = prices[-7:]
-                trend_changes = []
-                for i in range(1, len(recent_prices)):
-                    change = recent_prices[i] - recent_prices[i-1]
-                    trend_changes.append(change)
-                recent_trend = sum(trend_changes) / len(trend_changes)
-            else:
-                recent_trend = 0
+            current_price = stats['current_price']
+            ma_7 = stats['ma_7']
+            ma_14 = stats['ma_14']
+            ma_30 = stats['ma_30']
+            recent_trend = stats['recent_trend']
             
             # Simple prediction algorithm
             trend_factor = recent_trend * 7  # 7-day trend projection
@@ -331,15 +396,9 @@ class TelegramBot:
             prediction_1d = current_price + recent_trend
             prediction_7d = current_price + trend_factor + (current_price * ma_signal * 0.1 / 100)
             
-            # Calculate confidence level (simple volatility)
-            if len(prices) >= 14:
-                recent_prices = prices[-14:]
-                volatility_sum = 0
-                for i in range(1, len(recent_prices)):
-                    change_pct = abs((recent_prices[i] - recent_prices[i-1]) / recent_prices[i-1] * 100)
-                    volatility_sum += change_pct
-                volatility = volatility_sum / (len(recent_prices) - 1)
-                confidence = max(30, 90 - volatility * 2)
+            # Calculate confidence level (mean absolute daily change over the last 14 days)
+            if stats['abs_change_pct'] is not None:
+                confidence = max(30, 90 - stats['abs_change_pct'] * 2)
             else:
                 confidence = 50
             
@@ -378,18 +437,75 @@ class TelegramBot:
             await update.message.reply_text(prediction_msg, parse_mode="Markdown")
 
         except Exception as e:
-            print(f"❌ Prediction analysis error: {e}")
+            logging.error(f"❌ Prediction analysis error: {e}")
             await update.message.reply_text(f"❌ Prediction analysis could not be performed. Error: {str(e)}")
 
-    async def send_notification(self, user_id, message):
-        try:
-            await self.application.bot.send_message(
-                chat_id=user_id,
-                text=message,
-                parse_mode="Markdown"
+    async def _analysis(self, symbol, kind):
+        """Returns performance/prediction inputs for symbol, or None if there is no data.
+
+        Symbols the scheduler keeps current are read from the incremental indicator
+        state; cold ones are computed from 30 daily candles, which also seeds the state.
+        """
+        state = self.indicator_book.get(symbol) if self.indicator_book is not None else None
+        if state is not None and state.ready(max_age=INDICATOR_MAX_AGE_SECONDS):
+            return state.performance() if kind == "performance" else state.prediction()
+
+        candles = await self.candle_store()
+        df = await candles.get(symbol, "1d", "30d")
+        if df.empty:
+            return None
+
+        # Already imported by candle_store; local so the warm path never needs them
+        import numpy as np
+        import pandas
+        import indicators
+
+        # Seeding makes the scheduler poll the symbol; one the price providers do not
+        # know (yfinance also serves AAPL, Binance does not) is dropped after that poll
+        if self.indicator_book is not None:
+            epochs = (df.index - pandas.Timestamp(0, tz='UTC')) // pandas.Timedelta(seconds=1)
+            self.indicator_book.seed(symbol, list(zip(epochs, df['High'], df['Low'], df['Close'])))
+
+        closes = df['Close'].to_numpy()
+        current_price = float(closes[-1])
+
+        if kind == "performance":
+            rsi_values = indicators.rsi(closes, 14)
+            return {
+                'current_price': current_price,
+                'price_7d': float(closes[-7]) if len(closes) >= 7 else float(closes[0]),
+                'price_30d': float(closes[0]),
+                'high_30d': float(df['High'].max()),
+                'low_30d': float(df['Low'].min()),
+                # Standard deviation of daily changes
+                'volatility': float(np.nan_to_num(indicators.volatility(closes)) * 100),
+                # RSI (14, Wilder smoothing); needs at least 15 closes
+                'rsi': 50.0 if np.isnan(rsi_values[-1]) else float(rsi_values[-1])
+            }
+
+        return {
+            'current_price': current_price,
+            'ma_7': float(indicators.sma(closes, 7)[-1]) if len(closes) >= 7 else current_price,
+            'ma_14': float(indicators.sma(closes, 14)[-1]) if len(closes) >= 14 else current_price,
+            'ma_30': float(closes.mean()),
+            # Average change over the last 7 days
+            'recent_trend': float(np.diff(closes[-7:]).mean()) if len(closes) >= 7 else 0,
+            'abs_change_pct': (
+                float(np.abs(indicators.returns(closes[-14:])[1:]).mean() * 100) if len(closes) >= 14 else None
             )
-        except Exception as e:
-            print(f"❌ Notification error: {e}")
+        }
+
+    async def candle_store(self):
+        if self.candles is None:
+            # pandas and yfinance take about a second to import; keep the event loop free meanwhile
+            module = await asyncio.to_thread(importlib.import_module, "candle_store")
+            if self.candles is None:
+                self.candles = module.CandleStore(self.db)
+        return self.candles
+
+    async def send_notification(self, user_id, message):
+        # Delivery, rate limiting and retries happen in the dispatcher workers
+        self.notifier.submit(user_id, message)
 
     def run(self):
         asyncio.run(self.application.run_polling())
\ No newline at end of file
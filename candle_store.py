@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from config import CANDLE_REFRESH_SECONDS, PRICE_BAR_INTERVAL
+
+PERIOD_UNITS = {'d': 86400, 'wk': 7 * 86400, 'mo': 30 * 86400, 'y': 365 * 86400}
+# Weekly bars are anchored to the request's start date, so they are always refetched whole
+INCREMENTAL_INTERVALS = ('15m', '1h', '1d')
+COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+# When yfinance has nothing: the price_bars rollup to read (see retention.py) and how to resample it
+LOCAL_HISTORY = {'15m': (PRICE_BAR_INTERVAL, '15min'), '1h': ('1h', None), '1d': ('1d', None), '1wk': ('1d', '7D')}
+
+def period_seconds(period):
+    for unit in sorted(PERIOD_UNITS, key=len, reverse=True):
+        if period.endswith(unit):
+            return int(period[:-len(unit)]) * PERIOD_UNITS[unit]
+    raise ValueError(f"Unknown period: {period}")
+
+def to_yf_symbol(symbol):
+    return symbol.replace("USDT", "-USD")
+
+class CandleStore:
+    """Persistent OHLCV cache keyed by (symbol, interval).
+
+    Bars live in the candles table and, once loaded, as columnar numpy arrays
+    in memory. A request only goes to yfinance when the cached series is older
+    than `refresh_seconds`, and then only for the bars after the last cached
+    one (the last bar is refetched because it is still forming). Symbols
+    yfinance cannot serve fall back to the bars rolled up from our own prices.
+    """
+
+    def __init__(self, db, refresh_seconds=CANDLE_REFRESH_SECONDS):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self._series = {}  # (symbol, interval) -> dict of numpy arrays + bookkeeping
+        self._locks = {}
+
+    async def get(self, symbol, interval, period):
+        """Returns the bars of the last `period` as a DataFrame indexed by UTC time."""
+        key = (symbol, interval)
+        window_start = int(time.time()) - period_seconds(period)
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            series = self._series.get(key)
+            if series is None:
+                series = await self._load(symbol, interval)
+                self._series[key] = series
+
+            stale = time.monotonic() - series['fetched_at'] > self.refresh_seconds
+            if series['covered_since'] > window_start:
+                # Cached history does not reach back far enough yet
+                await self._fetch(series, symbol, interval, period=period)
+                series['covered_since'] = window_start
+            elif stale:
+                if len(series['ts']) and interval in INCREMENTAL_INTERVALS:
+                    await self._fetch(series, symbol, interval, start=int(series['ts'][-1]))
+                else:
+                    await self._fetch(series, symbol, interval, period=period)
+
+        frame = self._frame(series, window_start)
+        if frame.empty:
+            frame = await self._local_frame(symbol, interval, window_start)
+        return frame
+
+    async def _local_frame(self, symbol, interval, window_start):
+        source, rule = LOCAL_HISTORY.get(interval, (PRICE_BAR_INTERVAL, None))
+        rows = await self.db.run(self.db.get_price_bars, symbol, source, window_start)
+        frame = pd.DataFrame(
+            [row[1:5] for row in rows],
+            index=pd.to_datetime([row[0] for row in rows], unit='s', utc=True),
+            columns=list(COLUMNS[:4])
+        )
+        # Only prices are sampled locally
+        frame['Volume'] = 0.0
+        if rule and not frame.empty:
+            frame = frame.resample(rule).agg(
+                {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+            ).dropna()
+        return frame
+
+    async def _load(self, symbol, interval):
+        rows = await self.db.run(self.db.get_candles, symbol, interval)
+        series = self._empty_series()
+        if rows:
+            self._merge(series, np.array(rows, dtype=np.float64))
+            # Trust persisted history as far back as it goes
+            series['covered_since'] = int(series['ts'][0])
+        return series
+
+    async def _fetch(self, series, symbol, interval, period=None, start=None):
+        if start is not None:
+            kwargs = {'start': datetime.fromtimestamp(start, timezone.utc).strftime('%Y-%m-%d')}
+        else:
+            kwargs = {'period': period}
+
+        df = await asyncio.to_thread(
+            yf.download, tickers=to_yf_symbol(symbol), interval=interval, progress=False, **kwargs
+        )
+        series['fetched_at'] = time.monotonic()
+
+        bars = self._bars_from_frame(df)
+        if start is not None and len(bars):
+            bars = bars[bars[:, 0] >= start]
+        if not len(bars):
+            return
+
+        await self.db.run(self.db.upsert_candles, symbol, interval, bars.tolist())
+        self._merge(series, bars)
+        logging.info(f"🕯️ {len(bars)} {interval} candles cached for {symbol}")
+
+    @staticmethod
+    def _empty_series():
+        return {
+            'ts': np.empty(0, dtype=np.int64),
+            'ohlcv': np.empty((0, len(COLUMNS)), dtype=np.float64),
+            'covered_since': float('inf'),
+            'fetched_at': float('-inf')
+        }
+
+    @staticmethod
+    def _bars_from_frame(df):
+        """Converts a yfinance frame to an (n, 6) array of [epoch, open, high, low, close, volume]."""
+        if df is None or df.empty:
+            return np.empty((0, 1 + len(COLUMNS)))
+
+        if isinstance(df.columns, pd.MultiIndex):
+            df = df.copy()
+            df.columns = df.columns.get_level_values(0)
+
+        index = pd.DatetimeIndex(df.index)
+        index = index.tz_localize('UTC') if index.tz is None else index.tz_convert('UTC')
+        epochs = (index - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)
+
+        bars = np.column_stack([np.asarray(epochs, dtype=np.float64)] + [
+            df[column].to_numpy(dtype=np.float64) for column in COLUMNS
+        ])
+        return bars[~np.isnan(bars[:, 4])]
+
+    @staticmethod
+    def _merge(series, bars):
+        ts = np.concatenate([series['ts'], bars[:, 0].astype(np.int64)])
+        ohlcv = np.concatenate([series['ohlcv'], bars[:, 1:]])
+        # Keep the newest copy of every bar (fetched bars come last)
+        order = np.argsort(ts, kind='stable')
+        ts, ohlcv = ts[order], ohlcv[order]
+        keep = np.append(ts[1:] != ts[:-1], True)
+        series['ts'], series['ohlcv'] = ts[keep], ohlcv[keep]
+
+    @staticmethod
+    def _frame(series, window_start):
+        first = np.searchsorted(series['ts'], window_start, side='left')
+        ts = series['ts'][first:]
+        return pd.DataFrame(
+            series['ohlcv'][first:],
+            index=pd.to_datetime(ts, unit='s', utc=True),
+            columns=list(COLUMNS)
+        )
@@ -0,0 +1,165 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import (
+    CHART_DPI, CHART_CACHE_SIZE, CHART_CACHE_TTL, CHART_WORKERS, CHART_MAX_PENDING, CHART_RENDER_TIMEOUT
+)
+
+class ChartBusyError(Exception):
+    """Raised when the render queue is full."""
+
+def render_chart(symbol, period, times, closes, dpi=CHART_DPI):
+    """Renders a close-price line chart and returns it as PNG bytes."""
+    # Imported here: only the render workers need matplotlib, not the bot process
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    # Object-oriented API: no pyplot global state, safe outside the main thread
+    fig = Figure(figsize=(12, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    ax.plot(times, closes, label=f"{symbol} Close", color='blue', linewidth=2)
+    ax.set_title(f"{symbol} - {period.upper()} Period", fontsize=16, fontweight='bold')
+    ax.set_xlabel("Time", fontsize=12)
+    ax.set_ylabel("Price ($)", fontsize=12)
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+class ChartCache:
+    """LRU cache of rendered charts with a TTL, remembering Telegram file_ids."""
+
+    def __init__(self, max_entries=CHART_CACHE_SIZE, ttl=CHART_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> [expires_at, png, file_id]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns (png, file_id) for a live entry, or None."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def put(self, key, png, file_id=None):
+        self._entries[key] = [time.monotonic() + self.ttl, png, file_id]
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def set_file_id(self, key, file_id):
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[2] = file_id
+
+def _warm_worker():
+    # Pay for the font cache and the Agg/PNG code paths once per worker process
+    render_chart("WARMUP", "1d", [0, 1], [0.0, 1.0], dpi=10)
+
+def _ping():
+    return os.getpid()
+
+class ChartRenderService:
+    """Renders charts in a pre-warmed process pool so matplotlib never runs on the event loop.
+
+    At most `max_pending` renders may be queued or running; beyond that render()
+    raises ChartBusyError immediately instead of queueing. Identical concurrent
+    requests (same key) share one render.
+    """
+
+    def __init__(self, workers=CHART_WORKERS, max_pending=CHART_MAX_PENDING, timeout=CHART_RENDER_TIMEOUT):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._pool = None
+        self._pending = 0
+        self._in_flight = {}
+
+        self.rendered = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def start(self):
+        if self._pool is not None:
+            return
+
+        # spawn: forking the bot would copy its event loop, sockets and sqlite threads
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker
+        )
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _ping) for _ in range(self.workers)))
+        logging.info(f"🖼️ Chart renderer ready: {self.workers} workers in {time.perf_counter() - started:.1f}s")
+
+    async def stop(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def render(self, symbol, period, times, closes, key=None):
+        if key is not None and key in self._in_flight:
+            return await asyncio.wait_for(asyncio.shield(self._in_flight[key]), self.timeout)
+
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise ChartBusyError(f"{self._pending} charts already rendering")
+
+        await self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._pool, render_chart, symbol, period, times, closes)
+
+        # The slot is held until the worker is really free, even after a timeout
+        self._pending += 1
+        future.add_done_callback(self._release)
+        if key is not None:
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        try:
+            png = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool for the next request
+            logging.error("🚫 Chart render pool broken, restarting it")
+            await self.stop()
+            raise
+
+        self.rendered += 1
+        return png
+
+    def _release(self, future):
+        self._pending -= 1
+        if not future.cancelled():
+            future.exception()  # mark retrieved; render() reports errors to its caller
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'pending': self._pending,
+            'rendered': self.rendered,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out
+        }
@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -6,8 +7,34 @@ load_dotenv()
 # Telegram Bot Token
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
-# CoinGecko Base URL (used in APIHandler)
-COINGECKO_BASE_URL = "https://api.coingecko.com/api/v3"
+# How updates arrive: "polling" (getUpdates) or "webhook" (embedded HTTP server)
+UPDATE_MODE = os.getenv("UPDATE_MODE", "polling")
+
+# Webhook: public base URL registered with Telegram (unset = register it yourself), listen address,
+# request path and the secret Telegram must send back in X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
+# Updates handled at the same time (handlers only await I/O, so they can overlap)
+CONCURRENT_UPDATES = 64
+
+# Admission control per command class: per-user token bucket for each command (commands/s and burst)
+# and the most executions of the class running at once across all users
+COMMAND_LIMITS = {
+    'heavy': {'rate': 0.1, 'burst': 3, 'concurrency': 8},    # /chart, /performance, /predict
+    'light': {'rate': 1.0, 'burst': 5, 'concurrency': 64},   # /price and alarm commands
+}
+# Seconds before a user is told again that a command was rejected (rejections in between are silent)
+ADMISSION_NOTICE_SECONDS = 10
+
+# CoinGecko Base URL (used by the coingecko price provider)
+COINGECKO_BASE_URL = os.getenv("COINGECKO_BASE_URL", "https://api.coingecko.com/api/v3")
+
+# Binance REST base URL (used by the binance price provider)
+BINANCE_API_URL = os.getenv("BINANCE_API_URL", "https://api.binance.com")
 
 # SQLite Database Path
 DATABASE_PATH = "crypto_alarm.db"
@@ -17,3 +44,98 @@ PRICE_CHECK_INTERVAL = 5
 
 # Supported crypto pairs (used in alarms, validation, etc.)
 SUPPORTED_CRYPTO = ["BTCUSDT", "ETHUSDT", "ADAUSDT", "BNBUSDT", "XRPUSDT"]
+
+# Shared price cache: seconds a fetched or streamed price answers /price without a new request
+PRICE_CACHE_TTL = 2
+
+# Price providers in preference order (binance, coingecko, stub); STUB_PRICES is a JSON {symbol: price} map
+PRICE_PROVIDERS = [name.strip() for name in os.getenv("PRICE_PROVIDERS", "binance,coingecko").split(",") if name.strip()]
+STUB_PRICES = json.loads(os.getenv("STUB_PRICES", "{}"))
+
+# Providers: seconds to wait before hedging to the next one, failures that open a breaker, breaker cool-down (s)
+PRICE_HEDGE_SECONDS = 0.5
+PROVIDER_FAILURE_THRESHOLD = 3
+PROVIDER_RESET_SECONDS = 30
+
+# Price source for alarm checks: "polling" (REST every PRICE_CHECK_INTERVAL) or "streaming" (websocket)
+PRICE_SOURCE = os.getenv("PRICE_SOURCE", "polling")
+
+# Binance combined stream carrying the miniTicker of every symbol once per second
+BINANCE_STREAM_URL = os.getenv("BINANCE_STREAM_URL", "wss://stream.binance.com:9443/stream?streams=!miniTicker@arr")
+
+# Streaming: REST poll interval while the websocket is down, and silence before reconnecting (seconds)
+STREAM_FALLBACK_POLL_SECONDS = 30
+STREAM_STALE_SECONDS = 30
+
+# Recurring alarms: seconds between batched writes of their re-arm state, and the longest move-alarm window
+ALARM_STATE_FLUSH_SECONDS = 10
+MAX_MOVE_WINDOW_SECONDS = 86400
+
+# Prometheus-style metrics: local port for GET /metrics (0 = off)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Logging: JSON-lines file (empty = console only), rotated at LOG_MAX_BYTES or after LOG_MAX_AGE_SECONDS
+LOG_FILE = os.getenv("LOG_FILE", "crypto_bot.jsonl")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_MAX_AGE_SECONDS = 86400
+LOG_BACKUP_COUNT = 7
+# Records waiting for the log writer thread; beyond this they are dropped rather than blocking the caller
+LOG_QUEUE_SIZE = 10000
+# Keep 1 in N records below WARNING from these loggers (0 = none); httpx logs every request at INFO
+LOG_SAMPLING = json.loads(os.getenv("LOG_SAMPLING", '{"httpx": 100}'))
+
+# price_data retention: raw ticks are rolled up into OHLC bars (price_bars). price_data holds one
+# row per symbol per PRICE_CHECK_INTERVAL in polling and streaming mode alike, so that is the finest bar
+PRICE_BAR_INTERVAL = f"{PRICE_CHECK_INTERVAL}m"
+# Seconds to keep raw ticks and each resolution (None = forever)
+PRICE_RETENTION_SECONDS = {'raw': 2 * 86400, PRICE_BAR_INTERVAL: 7 * 86400, '1h': 180 * 86400, '1d': None}
+# Rows per rollup/delete transaction, seconds between retention passes and pages freed per incremental vacuum
+RETENTION_BATCH_ROWS = 2000
+RETENTION_INTERVAL_SECONDS = 300
+RETENTION_VACUUM_PAGES = 2000
+
+# Split deployments (--role alarms): seconds between polls for alarms added or deleted by the command process
+ALARM_SYNC_SECONDS = 5
+
+# Sharded alarm evaluation: worker processes (0 = evaluate in the bot process), fixed shard count,
+# and seconds before a dead worker is replaced
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "0"))
+SHARD_COUNT = 64
+SHARD_RESPAWN_SECONDS = 5
+
+# Notification dispatcher: workers, global and per-chat send rates (msg/s), delivery attempts
+NOTIFY_WORKERS = 8
+NOTIFY_RATE_PER_SECOND = 30
+NOTIFY_CHAT_RATE_PER_SECOND = 1
+NOTIFY_MAX_ATTEMPTS = 5
+
+# Notifications to one chat within this many seconds are sent as one digest (0 = send each one),
+# split at Telegram's message size limit (in UTF-16 code units), less some headroom
+NOTIFY_DIGEST_SECONDS = 1.0
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+TELEGRAM_MESSAGE_HEADROOM = 96
+
+# price_data write-behind buffer: flush when this many rows are waiting or every N seconds
+PRICE_FLUSH_MAX_ROWS = 500
+PRICE_FLUSH_SECONDS = 10
+
+# Candle cache: seconds before cached OHLCV bars are topped up from yfinance
+CANDLE_REFRESH_SECONDS = 60
+
+# Charts: render resolution, and LRU size / TTL (seconds) of the rendered PNG cache
+CHART_DPI = 100
+CHART_CACHE_SIZE = 128
+CHART_CACHE_TTL = 900
+
+# Chart render pool: worker processes (0 = one per CPU), queued renders before replying "busy", timeout (s)
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "0"))
+CHART_MAX_PENDING = 32
+CHART_RENDER_TIMEOUT = 20
+
+# Incremental indicators: snapshot interval (s), and age (s) after which a symbol's state is rebuilt from candles
+INDICATOR_SNAPSHOT_SECONDS = 60
+INDICATOR_MAX_AGE_SECONDS = 3 * PRICE_CHECK_INTERVAL * 60
+# Symbols nobody has asked /performance or /predict about for this long (s) are no longer kept current
+INDICATOR_IDLE_SECONDS = 86400
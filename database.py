@@ -1,43 +1,293 @@
+import asyncio
+import functools
 import sqlite3
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+from metrics import Histogram
+from config import DATABASE_PATH
+
+CALL_SECONDS = Histogram(
+    "db_call_seconds", "Database.run latency, including time queued behind other calls", ["operation"]
+)
+
+def _migration_base_tables(c):
+    # Alarmlar tablosu
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS alarms (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            target_price REAL NOT NULL,
+            condition TEXT CHECK(condition IN ('above', 'below')) NOT NULL,
+            platform TEXT DEFAULT 'telegram',
+            active INTEGER DEFAULT 1,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Fiyat geçmişi tablosu (opsiyonel)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS price_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT NOT NULL,
+            price REAL NOT NULL,
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def _migration_alarm_indexes(c):
+    # Partial indexes: only active alarms are ever looked up
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_alarms_active_symbol
+        ON alarms (symbol, condition, target_price) WHERE active = 1
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_alarms_active_user
+        ON alarms (user_id) WHERE active = 1
+    """)
+
+def _migration_price_data_epoch(c):
+    # SQLite cannot change a column type in place, so rebuild the table
+    c.execute("""
+        CREATE TABLE price_data_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT NOT NULL,
+            price REAL NOT NULL,
+            timestamp INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+        )
+    """)
+    c.execute("""
+        INSERT INTO price_data_new (id, symbol, price, timestamp)
+        SELECT id, symbol, price, COALESCE(CAST(strftime('%s', timestamp) AS INTEGER), 0)
+        FROM price_data
+    """)
+    c.execute("DROP TABLE price_data")
+    c.execute("ALTER TABLE price_data_new RENAME TO price_data")
+    c.execute("CREATE INDEX idx_price_data_symbol_time ON price_data (symbol, timestamp)")
+
+def _migration_candles(c):
+    c.execute("""
+        CREATE TABLE candles (
+            symbol TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            open REAL NOT NULL,
+            high REAL NOT NULL,
+            low REAL NOT NULL,
+            close REAL NOT NULL,
+            volume REAL NOT NULL,
+            PRIMARY KEY (symbol, interval, ts)
+        ) WITHOUT ROWID
+    """)
+
+def _migration_indicator_state(c):
+    c.execute("""
+        CREATE TABLE indicator_state (
+            symbol TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            updated_at INTEGER NOT NULL
+        )
+    """)
+
+def _migration_alarm_triggers(c):
+    # Recurring, cooldown, hysteresis and percent-move alarms. The condition CHECK
+    # has to change, which SQLite only allows by rebuilding the table.
+    c.execute("""
+        CREATE TABLE alarms_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            target_price REAL NOT NULL,
+            condition TEXT CHECK(condition IN ('above', 'below', 'move')) NOT NULL,
+            platform TEXT DEFAULT 'telegram',
+            active INTEGER DEFAULT 1,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            recurring INTEGER NOT NULL DEFAULT 0,
+            cooldown INTEGER NOT NULL DEFAULT 0,
+            hysteresis REAL NOT NULL DEFAULT 0,
+            move_window INTEGER,
+            armed INTEGER NOT NULL DEFAULT 1,
+            next_eligible_at INTEGER NOT NULL DEFAULT 0,
+            last_triggered_at INTEGER,
+            trigger_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    c.execute("""
+        INSERT INTO alarms_new (id, user_id, symbol, target_price, condition, platform, active, created_at)
+        SELECT id, user_id, symbol, target_price, condition, platform, active, created_at FROM alarms
+    """)
+    c.execute("DROP TABLE alarms")
+    c.execute("ALTER TABLE alarms_new RENAME TO alarms")
+    _migration_alarm_indexes(c)
+
+def _migration_alarm_changes(c):
+    # Lets a process that only evaluates alarms (--role alarms) follow the
+    # alarms added and deleted by the command process
+    c.execute("ALTER TABLE alarms ADD COLUMN changed_at INTEGER NOT NULL DEFAULT 0")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_alarms_changed_at ON alarms(changed_at)")
+
+def _migration_price_bars(c):
+    # OHLC rollups of price_data (see retention.py); `samples` is the number of raw ticks behind a bar
+    c.execute("""
+        CREATE TABLE price_bars (
+            symbol TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            open REAL NOT NULL,
+            high REAL NOT NULL,
+            low REAL NOT NULL,
+            close REAL NOT NULL,
+            samples INTEGER NOT NULL,
+            PRIMARY KEY (symbol, interval, ts)
+        ) WITHOUT ROWID
+    """)
+    c.execute("CREATE INDEX idx_price_bars_interval_ts ON price_bars (interval, ts)")
+    c.execute("""
+        CREATE TABLE retention_state (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    """)
+
+# Ordered (version, description, migration); append new entries, never edit applied ones
+MIGRATIONS = [
+    (1, "base alarms and price_data tables", _migration_base_tables),
+    (2, "partial indexes on active alarms", _migration_alarm_indexes),
+    (3, "integer epoch timestamps and (symbol, timestamp) index on price_data", _migration_price_data_epoch),
+    (4, "OHLCV candle cache", _migration_candles),
+    (5, "incremental indicator snapshots", _migration_indicator_state),
+    (6, "recurring, cooldown, hysteresis and move alarms", _migration_alarm_triggers),
+    (7, "changed_at column for following alarm changes", _migration_alarm_changes),
+    (8, "price_bars rollups and retention watermarks", _migration_price_bars),
+]
+
+# Column order expected by AlarmIndex.load: the Alarm fields, then the trigger state
+ALARM_COLUMNS = (
+    "id, user_id, symbol, target_price, condition, platform, "
+    "recurring, cooldown, hysteresis, move_window, armed, next_eligible_at"
+)
 
 class Database:
-    def __init__(self, db_path="crypto_alarm.db"):
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+    def __init__(self, db_path=DATABASE_PATH):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256)
+        self.configure()
         self.create_tables()
 
-    def create_tables(self):
+        # All async callers go through this single thread, so the connection
+        # is never used concurrently and the event loop never waits on disk.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+    def configure(self):
         c = self.conn.cursor()
+        # Lets retention give pages back a batch at a time; only takes effect on a new
+        # database, existing ones switch over at their first VACUUM (see vacuum_step)
+        c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        c.execute("PRAGMA journal_mode=WAL")
+        c.execute("PRAGMA synchronous=NORMAL")
+        c.execute("PRAGMA busy_timeout=5000")
+        c.execute("PRAGMA cache_size=-65536")     # 64 MB page cache
+        c.execute("PRAGMA mmap_size=268435456")   # 256 MB memory-mapped I/O
+        c.execute("PRAGMA temp_store=MEMORY")
 
-        # Alarmlar tablosu
+    def create_tables(self):
+        """Brings the schema up to date by applying pending migrations in order."""
+        c = self.conn.cursor()
         c.execute("""
-            CREATE TABLE IF NOT EXISTS alarms (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                symbol TEXT NOT NULL,
-                target_price REAL NOT NULL,
-                condition TEXT CHECK(condition IN ('above', 'below')) NOT NULL,
-                platform TEXT DEFAULT 'telegram',
-                active INTEGER DEFAULT 1,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at INTEGER NOT NULL
             )
         """)
+        self.conn.commit()
 
-        # Fiyat geçmişi tablosu (opsiyonel)
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS price_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                symbol TEXT NOT NULL,
-                price REAL NOT NULL,
-                timestamp TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        current = c.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+        for version, description, migration in MIGRATIONS:
+            if version <= current:
+                continue
+
+            c.execute("BEGIN")
+            try:
+                migration(c)
+                c.execute(
+                    "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                    (version, description, int(time.time()))
+                )
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
 
+    def schema_version(self):
+        return self.conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+    async def run(self, func, *args, **kwargs):
+        """Runs a Database method on the database thread without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        finally:
+            CALL_SECONDS.labels(func.__name__).observe(time.perf_counter() - started)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.conn.close()
+
+    def add_alarm(self, user_id, symbol, target_price, condition, platform='telegram',
+                  recurring=False, cooldown=0, hysteresis=0.0, move_window=None):
+        c = self.conn.cursor()
+        c.execute(
+            "INSERT INTO alarms (user_id, symbol, target_price, condition, platform, "
+            "recurring, cooldown, hysteresis, move_window, changed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, symbol, target_price, condition, platform, int(recurring), cooldown, hysteresis, move_window,
+             int(time.time()))
+        )
         self.conn.commit()
+        return c.lastrowid
+
+    def get_user_alarms(self, user_id):
+        c = self.conn.cursor()
+        c.execute(
+            "SELECT id, symbol, target_price, condition, recurring, cooldown, hysteresis, move_window "
+            "FROM alarms WHERE user_id = ? AND active = 1",
+            (user_id,)
+        )
+        return c.fetchall()
 
     def get_all_active_alarms(self):
         c = self.conn.cursor()
-        c.execute("SELECT * FROM alarms WHERE active = 1")
+        c.execute(f"SELECT {ALARM_COLUMNS} FROM alarms WHERE active = 1")
+        return c.fetchall()
+
+    def get_active_symbols(self):
+        c = self.conn.cursor()
+        c.execute("SELECT DISTINCT symbol FROM alarms WHERE active = 1")
+        return [row[0] for row in c.fetchall()]
+
+    def get_active_alarms_for_symbols(self, symbols):
+        c = self.conn.cursor()
+        rows = []
+        symbols = list(symbols)
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(symbols), 500):
+            chunk = symbols[i:i + 500]
+            c.execute(
+                f"SELECT {ALARM_COLUMNS} FROM alarms WHERE active = 1 AND symbol IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+            rows.extend(c.fetchall())
+        return rows
+
+    def get_alarm_changes(self, since):
+        """Alarms added or deleted by a user since the epoch second `since`: ALARM_COLUMNS, active, changed_at."""
+        c = self.conn.cursor()
+        c.execute(
+            f"SELECT {ALARM_COLUMNS}, active, changed_at FROM alarms WHERE changed_at >= ? ORDER BY changed_at, id",
+            (since,)
+        )
         return c.fetchall()
 
     def deactivate_alarm(self, alarm_id):
@@ -45,7 +295,172 @@ class Database:
         c.execute("UPDATE alarms SET active = 0 WHERE id = ?", (alarm_id,))
         self.conn.commit()
 
+    def deactivate_alarms(self, alarm_ids):
+        c = self.conn.cursor()
+        c.executemany("UPDATE alarms SET active = 0 WHERE id = ?", [(alarm_id,) for alarm_id in alarm_ids])
+        self.conn.commit()
+
+    def update_alarm_states(self, rows):
+        """Applies (armed, next_eligible_at, last_triggered_at, new_triggers, alarm_id) rows in one transaction."""
+        c = self.conn.cursor()
+        c.executemany(
+            "UPDATE alarms SET armed = ?, next_eligible_at = ?, "
+            "last_triggered_at = COALESCE(?, last_triggered_at), trigger_count = trigger_count + ? WHERE id = ?",
+            rows
+        )
+        self.conn.commit()
+
+    def deactivate_user_alarm(self, alarm_id, user_id):
+        """Deactivates one of the user's active alarms; returns False if there was none."""
+        c = self.conn.cursor()
+        c.execute(
+            "UPDATE alarms SET active = 0, changed_at = ? WHERE id = ? AND user_id = ? AND active = 1",
+            (int(time.time()), alarm_id, user_id)
+        )
+        self.conn.commit()
+        return c.rowcount > 0
+
     def add_price_data(self, symbol, price):
         c = self.conn.cursor()
-        c.execute("INSERT INTO price_data (symbol, price) VALUES (?, ?)", (symbol, price))
+        c.execute(
+            "INSERT INTO price_data (symbol, price, timestamp) VALUES (?, ?, ?)",
+            (symbol, price, int(time.time()))
+        )
+        self.conn.commit()
+
+    def add_price_data_many(self, rows):
+        """Inserts (symbol, price, epoch_seconds) rows in one transaction."""
+        c = self.conn.cursor()
+        c.executemany(
+            "INSERT INTO price_data (symbol, price, timestamp) VALUES (?, ?, ?)",
+            [(symbol, price, int(timestamp)) for symbol, price, timestamp in rows]
+        )
+        self.conn.commit()
+
+    def get_price_history(self, symbol, since, until=None):
+        """Returns (timestamp, price) rows for symbol between two epoch times."""
+        c = self.conn.cursor()
+        c.execute(
+            "SELECT timestamp, price FROM price_data WHERE symbol = ? AND timestamp >= ? AND timestamp < ? "
+            "ORDER BY timestamp",
+            (symbol, int(since), int(until if until is not None else time.time() + 1))
+        )
+        return c.fetchall()
+
+    def get_price_rows_after(self, after_id, limit):
+        """(id, symbol, price, timestamp) price_data rows with id > after_id, oldest first."""
+        c = self.conn.cursor()
+        c.execute(
+            "SELECT id, symbol, price, timestamp FROM price_data WHERE id > ? ORDER BY id LIMIT ?",
+            (after_id, limit)
+        )
+        return c.fetchall()
+
+    def get_price_bars(self, symbol, interval, since, until=None):
+        """Returns (ts, open, high, low, close, samples) rollup bars for symbol between two epoch times."""
+        c = self.conn.cursor()
+        c.execute(
+            "SELECT ts, open, high, low, close, samples FROM price_bars "
+            "WHERE symbol = ? AND interval = ? AND ts >= ? AND ts < ? ORDER BY ts",
+            (symbol, interval, int(since), int(until if until is not None else time.time() + 1))
+        )
+        return c.fetchall()
+
+    def get_price_bar_intervals(self):
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT interval FROM price_bars")]
+
+    def save_price_bars(self, bars, watermark_name=None, watermark=None):
+        """Upserts (symbol, interval, ts, open, high, low, close, samples) bars and a watermark in one transaction."""
+        c = self.conn.cursor()
+        c.executemany(
+            "INSERT OR REPLACE INTO price_bars (symbol, interval, ts, open, high, low, close, samples) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            bars
+        )
+        if watermark_name is not None:
+            c.execute(
+                "INSERT OR REPLACE INTO retention_state (name, value) VALUES (?, ?)", (watermark_name, watermark)
+            )
+        self.conn.commit()
+
+    def get_retention_state(self, name, default=0):
+        row = self.conn.execute("SELECT value FROM retention_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def delete_price_data_before(self, timestamp, max_id, limit):
+        """Deletes up to `limit` of the oldest raw rows older than timestamp (and not past max_id); returns the count."""
+        c = self.conn.cursor()
+        c.execute(
+            "DELETE FROM price_data WHERE id IN ("
+            "SELECT id FROM price_data WHERE id <= ? AND timestamp < ? ORDER BY id LIMIT ?)",
+            (max_id, int(timestamp), limit)
+        )
+        self.conn.commit()
+        return c.rowcount
+
+    def delete_price_bars_before(self, interval, timestamp, limit):
+        """Deletes up to `limit` bars of one interval older than timestamp; returns the count."""
+        c = self.conn.cursor()
+        c.execute(
+            "DELETE FROM price_bars WHERE interval = ? AND (symbol, ts) IN ("
+            "SELECT symbol, ts FROM price_bars WHERE interval = ? AND ts < ? LIMIT ?)",
+            (interval, interval, int(timestamp), limit)
+        )
+        self.conn.commit()
+        return c.rowcount
+
+    def vacuum_step(self, pages, full_vacuum_ratio=0.25):
+        """Returns free pages to the file system; returns the number of pages freed.
+
+        Incremental-vacuum databases give back up to `pages` pages. Older
+        databases are switched to incremental mode by one full VACUUM, run once
+        at least `full_vacuum_ratio` of the file is free pages.
+        """
+        page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        free = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free:
+            return 0
+
+        if self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            # execute() would step the pragma once, freeing a single page; executescript runs it to completion
+            self.conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        elif free >= page_count * full_vacuum_ratio:
+            self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self.conn.execute("VACUUM")
+        else:
+            return 0
+        return free - self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def get_candles(self, symbol, interval):
+        c = self.conn.cursor()
+        c.execute(
+            "SELECT ts, open, high, low, close, volume FROM candles WHERE symbol = ? AND interval = ? ORDER BY ts",
+            (symbol, interval)
+        )
+        return c.fetchall()
+
+    def upsert_candles(self, symbol, interval, bars):
+        """Inserts or replaces [ts, open, high, low, close, volume] bars in one transaction."""
+        c = self.conn.cursor()
+        c.executemany(
+            "INSERT OR REPLACE INTO candles (symbol, interval, ts, open, high, low, close, volume) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(symbol, interval, int(bar[0]), *bar[1:6]) for bar in bars]
+        )
+        self.conn.commit()
+
+    def get_indicator_states(self):
+        c = self.conn.cursor()
+        c.execute("SELECT symbol, state FROM indicator_state")
+        return c.fetchall()
+
+    def save_indicator_states(self, rows):
+        """Upserts (symbol, state_json, updated_at) rows in one transaction."""
+        c = self.conn.cursor()
+        c.executemany("INSERT OR REPLACE INTO indicator_state (symbol, state, updated_at) VALUES (?, ?, ?)", rows)
+        self.conn.commit()
+
+    def delete_indicator_states(self, symbols):
+        c = self.conn.cursor()
+        c.executemany("DELETE FROM indicator_state WHERE symbol = ?", [(symbol,) for symbol in symbols])
         self.conn.commit()
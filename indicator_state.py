@@ -0,0 +1,388 @@
+"""
+Incremental indicator state per symbol.
+
+The scheduler feeds every observed price into an IndicatorBook. Prices are
+folded into bars (daily by default); each completed bar updates O(1)
+accumulators (ring-buffer SMAs, Wilder RSI, rolling Welford variance), so the
+per-tick cost is constant. Reads include the still-forming bar without
+committing it, which matches the candle frames /performance and /predict
+used to download (whose last row is today's partial bar).
+"""
+
+import copy
+import json
+import math
+import time
+from collections import deque
+
+class RingSMA:
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+
+    def update(self, value):
+        if len(self.values) == self.window:
+            self.total -= self.values[0]
+        self.values.append(value)
+        self.total += value
+
+    def value(self):
+        return self.total / len(self.values) if len(self.values) == self.window else None
+
+    def to_dict(self):
+        return {'window': self.window, 'values': list(self.values)}
+
+    @classmethod
+    def from_dict(cls, data):
+        sma = cls(data['window'])
+        for value in data['values']:
+            sma.update(value)
+        return sma
+
+class RunningEMA:
+    """EMA with alpha = 2 / (span + 1), seeded with the SMA of the first `span` values."""
+
+    def __init__(self, span):
+        self.span = span
+        self.alpha = 2.0 / (span + 1)
+        self.count = 0
+        self.current = 0.0
+
+    def update(self, value):
+        self.count += 1
+        if self.count <= self.span:
+            self.current += (value - self.current) / self.count
+        else:
+            self.current += self.alpha * (value - self.current)
+
+    def value(self):
+        return self.current if self.count >= self.span else None
+
+    def to_dict(self):
+        return {'span': self.span, 'count': self.count, 'current': self.current}
+
+    @classmethod
+    def from_dict(cls, data):
+        ema = cls(data['span'])
+        ema.count, ema.current = data['count'], data['current']
+        return ema
+
+class WilderRSI:
+    def __init__(self, period=14):
+        self.period = period
+        self.prev_close = None
+        self.count = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def update(self, close):
+        if self.prev_close is not None:
+            change = close - self.prev_close
+            gain, loss = max(change, 0.0), max(-change, 0.0)
+            self.count += 1
+            if self.count <= self.period:
+                # Seed with plain averages of the first `period` changes
+                self.avg_gain += (gain - self.avg_gain) / self.count
+                self.avg_loss += (loss - self.avg_loss) / self.count
+            else:
+                self.avg_gain += (gain - self.avg_gain) / self.period
+                self.avg_loss += (loss - self.avg_loss) / self.period
+        self.prev_close = close
+
+    def value(self):
+        if self.count < self.period:
+            return None
+        if self.avg_loss == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + self.avg_gain / self.avg_loss)
+
+    def to_dict(self):
+        return {
+            'period': self.period, 'prev_close': self.prev_close, 'count': self.count,
+            'avg_gain': self.avg_gain, 'avg_loss': self.avg_loss
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        rsi = cls(data['period'])
+        rsi.prev_close, rsi.count = data['prev_close'], data['count']
+        rsi.avg_gain, rsi.avg_loss = data['avg_gain'], data['avg_loss']
+        return rsi
+
+class RollingWelford:
+    """Mean and sample variance over the last `window` values (Welford add/remove)."""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, value):
+        if len(self.values) == self.window:
+            old = self.values.popleft()
+            n = len(self.values)
+            if n == 0:
+                self.mean, self.m2 = 0.0, 0.0
+            else:
+                old_mean = self.mean
+                self.mean -= (old - self.mean) / n
+                self.m2 -= (old - old_mean) * (old - self.mean)
+
+        self.values.append(value)
+        n = len(self.values)
+        delta = value - self.mean
+        self.mean += delta / n
+        self.m2 += delta * (value - self.mean)
+
+    def variance(self):
+        n = len(self.values)
+        return max(self.m2, 0.0) / (n - 1) if n > 1 else None
+
+    def std(self):
+        variance = self.variance()
+        return math.sqrt(variance) if variance is not None else None
+
+    def to_dict(self):
+        return {'window': self.window, 'values': list(self.values)}
+
+    @classmethod
+    def from_dict(cls, data):
+        welford = cls(data['window'])
+        for value in data['values']:
+            welford.update(value)
+        return welford
+
+class SymbolIndicators:
+    """Bar-folded incremental indicators for one symbol."""
+
+    HISTORY = 30
+
+    def __init__(self, bar_seconds=86400):
+        self.bar_seconds = bar_seconds
+        self.bars = deque(maxlen=self.HISTORY)  # committed (bar_start, high, low, close)
+        self.forming = None                     # [bar_start, high, low, close]
+        self.updated_at = None
+        self._reset_accumulators()
+
+    def _reset_accumulators(self):
+        self.sma_7 = RingSMA(7)
+        self.sma_14 = RingSMA(14)
+        self.ema_12 = RunningEMA(12)
+        self.ema_26 = RunningEMA(26)
+        self.rsi = WilderRSI(14)
+        self.returns = RollingWelford(self.HISTORY - 1)
+        self.abs_returns = RingSMA(13)
+        self.last_close = None
+
+    def update(self, price, timestamp=None):
+        """Folds one price tick into the current bar: O(1)."""
+        timestamp = timestamp if timestamp is not None else time.time()
+        bar_start = int(timestamp // self.bar_seconds * self.bar_seconds)
+
+        if self.forming is None or bar_start > self.forming[0]:
+            if self.forming is not None:
+                self._commit(self.forming)
+            self.forming = [bar_start, price, price, price]
+        elif bar_start == self.forming[0]:
+            self.forming[1] = max(self.forming[1], price)
+            self.forming[2] = min(self.forming[2], price)
+            self.forming[3] = price
+        self.updated_at = timestamp
+
+    def seed(self, bars):
+        """Rebuilds state from (bar_start, high, low, close) history; the last bar is still forming."""
+        self.bars.clear()
+        self.forming = None
+        self._reset_accumulators()
+        for bar in bars[:-1]:
+            self._commit(list(bar))
+        if len(bars):
+            self.forming = [int(value) if i == 0 else float(value) for i, value in enumerate(bars[-1])]
+        self.updated_at = time.time()
+
+    def _commit(self, bar):
+        self.bars.append(tuple(bar))
+        self._feed(self, bar[3])
+
+    @staticmethod
+    def _feed(state, close):
+        if state.last_close:
+            ret = close / state.last_close - 1.0
+            state.returns.update(ret)
+            state.abs_returns.update(abs(ret))
+        state.last_close = close
+        state.sma_7.update(close)
+        state.sma_14.update(close)
+        state.ema_12.update(close)
+        state.ema_26.update(close)
+        state.rsi.update(close)
+
+    def ready(self, min_bars=14, max_age=None):
+        if len(self.bars) < min_bars or self.forming is None:
+            return False
+        return max_age is None or (time.time() - self.updated_at) <= max_age
+
+    def _with_forming(self):
+        """Accumulators as if the forming bar closed now (a copy; O(window))."""
+        view = copy.copy(self)
+        for name in ('sma_7', 'sma_14', 'ema_12', 'ema_26', 'rsi', 'returns', 'abs_returns'):
+            setattr(view, name, copy.deepcopy(getattr(self, name)))
+        if self.forming is not None:
+            self._feed(view, self.forming[3])
+        return view
+
+    def closes(self):
+        closes = [bar[3] for bar in self.bars]
+        if self.forming is not None:
+            closes.append(self.forming[3])
+        return closes[-self.HISTORY:]
+
+    def performance(self):
+        view = self._with_forming()
+        closes = self.closes()
+        bars = list(self.bars)[-(self.HISTORY - 1):] + [tuple(self.forming)]
+        std = view.returns.std()
+        rsi = view.rsi.value()
+        return {
+            'current_price': closes[-1],
+            'price_7d': closes[-7] if len(closes) >= 7 else closes[0],
+            'price_30d': closes[0],
+            'high_30d': max(bar[1] for bar in bars),
+            'low_30d': min(bar[2] for bar in bars),
+            'volatility': std * 100 if std is not None else 0.0,
+            'rsi': rsi if rsi is not None else 50.0
+        }
+
+    def prediction(self):
+        view = self._with_forming()
+        closes = self.closes()
+        current_price = closes[-1]
+        abs_change = view.abs_returns.value()
+        return {
+            'current_price': current_price,
+            'ma_7': view.sma_7.value() or current_price,
+            'ma_14': view.sma_14.value() or current_price,
+            'ma_30': sum(closes) / len(closes),
+            'recent_trend': (closes[-1] - closes[-7]) / 6 if len(closes) >= 7 else 0,
+            'abs_change_pct': abs_change * 100 if abs_change is not None else None
+        }
+
+    def to_dict(self):
+        return {
+            'bar_seconds': self.bar_seconds,
+            'bars': [list(bar) for bar in self.bars],
+            'forming': self.forming,
+            'updated_at': self.updated_at,
+            'last_close': self.last_close,
+            'sma_7': self.sma_7.to_dict(),
+            'sma_14': self.sma_14.to_dict(),
+            'ema_12': self.ema_12.to_dict(),
+            'ema_26': self.ema_26.to_dict(),
+            'rsi': self.rsi.to_dict(),
+            'returns': self.returns.to_dict(),
+            'abs_returns': self.abs_returns.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(data['bar_seconds'])
+        state.bars.extend(tuple(bar) for bar in data['bars'])
+        state.forming = data['forming']
+        state.updated_at = data['updated_at']
+        state.last_close = data['last_close']
+        state.sma_7 = RingSMA.from_dict(data['sma_7'])
+        state.sma_14 = RingSMA.from_dict(data['sma_14'])
+        state.ema_12 = RunningEMA.from_dict(data['ema_12'])
+        state.ema_26 = RunningEMA.from_dict(data['ema_26'])
+        state.rsi = WilderRSI.from_dict(data['rsi'])
+        state.returns = RollingWelford.from_dict(data['returns'])
+        state.abs_returns = RingSMA.from_dict(data['abs_returns'])
+        return state
+
+class IndicatorBook:
+    """SymbolIndicators for every tracked symbol, fed by the scheduler's prices.
+
+    A symbol is tracked from the moment /performance or /predict seeds it
+    until no reader has asked for it within `evict_idle`'s window.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._dirty = set()
+        self._read_at = {}    # symbol -> time.time() of the last get() or seed()
+        self._removed = set()  # evicted symbols whose snapshots should be deleted
+
+    def __contains__(self, symbol):
+        return symbol in self._states
+
+    def symbols(self):
+        return set(self._states)
+
+    def get(self, symbol):
+        state = self._states.get(symbol)
+        if state is not None:
+            self._read_at[symbol] = time.time()
+        return state
+
+    def track(self, symbol):
+        state = self._states.get(symbol)
+        if state is None:
+            state = self._states[symbol] = SymbolIndicators()
+            self._removed.discard(symbol)
+        return state
+
+    def seed(self, symbol, bars):
+        self.track(symbol).seed(bars)
+        self._read_at[symbol] = time.time()
+        self._dirty.add(symbol)
+
+    def discard(self, symbol):
+        if self._states.pop(symbol, None) is not None:
+            self._read_at.pop(symbol, None)
+            self._dirty.discard(symbol)
+            self._removed.add(symbol)
+
+    def evict_idle(self, max_idle, now=None):
+        """Stops tracking symbols nobody has read within max_idle seconds; returns them."""
+        now = now if now is not None else time.time()
+        idle = [symbol for symbol in self._states if now - self._read_at.get(symbol, 0) > max_idle]
+        for symbol in idle:
+            self.discard(symbol)
+        return idle
+
+    def drain_removed(self):
+        """Returns the symbols discarded since the last call."""
+        removed, self._removed = sorted(self._removed), set()
+        return removed
+
+    def update(self, symbol, price, timestamp=None):
+        state = self._states.get(symbol)
+        if state is not None:
+            state.update(price, timestamp)
+            self._dirty.add(symbol)
+
+    def update_prices(self, prices, timestamp=None):
+        for symbol, price in prices.items():
+            self.update(symbol, price, timestamp)
+
+    def load(self, rows):
+        """Restores (symbol, state_json) rows saved by snapshot()."""
+        for symbol, state_json in rows:
+            try:
+                state = SymbolIndicators.from_dict(json.loads(state_json))
+            except (ValueError, KeyError, TypeError):
+                continue
+            self._states[symbol] = state
+            # Restored states get the rest of their idle window, counted from the last update
+            self._read_at[symbol] = state.updated_at or 0
+
+    def snapshot(self):
+        """Returns (symbol, state_json, updated_at) rows for states changed since the last snapshot."""
+        rows = [
+            (symbol, json.dumps(self._states[symbol].to_dict()), int(self._states[symbol].updated_at or 0))
+            for symbol in self._dirty if symbol in self._states
+        ]
+        self._dirty.clear()
+        return rows
@@ -0,0 +1,112 @@
+"""
+Vectorized technical indicators.
+
+Every function takes a 1-D series or a 2-D array with one row per symbol and
+works along the last axis, so many symbols are computed in one call. Output
+arrays have the input's shape; positions without enough history are NaN.
+"""
+
+import numpy as np
+
+def _as_float(values):
+    return np.asarray(values, dtype=np.float64)
+
+def returns(values):
+    """Simple period-over-period returns (pct change as a fraction); first column is NaN."""
+    values = _as_float(values)
+    out = np.full(values.shape, np.nan)
+    out[..., 1:] = values[..., 1:] / values[..., :-1] - 1.0
+    return out
+
+def sma(values, window):
+    """Simple moving average over `window` periods."""
+    values = _as_float(values)
+    out = np.full(values.shape, np.nan)
+    if window <= 0 or values.shape[-1] < window:
+        return out
+
+    cumsum = np.cumsum(values, axis=-1)
+    out[..., window - 1] = cumsum[..., window - 1]
+    out[..., window:] = cumsum[..., window:] - cumsum[..., :-window]
+    out[..., window - 1:] /= window
+    return out
+
+def _smooth(values, alpha, start, seed):
+    """Recursive smoothing y[t] = y[t-1] + alpha * (x[t] - y[t-1]) from index `start`, seeded with `seed`.
+
+    The recursion runs over time only; each step is one array operation across all rows.
+    """
+    out = np.full(values.shape, np.nan)
+    out[..., start] = seed
+    current = seed
+    for t in range(start + 1, values.shape[-1]):
+        current = current + alpha * (values[..., t] - current)
+        out[..., t] = current
+    return out
+
+def ema(values, span):
+    """Exponential moving average with alpha = 2 / (span + 1), seeded with the first SMA."""
+    values = _as_float(values)
+    if values.shape[-1] < span:
+        return np.full(values.shape, np.nan)
+    seed = values[..., :span].mean(axis=-1)
+    return _smooth(values, 2.0 / (span + 1), span - 1, seed)
+
+def wilder(values, period):
+    """Wilder's smoothing (alpha = 1 / period), seeded with the mean of the first `period` values."""
+    values = _as_float(values)
+    if values.shape[-1] < period:
+        return np.full(values.shape, np.nan)
+    seed = values[..., :period].mean(axis=-1)
+    return _smooth(values, 1.0 / period, period - 1, seed)
+
+def rsi(closes, period=14):
+    """Wilder's Relative Strength Index; the first value appears at index `period`."""
+    closes = _as_float(closes)
+    out = np.full(closes.shape, np.nan)
+    if closes.shape[-1] <= period:
+        return out
+
+    deltas = np.diff(closes, axis=-1)
+    avg_gain = wilder(np.clip(deltas, 0, None), period)
+    avg_loss = wilder(np.clip(-deltas, 0, None), period)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    value = np.where(avg_loss == 0, 100.0, value)
+    value = np.where(np.isnan(avg_gain), np.nan, value)
+    out[..., 1:] = value
+    return out
+
+def volatility(closes, window=None):
+    """Sample standard deviation of returns, over the whole series or a rolling window."""
+    rets = returns(closes)[..., 1:]
+    if window is None:
+        if rets.shape[-1] < 2:
+            return np.full(rets.shape[:-1], np.nan)
+        return rets.std(axis=-1, ddof=1)
+
+    out = np.full(np.shape(closes), np.nan)
+    if rets.shape[-1] < window or window < 2:
+        return out
+    mean = sma(rets, window)
+    mean_sq = sma(rets * rets, window)
+    variance = (mean_sq - mean * mean) * window / (window - 1)
+    out[..., 1:] = np.sqrt(np.clip(variance, 0, None))
+    return out
+
+def atr(high, low, close, period=14):
+    """Wilder's Average True Range."""
+    high, low, close = _as_float(high), _as_float(low), _as_float(close)
+    prev_close = np.concatenate([close[..., :1], close[..., :-1]], axis=-1)
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    true_range[..., 0] = high[..., 0] - low[..., 0]
+    return wilder(true_range, period)
+
+def bollinger(closes, window=20, num_std=2.0):
+    """Bollinger bands: returns (middle, upper, lower) using the population std of closes."""
+    closes = _as_float(closes)
+    middle = sma(closes, window)
+    mean_sq = sma(closes * closes, window)
+    std = np.sqrt(np.clip(mean_sq - middle * middle, 0, None))
+    return middle, middle + num_std * std, middle - num_std * std
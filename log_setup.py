@@ -0,0 +1,172 @@
+"""
+Non-blocking logging pipeline.
+
+Every logger hands its records to a QueueHandler, which only formats the
+message and puts it on an in-memory queue; a QueueListener thread does the
+file and console I/O. The log file holds one JSON object per line and is
+rotated by size and by age. Chatty loggers (httpx logs every getUpdates
+and price request at INFO) are sampled before they reach the queue;
+warnings and errors are always kept.
+"""
+
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+from config import (
+    LOG_FILE, LOG_LEVEL, LOG_MAX_BYTES, LOG_MAX_AGE_SECONDS, LOG_BACKUP_COUNT, LOG_SAMPLING, LOG_QUEUE_SIZE
+)
+
+CONSOLE_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener = None
+_handler = None
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, and exc when there is a traceback."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if record.processName != 'MainProcess':
+            entry['process'] = record.processName
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Size-based rotation that also rolls the file over once it is `max_age` seconds old."""
+
+    def __init__(self, filename, max_bytes, max_age, backup_count):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.max_age = max_age
+        self.opened_at = time.time()
+
+    def shouldRollover(self, record):
+        if self.max_age and time.time() - self.opened_at >= self.max_age:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.opened_at = time.time()
+
+class SamplingFilter(logging.Filter):
+    """Keeps one in N records below WARNING from the configured loggers (and their children).
+
+    `rates` maps a logger name to N; N = 0 drops those records entirely.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+        self._counters = {name: itertools.count() for name in self.rates}
+        self._resolved = {}  # logger name -> configured name or None
+        self.dropped = 0
+
+    def _configured(self, name):
+        if name not in self._resolved:
+            match = None
+            for prefix in sorted(self.rates, key=len, reverse=True):
+                if name == prefix or name.startswith(prefix + "."):
+                    match = prefix
+                    break
+            self._resolved[name] = match
+        return self._resolved[name]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        name = self._configured(record.name)
+        if name is None:
+            return True
+        rate = self.rates[name]
+        if rate and next(self._counters[name]) % rate == 0:
+            return True
+        self.dropped += 1
+        return False
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: when the queue is full the record is counted and dropped."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Merge the arguments now (they may change after this call returns) and
+        # render the traceback, which cannot be pickled or read later
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def configure_logging(path=LOG_FILE, level=LOG_LEVEL, max_bytes=LOG_MAX_BYTES, max_age=LOG_MAX_AGE_SECONDS,
+                      backup_count=LOG_BACKUP_COUNT, sampling=LOG_SAMPLING, queue_size=LOG_QUEUE_SIZE,
+                      console_format=CONSOLE_FORMAT):
+    """Routes the root logger through a queue to a JSON-lines file (unless `path` is empty) and the console."""
+    global _listener, _handler
+    if _listener is not None:
+        return _listener
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter(console_format))
+    handlers = [console]
+    if path:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        log_file = RotatingFileHandler(path, max_bytes, max_age, backup_count)
+        log_file.setFormatter(JsonFormatter())
+        handlers.append(log_file)
+
+    log_queue = queue.Queue(queue_size)
+    _handler = QueueHandler(log_queue)
+    _handler.sampler = SamplingFilter(sampling)
+    _handler.addFilter(_handler.sampler)
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def dropped_records():
+    """{'sampled': ..., 'queue_full': ...} records dropped since configure_logging()."""
+    if _handler is None:
+        return {'sampled': 0, 'queue_full': 0}
+    return {'sampled': _handler.sampler.dropped, 'queue_full': _handler.dropped}
+
+def stop_logging():
+    """Writes out whatever is still queued and closes the log file."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
@@ -1,102 +1,286 @@
+import argparse
 import logging
-import time
 import signal
 import sys
 import asyncio
 from scheduler import AlarmScheduler
-from config import TELEGRAM_BOT_TOKEN
+from sharding import ShardCoordinator
+from alarm_index import AlarmIndex, AlarmSync
+from retention import RetentionEngine
+from indicator_state import IndicatorBook
+from database import Database
+from api_handler import APIHandler
+from metrics import CallbackMetric, MetricsServer
+from log_setup import configure_logging, dropped_records, stop_logging
+from config import TELEGRAM_BOT_TOKEN, SCHEDULER_WORKERS, UPDATE_MODE, ALARM_SYNC_SECONDS, METRICS_PORT
 from bot_telegram import TelegramBot
 
-# Logging configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('crypto_bot.log', encoding='utf-8'),  # To handle emoji errors
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# alarms: evaluate alarms and send notifications, take no commands
+# commands: answer commands, leave alarm evaluation to an "alarms" process
+# all: both in one process
+ROLES = ("all", "alarms", "commands")
 
 logger = logging.getLogger(__name__)
 
 class CryptoAlarmBot:
-    def __init__(self):
+    def __init__(self, role="all"):
+        self.role = role
+        self.runs_alarms = role in ("all", "alarms")
+        self.runs_commands = role in ("all", "commands")
         self.telegram_bot = None
         self.scheduler = None
+        self.webhook = None
+        self.alarm_index = None
+        self.alarm_sync = None
+        self.alarm_sync_task = None
+        self.metrics_server = None
+        self.retention = None
+        self.indicator_book = None
+        self.api = None
+        self.db = None
         self.running = False
 
     def setup(self):
         try:
+            # One shared database handle for the bot handlers and the scheduler
+            self.db = Database()
+
+            # With --role commands there is no index here; the alarms process
+            # picks up new and deleted alarms from the database
+            if self.runs_alarms and SCHEDULER_WORKERS > 0:
+                # Worker processes own the alarms; the coordinator routes the bot's index updates
+                self.scheduler = ShardCoordinator(db_path=self.db.db_path, workers=SCHEDULER_WORKERS)
+                self.alarm_index = self.scheduler
+            elif self.runs_alarms:
+                self.alarm_index = AlarmIndex()
+
+            if self.role == "alarms":
+                # Created before the load so no change falls between the two
+                self.alarm_sync = AlarmSync(self.db, self.alarm_index, ALARM_SYNC_SECONDS)
+            if isinstance(self.alarm_index, AlarmIndex):
+                # Load active alarms once; the bot and the scheduler keep the index in sync
+                self.alarm_index.load(self.db.get_all_active_alarms())
+                logger.info(f"Alarm index loaded: {len(self.alarm_index)} active alarms")
+
+            # Incremental indicators: fed by the in-process scheduler, read by /performance and /predict.
+            # Shard workers and --role commands have nothing here to keep them current, so the
+            # commands compute from candles instead
+            if self.runs_alarms and SCHEDULER_WORKERS == 0:
+                self.indicator_book = IndicatorBook()
+                self.indicator_book.load(self.db.get_indicator_states())
+
+            # The process that records prices also rolls them up and expires them
+            if self.runs_alarms:
+                self.retention = RetentionEngine(self.db)
+
+            # One pooled HTTP client for the scheduler and /price
+            self.api = APIHandler()
+
             if TELEGRAM_BOT_TOKEN:
-                self.telegram_bot = TelegramBot()
+                self.telegram_bot = TelegramBot(
+                    alarm_index=self.alarm_index,
+                    api=self.api,
+                    db=self.db,
+                    indicator_book=self.indicator_book
+                )
                 logger.info("Telegram bot configured")
             else:
                 logger.warning("TELEGRAM_BOT_TOKEN not found!")
 
-            self.scheduler = AlarmScheduler(telegram_bot=self.telegram_bot)
-            logger.info("Bot setup completed")
+            if self.scheduler:
+                self.scheduler.telegram_bot = self.telegram_bot
+            elif self.runs_alarms:
+                self.scheduler = AlarmScheduler(
+                    telegram_bot=self.telegram_bot,
+                    alarm_index=self.alarm_index,
+                    api=self.api,
+                    db=self.db,
+                    indicator_book=self.indicator_book
+                )
+            self.register_metrics()
+            logger.info(f"Bot setup completed (role: {self.role})")
         except Exception as e:
             logger.error(f"Bot setup error: {e}")
             raise
 
+    def register_metrics(self):
+        """Exports the counters and queue depths the components already keep; read only when scraped."""
+        api = self.api
+        CallbackMetric("price_cache_lookups_total", "Price lookups by result", lambda: {
+            ("hit",): api.hits, ("miss",): api.misses, ("coalesced",): api.coalesced
+        }, kind="counter", labelnames=["result"])
+        CallbackMetric("price_requests_total", "Price fetches sent to the providers", lambda: api.requests, "counter")
+        CallbackMetric("price_provider_circuit_open", "1 while a provider's circuit breaker is open", lambda: {
+            (name,): int(provider['circuit_open']) for name, provider in api.router.stats()['providers'].items()
+        }, labelnames=["provider"])
+
+        CallbackMetric("log_records_dropped_total", "Log records sampled out or dropped on a full queue", lambda: {
+            (reason,): count for reason, count in dropped_records().items()
+        }, kind="counter", labelnames=["reason"])
+
+        if self.alarm_index is not None:
+            index = self.alarm_index
+            CallbackMetric("active_alarms", "Alarms being evaluated", lambda: len(index))
+        if self.scheduler and hasattr(self.scheduler, "price_recorder"):
+            recorder = self.scheduler.price_recorder
+            CallbackMetric("price_recorder_queue_depth", "Price rows waiting to be written",
+                           lambda: recorder.stats()['queue_depth'])
+            CallbackMetric("price_rows_written_total", "Price rows written", lambda: recorder.rows_written, "counter")
+        if self.retention:
+            retention = self.retention
+            CallbackMetric("retention_rows_total", "price_data ticks rolled up and rows expired", lambda: {
+                ("rolled",): retention.rows_rolled, ("expired",): retention.rows_deleted
+            }, kind="counter", labelnames=["action"])
+        if self.alarm_sync:
+            sync = self.alarm_sync
+            CallbackMetric("alarm_sync_changes_total", "Alarm changes picked up from the database",
+                           lambda: sync.applied, "counter")
+
+        if self.telegram_bot:
+            bot = self.telegram_bot
+            notifier = bot.notifier
+            CallbackMetric("notification_queue_depth", "Notifications waiting", lambda: {
+                (stage,): notifier.stats()[key]
+                for stage, key in (("queue", 'queue_depth'), ("digest", 'pending_digests'), ("retry", 'pending_retries'))
+            }, labelnames=["stage"])
+            CallbackMetric("notifications_total", "Notification deliveries by outcome", lambda: {
+                ("sent",): notifier.sent, ("failed",): notifier.failed, ("retried",): notifier.retried,
+                ("rate_limited",): notifier.rate_limited, ("coalesced",): notifier.coalesced
+            }, kind="counter", labelnames=["outcome"])
+            CallbackMetric("command_rejections_total", "Commands rejected by admission control", lambda: {
+                (command_class, reason): count
+                for command_class, rejected in bot.admission.rejected.items()
+                for reason, count in rejected.items()
+            }, kind="counter", labelnames=["command_class", "reason"])
+            CallbackMetric("commands_running", "Admitted commands in progress", lambda: {
+                (command_class,): stats['running'] for command_class, stats in bot.admission.stats().items()
+            }, labelnames=["command_class"])
+            CallbackMetric("update_queue_depth", "Telegram updates waiting for a handler",
+                           lambda: bot.application.update_queue.qsize())
+            CallbackMetric("chart_render_queue_depth", "Charts queued or rendering",
+                           lambda: bot.chart_renderer.stats()['pending'])
+            CallbackMetric("chart_cache_lookups_total", "Chart cache lookups by result", lambda: {
+                ("hit",): bot.chart_cache.hits, ("miss",): bot.chart_cache.misses
+            }, kind="counter", labelnames=["result"])
+
     def start_scheduler(self):
         if self.scheduler:
             self.scheduler.start_scheduler()
 
-    def signal_handler(self, signum, frame):
+    def signal_handler(self, signum, frame=None):
         logger.info(f"Signal {signum} received, shutting down bot...")
-        self.shutdown()
-        sys.exit(0)
+        self.running = False
 
-    def shutdown(self):
+    async def shutdown(self):
         logger.info("Shutting down bot...")
-        if self.scheduler:
-            self.scheduler.stop_scheduler()
         self.running = False
+        if self.alarm_sync_task:
+            self.alarm_sync_task.cancel()
+        if self.scheduler:
+            await self.scheduler.stop_scheduler()
+        if self.retention:
+            await self.retention.stop()
+        if self.telegram_bot:
+            application = self.telegram_bot.application
+            # Stop taking updates, then let the handlers finish the ones already received
+            if self.webhook:
+                await self.webhook.stop()
+            if application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+            # Deliver what is already queued before the bot's HTTP client closes
+            await self.telegram_bot.notifier.stop()
+            await self.telegram_bot.chart_renderer.stop()
+            await application.shutdown()
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        if self.api:
+            await self.api.close()
+        if self.db:
+            self.db.close()
         logger.info("Bot successfully shut down")
 
-    def run(self):
+    def install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.signal_handler, sig)
+            except NotImplementedError:
+                # Windows: no loop signal handlers
+                signal.signal(sig, self.signal_handler)
+
+    async def run_all(self):
+        """Runs the Telegram application and the alarm scheduler on one event loop."""
+        self.install_signal_handlers()
+        self.running = True
+
         try:
-            print("🚀 main.py started")
-            logger.info("🚀 Starting Crypto/Forex Alarm Bot...")
+            if self.telegram_bot:
+                await self.telegram_bot.application.initialize()
+                await self.telegram_bot.application.start()
+                # With --role alarms the bot only sends notifications and takes no updates
+                if self.runs_commands and UPDATE_MODE == "webhook":
+                    # aiohttp is only needed by webhook deployments
+                    from webhook_server import WebhookServer
+                    self.webhook = WebhookServer(self.telegram_bot.application)
+                    await self.webhook.start()
+                elif self.runs_commands:
+                    await self.telegram_bot.application.updater.start_polling()
+                await self.telegram_bot.notifier.start()
+                if self.runs_commands:
+                    await self.telegram_bot.chart_renderer.start()
 
-            signal.signal(signal.SIGINT, self.signal_handler)
-            signal.signal(signal.SIGTERM, self.signal_handler)
+            if METRICS_PORT:
+                self.metrics_server = MetricsServer()
+                await self.metrics_server.start()
 
-            self.setup()
-            self.running = True
             self.start_scheduler()
+            if self.retention:
+                self.retention.start()
+            if self.alarm_sync:
+                self.alarm_sync_task = asyncio.get_running_loop().create_task(self.alarm_sync.run())
 
-            logger.info("✅ All services started successfully!")
-            print("Bot is running... Press Ctrl+C to stop")
+            logger.info("✅ All services started successfully! Press Ctrl+C to stop")
 
-            # Start async task for Telegram bot and scheduler to run concurrently
-            async def run_all():
-                await self.telegram_bot.application.initialize()
-                await self.telegram_bot.application.start()
-                await self.telegram_bot.application.updater.start_polling()
-                while self.running:
-                    await asyncio.sleep(1)
+            while self.running:
+                await asyncio.sleep(1)
+        finally:
+            await self.shutdown()
 
-            asyncio.run(run_all())
+    def run(self):
+        try:
+            logger.info("🚀 Starting Crypto/Forex Alarm Bot...")
+
+            self.setup()
+            asyncio.run(self.run_all())
 
         except Exception as e:
             logger.error(f"Bot startup error: {e}")
             raise
-        finally:
-            self.shutdown()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Crypto/Forex alarm bot")
+    parser.add_argument(
+        "--role", choices=ROLES, default="all",
+        help="alarms: evaluate alarms only; commands: answer Telegram commands only; all: both (default)"
+    )
+    return parser.parse_args(argv)
 
 def main():
+    args = parse_args()
+    # Log records go through a queue; files are written on the listener's thread
+    configure_logging()
     try:
-        bot = CryptoAlarmBot()
+        bot = CryptoAlarmBot(role=args.role)
         bot.run()
     except KeyboardInterrupt:
         logger.info("Stopped by user")
-        print("Stopped by user")
     except Exception as e:
         logger.error(f"Critical error: {e}")
-        print(f"Critical error: {e}")
         sys.exit(1)
+    finally:
+        stop_logging()
 
 if __name__ == "__main__":
     main()
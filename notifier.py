@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import time
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+from rate_limit import TokenBucket, TokenBuckets
+from metrics import Histogram
+from config import (
+    NOTIFY_WORKERS, NOTIFY_RATE_PER_SECOND, NOTIFY_CHAT_RATE_PER_SECOND, NOTIFY_MAX_ATTEMPTS,
+    NOTIFY_DIGEST_SECONDS, TELEGRAM_MAX_MESSAGE_LENGTH, TELEGRAM_MESSAGE_HEADROOM
+)
+
+SEND_SECONDS = Histogram("notification_send_seconds", "Telegram send_message latency", ["outcome"])
+
+def telegram_length(text):
+    """Message length as Telegram counts it: UTF-16 code units, so most emoji count twice."""
+    return len(text.encode('utf-16-le')) // 2
+
+def _fit(text, limit):
+    """Index just past the longest prefix of text that is at most `limit` UTF-16 code units long."""
+    units = 0
+    for i, char in enumerate(text):
+        units += 2 if ord(char) > 0xFFFF else 1
+        if units > limit:
+            return i
+    return len(text)
+
+def _split_long(text, limit):
+    """Splits one oversized text at line breaks (or hard at `limit` if a line is longer)."""
+    pieces, current, size = [], "", 0
+    for line in text.splitlines(keepends=True):
+        while telegram_length(line) > limit:
+            if current:
+                pieces.append(current)
+                current, size = "", 0
+            cut = _fit(line, limit)
+            pieces.append(line[:cut])
+            line = line[cut:]
+        length = telegram_length(line)
+        if size + length > limit:
+            pieces.append(current)
+            current, size = "", 0
+        current += line
+        size += length
+    if current:
+        pieces.append(current)
+    return pieces
+
+def build_digests(texts, limit=TELEGRAM_MAX_MESSAGE_LENGTH - TELEGRAM_MESSAGE_HEADROOM):
+    """Packs notifications into as few messages of at most `limit` UTF-16 code units as possible.
+
+    Returns (text, formatted) pairs. Messages are only cut between
+    notifications, so their Markdown stays intact. A single notification
+    longer than `limit` has to be cut at line breaks, and a cut can fall
+    inside an entity, so its pieces are sent as plain text (formatted False).
+    """
+    if len(texts) == 1 and telegram_length(texts[0]) <= limit:
+        return [(texts[0], True)]
+
+    separator = "\n\n"
+    messages = []
+    current = f"🔔 *{len(texts)} notifications*" if len(texts) > 1 else ""
+    size = telegram_length(current)
+    for text in texts:
+        text = text.strip()
+        length = telegram_length(text)
+        if length > limit:
+            if current:
+                messages.append((current, True))
+                current, size = "", 0
+            messages.extend((piece, False) for piece in _split_long(text, limit))
+        elif current and size + len(separator) + length > limit:
+            messages.append((current, True))
+            current, size = text, length
+        elif current:
+            current = f"{current}{separator}{text}"
+            size += len(separator) + length
+        else:
+            current, size = text, length
+    if current:
+        messages.append((current, True))
+    return messages
+
+class NotificationDispatcher:
+    """Queue of outgoing messages drained by N workers within Telegram's rate limits.
+
+    Messages for the same chat submitted within `digest_window` seconds are
+    sent as one digest (split at Telegram's message size limit), so a burst
+    of alarms costs one API call per user instead of one per alarm.
+
+    `bot` is anything with an async send_message(chat_id=..., text=..., parse_mode=...),
+    so a fake bot can be dropped in to measure throughput offline.
+    """
+
+    def __init__(self, bot, workers=NOTIFY_WORKERS, rate=NOTIFY_RATE_PER_SECOND,
+                 per_chat_rate=NOTIFY_CHAT_RATE_PER_SECOND, max_attempts=NOTIFY_MAX_ATTEMPTS,
+                 parse_mode="Markdown", digest_window=NOTIFY_DIGEST_SECONDS, base_backoff=1.0, max_backoff=60):
+        self.bot = bot
+        self.workers = workers
+        self.per_chat_rate = per_chat_rate
+        self.max_attempts = max_attempts
+        self.parse_mode = parse_mode
+        self.digest_window = digest_window
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.global_bucket = TokenBucket(rate)
+        self.queue = asyncio.Queue()
+        self._chat_buckets = TokenBuckets(per_chat_rate, capacity=3)
+        self._tasks = []
+        self._retry_handles = set()
+        self._digests = {}  # chat_id -> [texts waiting for the digest window to close]
+        self._digest_handles = {}
+
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self.coalesced = 0
+        self._first_send_at = None
+        self._last_send_at = None
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logging.info(f"📬 Notification dispatcher started with {self.workers} workers")
+
+    async def stop(self, timeout=10):
+        """Waits up to `timeout` seconds for queued messages, then stops the workers."""
+        try:
+            await asyncio.wait_for(self.drain(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"⚠️ Notification dispatcher stopped with {self.queue.qsize()} messages queued")
+
+        for handle in self._retry_handles:
+            handle.cancel()
+        self._retry_handles.clear()
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def drain(self):
+        self.flush_digests()
+        while self._retry_handles or not self.queue.empty():
+            await self.queue.join()
+            if self._retry_handles:
+                await asyncio.sleep(0.1)
+        await self.queue.join()
+
+    def submit(self, chat_id, text):
+        if self.digest_window <= 0:
+            self._enqueue(chat_id, build_digests([text]))
+            return
+
+        pending = self._digests.setdefault(chat_id, [])
+        pending.append(text)
+        if len(pending) == 1:
+            self._digest_handles[chat_id] = asyncio.get_running_loop().call_later(
+                self.digest_window, self._flush_digest, chat_id
+            )
+
+    def flush_digests(self):
+        """Queues every pending digest now instead of at the end of its window."""
+        for chat_id in list(self._digests):
+            self._digest_handles[chat_id].cancel()
+            self._flush_digest(chat_id)
+
+    def _flush_digest(self, chat_id):
+        self._digest_handles.pop(chat_id, None)
+        texts = self._digests.pop(chat_id, [])
+        if not texts:
+            return
+        messages = build_digests(texts)
+        self.coalesced += max(0, len(texts) - len(messages))
+        self._enqueue(chat_id, messages)
+
+    def _enqueue(self, chat_id, messages):
+        for text, formatted in messages:
+            self.queue.put_nowait((chat_id, text, 1, self.parse_mode if formatted else None))
+
+    def stats(self):
+        elapsed = (self._last_send_at - self._first_send_at) if self.sent > 1 else 0
+        return {
+            'queue_depth': self.queue.qsize(),
+            'pending_digests': len(self._digests),
+            'pending_retries': len(self._retry_handles),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'rate_limited': self.rate_limited,
+            'coalesced': self.coalesced,
+            'messages_per_second': (self.sent - 1) / elapsed if elapsed > 0 else 0.0
+        }
+
+    def _retry_later(self, delay, item):
+        loop = asyncio.get_running_loop()
+
+        def requeue():
+            self._retry_handles.discard(handle)
+            self.queue.put_nowait(item)
+
+        handle = loop.call_later(delay, requeue)
+        self._retry_handles.add(handle)
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                await self._deliver(*item)
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"❌ Notification worker error: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, chat_id, text, attempt, parse_mode):
+        chat_bucket = self._chat_buckets.get(chat_id)
+        if not chat_bucket.try_acquire():
+            # Come back when this chat may send again instead of holding a worker other chats could use
+            self._retry_later(chat_bucket.delay(), (chat_id, text, attempt, parse_mode))
+            return
+        await self.global_bucket.acquire()
+
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+            outcome = "ok"
+        except RetryAfter as e:
+            outcome = "rate_limited"
+            # Flood control applies to the whole bot: hold every send back for the requested time
+            self.rate_limited += 1
+            retry_after = float(e.retry_after)
+            self.global_bucket.pause(retry_after)
+            if attempt >= self.max_attempts:
+                self.failed += 1
+                logging.error(f"❌ Notification to {chat_id} still rate limited after {attempt} attempts")
+                return
+            self.retried += 1
+            self._retry_later(retry_after, (chat_id, text, attempt + 1, parse_mode))
+            return
+        except BadRequest as e:
+            if parse_mode and "can't parse entities" in str(e).lower():
+                outcome = "bad_markup"
+                # Unbalanced markup is no reason to lose the alarm: send it plain
+                self.retried += 1
+                self.queue.put_nowait((chat_id, text, attempt, None))
+                return
+            outcome = "dropped"
+            self.failed += 1
+            logging.warning(f"⚠️ Notification to {chat_id} dropped: {e}")
+            return
+        except Forbidden as e:
+            outcome = "dropped"
+            # Blocked bot or invalid chat: retrying cannot help
+            self.failed += 1
+            logging.warning(f"⚠️ Notification to {chat_id} dropped: {e}")
+            return
+        except NetworkError as e:
+            outcome = "network_error"
+            if attempt >= self.max_attempts:
+                self.failed += 1
+                logging.error(f"❌ Notification to {chat_id} failed after {attempt} attempts: {e}")
+                return
+            self.retried += 1
+            self._retry_later(min(self.base_backoff * 2 ** attempt, self.max_backoff), (chat_id, text, attempt + 1, parse_mode))
+            return
+        finally:
+            SEND_SECONDS.labels(outcome).observe(time.perf_counter() - started)
+
+        now = time.monotonic()
+        if self._first_send_at is None:
+            self._first_send_at = now
+        self._last_send_at = now
+        self.sent += 1
@@ -0,0 +1,264 @@
+"""
+Price providers with health tracking, hedged requests and circuit breakers.
+
+ProviderRouter asks the provider with the best recent latency/error record
+first. If it has not answered within the hedge budget (or it failed or left
+symbols out), the next provider is asked for whatever is still missing, and
+the first answers win. A provider that keeps failing is ejected for a
+cool-down period and then given one trial request.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from metrics import Histogram
+from config import (
+    BINANCE_API_URL, COINGECKO_BASE_URL, PRICE_PROVIDERS, PRICE_HEDGE_SECONDS,
+    PROVIDER_FAILURE_THRESHOLD, PROVIDER_RESET_SECONDS, STUB_PRICES
+)
+
+# CoinGecko prices coins by id rather than by trading pair
+COINGECKO_IDS = {
+    "BTCUSDT": "bitcoin",
+    "ETHUSDT": "ethereum",
+    "ADAUSDT": "cardano",
+    "BNBUSDT": "binancecoin",
+    "XRPUSDT": "ripple",
+}
+
+FETCH_SECONDS = Histogram(
+    "price_fetch_seconds", "Price provider request latency", ["provider", "outcome"]
+)
+
+class PriceProvider:
+    """Fetches {symbol: price} for a list of symbols; raises on failure."""
+
+    name = "provider"
+
+    async def fetch(self, symbols):
+        raise NotImplementedError
+
+class BinanceProvider(PriceProvider):
+    name = "binance"
+
+    def __init__(self, client, base_url=BINANCE_API_URL):
+        self.client = client
+        self.url = f"{base_url.rstrip('/')}/api/v3/ticker/price"
+
+    async def fetch(self, symbols):
+        # Binance sembolleri doğrudan API ile uyumlu (örneğin: BTCUSDT)
+        symbols_param = json.dumps(symbols, separators=(',', ':'))
+        response = await self.client.get(self.url, params={'symbols': symbols_param})
+
+        # A single unknown symbol makes Binance reject the whole list,
+        # so fall back to the unfiltered ticker and pick ours out of it.
+        if response.status_code == 400:
+            response = await self.client.get(self.url)
+
+        response.raise_for_status()
+        wanted = set(symbols)
+        return {
+            item['symbol']: float(item['price'])
+            for item in response.json()
+            if item['symbol'] in wanted
+        }
+
+class CoinGeckoProvider(PriceProvider):
+    name = "coingecko"
+
+    def __init__(self, client, base_url=COINGECKO_BASE_URL, ids=COINGECKO_IDS):
+        self.client = client
+        self.url = f"{base_url.rstrip('/')}/simple/price"
+        self.ids = ids
+
+    async def fetch(self, symbols):
+        ids = {self.ids[symbol]: symbol for symbol in symbols if symbol in self.ids}
+        if not ids:
+            return {}
+
+        response = await self.client.get(self.url, params={'ids': ','.join(sorted(ids)), 'vs_currencies': 'usd'})
+        response.raise_for_status()
+        return {
+            ids[coin_id]: float(quote['usd'])
+            for coin_id, quote in response.json().items()
+            if coin_id in ids and 'usd' in quote
+        }
+
+class StubProvider(PriceProvider):
+    """Serves fixed prices, optionally slow or failing; for offline runs and benchmarks."""
+
+    name = "stub"
+
+    def __init__(self, prices=None, delay=0.0, fail=False):
+        self.prices = dict(prices or {})
+        self.delay = delay
+        self.fail = fail
+
+    async def fetch(self, symbols):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("stub provider failure")
+        return {symbol: self.prices[symbol] for symbol in symbols if symbol in self.prices}
+
+class ProviderHealth:
+    """Latency and error-rate EWMAs plus a consecutive-failure circuit breaker."""
+
+    def __init__(self, alpha=0.2, failure_threshold=PROVIDER_FAILURE_THRESHOLD, reset_timeout=PROVIDER_RESET_SECONDS):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latency = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def available(self):
+        return self.opened_at is None or time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def allow(self):
+        """True if a request may be sent; an open breaker lets one trial through per reset_timeout."""
+        if not self.available():
+            return False
+        if self.opened_at is not None:
+            self.opened_at = time.monotonic()
+        return True
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def observe_latency(self, seconds):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += self.alpha * (seconds - self.latency)
+
+    def record_success(self, seconds):
+        self.observe_latency(seconds)
+        self.error_rate -= self.alpha * self.error_rate
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.error_rate += self.alpha * (1.0 - self.error_rate)
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+class ProviderRouter:
+    def __init__(self, providers, hedge_after=PRICE_HEDGE_SECONDS,
+                 failure_threshold=PROVIDER_FAILURE_THRESHOLD, reset_timeout=PROVIDER_RESET_SECONDS):
+        self.providers = list(providers)
+        self.hedge_after = hedge_after
+        self.health = {
+            provider: ProviderHealth(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+            for provider in self.providers
+        }
+        self.hedged = 0
+
+    def ranked(self):
+        """Providers whose breaker is closed or due a trial, best expected latency first."""
+        def score(item):
+            position, provider = item
+            health = self.health[provider]
+            latency = health.latency if health.latency is not None else self.hedge_after
+            # Errors are expensive: each one usually costs a full hedge delay
+            return latency + health.error_rate * self.hedge_after * 4, position
+
+        ordered = sorted(enumerate(self.providers), key=score)
+        return [provider for _, provider in ordered if self.health[provider].available()]
+
+    async def fetch(self, symbols):
+        wanted = sorted(set(symbols))
+        prices = {}
+        candidates = self.ranked()
+        tasks = {}
+
+        try:
+            while candidates or tasks:
+                if not tasks and not self._launch(tasks, candidates, wanted, prices):
+                    break
+
+                done, _ = await asyncio.wait(
+                    tasks, timeout=self.hedge_after if candidates else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Latency budget missed: ask the next provider as well
+                    if self._launch(tasks, candidates, wanted, prices):
+                        self.hedged += 1
+                    continue
+
+                for task in done:
+                    tasks.pop(task)
+                    prices.update(task.result())
+                if all(symbol in prices for symbol in wanted):
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return {symbol: prices[symbol] for symbol in wanted if symbol in prices}
+
+    def _launch(self, tasks, candidates, wanted, prices):
+        """Starts the next allowed candidate on the symbols still missing; False if none is left."""
+        while candidates:
+            provider = candidates.pop(0)
+            if self.health[provider].allow():
+                missing = [symbol for symbol in wanted if symbol not in prices]
+                tasks[asyncio.ensure_future(self._call(provider, missing))] = provider
+                return True
+        return False
+
+    async def _call(self, provider, symbols):
+        health = self.health[provider]
+        started = time.perf_counter()
+        try:
+            prices = await provider.fetch(symbols)
+        except asyncio.CancelledError:
+            # Lost a hedge race: it was at least this slow
+            elapsed = time.perf_counter() - started
+            health.observe_latency(elapsed)
+            FETCH_SECONDS.labels(provider.name, "cancelled").observe(elapsed)
+            raise
+        except Exception as e:
+            FETCH_SECONDS.labels(provider.name, "error").observe(time.perf_counter() - started)
+            health.record_failure()
+            state = " (circuit open)" if health.is_open else ""
+            logging.warning(f"⚠️ Price provider {provider.name} failed{state}: {e}")
+            return {}
+
+        elapsed = time.perf_counter() - started
+        health.record_success(elapsed)
+        FETCH_SECONDS.labels(provider.name, "ok").observe(elapsed)
+        return prices
+
+    def stats(self):
+        return {
+            'hedged': self.hedged,
+            'providers': {
+                f"{provider.name}#{position}": {
+                    'latency_ms': round(health.latency * 1000, 1) if health.latency is not None else None,
+                    'error_rate': round(health.error_rate, 3),
+                    'circuit_open': health.is_open
+                }
+                for position, (provider, health) in enumerate(self.health.items())
+            }
+        }
+
+def build_providers(client, names=PRICE_PROVIDERS):
+    """Creates the providers named in PRICE_PROVIDERS, in preference order."""
+    factories = {
+        'binance': lambda: BinanceProvider(client),
+        'coingecko': lambda: CoinGeckoProvider(client),
+        'stub': lambda: StubProvider(STUB_PRICES),
+    }
+    providers = []
+    for name in names:
+        if name not in factories:
+            logging.warning(f"⚠️ Unknown price provider: {name}")
+            continue
+        providers.append(factories[name]())
+    return providers
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import time
+from config import PRICE_FLUSH_MAX_ROWS, PRICE_FLUSH_SECONDS
+
+class PriceRecorder:
+    """Write-behind buffer for price_data.
+
+    Prices are deduplicated to one row per symbol per tick (a `tick_seconds`
+    wide time slot) and flushed with a single executemany transaction when
+    `max_rows` rows are waiting, every `interval` seconds, and on stop().
+    """
+
+    def __init__(self, db, max_rows=PRICE_FLUSH_MAX_ROWS, interval=PRICE_FLUSH_SECONDS, tick_seconds=1):
+        self.db = db
+        self.max_rows = max_rows
+        self.interval = interval
+        self.tick_seconds = tick_seconds
+        self._buffer = {}  # (symbol, tick) -> (symbol, price, timestamp)
+        self._task = None
+        self._flush_lock = asyncio.Lock()
+
+        self.rows_written = 0
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+
+    def record(self, symbol, price, timestamp=None):
+        timestamp = timestamp if timestamp is not None else time.time()
+        tick = int(timestamp // self.tick_seconds)
+        self._buffer[(symbol, tick)] = (symbol, price, timestamp)
+
+        if len(self._buffer) >= self.max_rows:
+            asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+
+            rows, self._buffer = list(self._buffer.values()), {}
+            started = time.perf_counter()
+            try:
+                await self.db.run(self.db.add_price_data_many, rows)
+            except Exception as e:
+                logging.error(f"🚫 Price data flush error ({len(rows)} rows kept): {e}")
+                for symbol, price, timestamp in rows:
+                    self._buffer.setdefault((symbol, int(timestamp // self.tick_seconds)), (symbol, price, timestamp))
+                return
+
+            self.last_flush_seconds = time.perf_counter() - started
+            self.rows_written += len(rows)
+            self.flushes += 1
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def stats(self):
+        return {
+            'queue_depth': len(self._buffer),
+            'rows_written': self.rows_written,
+            'flushes': self.flushes,
+            'last_flush_seconds': self.last_flush_seconds
+        }
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import logging
+import random
+import time
+import websockets
+from config import BINANCE_STREAM_URL, STREAM_FALLBACK_POLL_SECONDS, STREAM_STALE_SECONDS
+
+class PriceStream:
+    """Consumes the Binance miniTicker stream and hands each tick batch to on_prices.
+
+    While the stream is down, on_fallback (a REST poll) is called every
+    fallback_interval seconds until the reconnect succeeds.
+    """
+
+    def __init__(self, on_prices, on_fallback=None, url=BINANCE_STREAM_URL,
+                 min_backoff=1, max_backoff=60,
+                 fallback_interval=STREAM_FALLBACK_POLL_SECONDS,
+                 stale_timeout=STREAM_STALE_SECONDS):
+        self.on_prices = on_prices
+        self.on_fallback = on_fallback
+        self.url = url
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.fallback_interval = fallback_interval
+        self.stale_timeout = stale_timeout
+        self.is_running = False
+        self.connected = False
+        self.last_tick_at = None
+        self._last_fallback_at = 0.0
+
+    async def run(self):
+        self.is_running = True
+        backoff = self.min_backoff
+
+        while self.is_running:
+            try:
+                async with websockets.connect(self.url, ping_interval=20, ping_timeout=20) as ws:
+                    self.connected = True
+                    backoff = self.min_backoff
+                    logging.info(f"📶 Price stream connected: {self.url}")
+
+                    while self.is_running:
+                        # Binance pushes miniTickers every second; silence means a dead stream
+                        raw = await asyncio.wait_for(ws.recv(), timeout=self.stale_timeout)
+                        await self._handle_message(raw)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"⚠️ Price stream disconnected: {e}")
+            finally:
+                self.connected = False
+
+            if not self.is_running:
+                break
+
+            delay = backoff * random.uniform(0.5, 1.0)
+            logging.info(f"🔁 Reconnecting price stream in {delay:.1f}s")
+            await self._wait_with_fallback(delay)
+            backoff = min(backoff * 2, self.max_backoff)
+
+        logging.info("⏹️ Price stream stopped")
+
+    def stop(self):
+        self.is_running = False
+
+    async def _handle_message(self, raw):
+        message = json.loads(raw)
+        # Combined streams wrap the payload as {"stream": ..., "data": ...}
+        data = message.get('data', message) if isinstance(message, dict) else message
+        if isinstance(data, dict):
+            data = [data]
+
+        prices = {}
+        for ticker in data:
+            if ticker.get('e') == '24hrMiniTicker':
+                prices[ticker['s']] = float(ticker['c'])
+
+        if prices:
+            self.last_tick_at = time.time()
+            await self.on_prices(prices)
+
+    async def _wait_with_fallback(self, delay):
+        deadline = time.monotonic() + delay
+
+        while self.is_running:
+            now = time.monotonic()
+            if self.on_fallback and now - self._last_fallback_at >= self.fallback_interval:
+                self._last_fallback_at = now
+                try:
+                    await self.on_fallback()
+                except Exception as e:
+                    logging.error(f"🚫 Fallback price poll error: {e}")
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(remaining, self.fallback_interval))
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens=1):
+        """Seconds until `tokens` tokens are available."""
+        self._refill()
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        """Empties the bucket so nothing is granted for `seconds` (e.g. after a 429)."""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    async def acquire(self, tokens=1):
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.delay(tokens))
+
+class TokenBuckets:
+    """One TokenBucket per key (user, chat, ...), created on first use.
+
+    Past `max_keys` buckets, the ones that have fully refilled are dropped
+    when a new key arrives: a full bucket is the same as a new one, so idle
+    keys are forgotten without losing any limit.
+    """
+
+    def __init__(self, rate, capacity=None, max_keys=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def get(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._buckets = {k: b for k, b in self._buckets.items() if b.delay(b.capacity) > 0}
+            bucket = TokenBucket(self.rate, capacity=self.capacity)
+            self._buckets[key] = bucket
+        return bucket
@@ -0,0 +1,183 @@
+"""
+Downsampling and retention for price_data.
+
+Raw ticks are rolled up into PRICE_BAR_INTERVAL OHLC bars, those into 1h
+bars and 1h bars into 1d bars (all in price_bars). The finest bar is as
+wide as the recording interval: in streaming mode, too, price_data keeps
+one tick per PRICE_CHECK_INTERVAL, so a bar's high and low are those of
+the recorded ticks, not of every trade in between.
+
+Every pass works from a watermark (the last price_data id rolled up) in
+batches of RETENTION_BATCH_ROWS, one short transaction each, so the alarm
+scheduler's writes are never held up for long. A bar is always recomputed
+from all of its inputs, so a batch that is interrupted or repeated cannot
+leave a wrong bar behind.
+
+After the rollup, raw rows and bars older than PRICE_RETENTION_SECONDS are
+deleted in batches (raw rows only once they have been rolled up), and the
+freed pages are handed back with an incremental vacuum.
+"""
+
+import asyncio
+import logging
+import time
+from config import (
+    PRICE_BAR_INTERVAL, PRICE_CHECK_INTERVAL, PRICE_RETENTION_SECONDS, RETENTION_BATCH_ROWS,
+    RETENTION_INTERVAL_SECONDS, RETENTION_VACUUM_PAGES
+)
+
+# Rollup chain: (interval, seconds, source); the source of the finest bar is price_data itself
+RESOLUTIONS = (
+    (PRICE_BAR_INTERVAL, PRICE_CHECK_INTERVAL * 60, None), ('1h', 3600, PRICE_BAR_INTERVAL), ('1d', 86400, '1h')
+)
+WATERMARK = 'price_bars_rolled_id'
+
+def bucket_bars(samples, seconds):
+    """Folds time-ordered (ts, open, high, low, close, samples) rows into {bucket_ts: bar} of `seconds` width."""
+    bars = {}
+    for ts, open_, high, low, close, count in samples:
+        start = int(ts) // seconds * seconds
+        bar = bars.get(start)
+        if bar is None:
+            bars[start] = [open_, high, low, close, count]
+        else:
+            bar[1] = max(bar[1], high)
+            bar[2] = min(bar[2], low)
+            bar[3] = close
+            bar[4] += count
+    return bars
+
+class RetentionEngine:
+    def __init__(self, db, retention=PRICE_RETENTION_SECONDS, batch_rows=RETENTION_BATCH_ROWS,
+                 interval=RETENTION_INTERVAL_SECONDS, vacuum_pages=RETENTION_VACUUM_PAGES):
+        self.db = db
+        self.retention = retention
+        self.batch_rows = batch_rows
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+        self._task = None
+
+        self.rows_rolled = 0
+        self.rows_deleted = 0
+        self.pages_freed = 0
+        self.last_pass_seconds = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logging.error(f"🚫 Retention pass error: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self):
+        """One full pass: roll up everything new, apply retention, vacuum."""
+        started = time.perf_counter()
+        rolled = deleted = 0
+
+        while True:
+            count = await self.db.run(self.rollup_batch)
+            rolled += count
+            if count < self.batch_rows:
+                break
+
+        now = time.time()
+        watermark = await self.db.run(self.db.get_retention_state, WATERMARK)
+        if self.retention.get('raw'):
+            deleted += await self._delete_batches(
+                self.db.delete_price_data_before, now - self.retention['raw'], watermark
+            )
+        for interval, _, _ in RESOLUTIONS:
+            if self.retention.get(interval):
+                deleted += await self._delete_batches(
+                    self.db.delete_price_bars_before, interval, now - self.retention[interval]
+                )
+        # Tiers no longer rolled up (e.g. 1m bars from before PRICE_BAR_INTERVAL) would never expire
+        rolled_up = {interval for interval, _, _ in RESOLUTIONS}
+        for interval in await self.db.run(self.db.get_price_bar_intervals):
+            if interval not in rolled_up:
+                deleted += await self._delete_batches(self.db.delete_price_bars_before, interval, now + 1)
+
+        freed = await self.db.run(self.db.vacuum_step, self.vacuum_pages) if deleted else 0
+
+        self.rows_rolled += rolled
+        self.rows_deleted += deleted
+        self.pages_freed += freed
+        self.last_pass_seconds = time.perf_counter() - started
+        if rolled or deleted:
+            logging.info(
+                f"🗜️ Retention: {rolled} ticks rolled up, {deleted} rows expired, {freed} pages freed "
+                f"in {self.last_pass_seconds:.2f}s"
+            )
+
+    async def _delete_batches(self, delete, *args):
+        total = 0
+        while True:
+            count = await self.db.run(delete, *args, self.batch_rows)
+            total += count
+            if count < self.batch_rows:
+                return total
+
+    def rollup_batch(self):
+        """Rolls up the next batch of raw ticks; runs on the database thread. Returns the rows consumed."""
+        db = self.db
+        watermark = db.get_retention_state(WATERMARK)
+        rows = db.get_price_rows_after(watermark, self.batch_rows)
+        if not rows:
+            return 0
+
+        # Finest buckets touched by this batch, per symbol
+        width = RESOLUTIONS[0][1]
+        touched = {}
+        for _, symbol, _, timestamp in rows:
+            touched.setdefault(symbol, set()).add(int(timestamp) // width * width)
+
+        computed = {}  # (symbol, interval) -> {ts: (ts, open, high, low, close, samples)}
+        for level, (interval, seconds, source) in enumerate(RESOLUTIONS):
+            for symbol, starts in touched.items():
+                since, until = min(starts), max(starts) + seconds
+                if source is None:
+                    samples = [(ts, price, price, price, price, 1) for ts, price in
+                               db.get_price_history(symbol, since, until)]
+                else:
+                    # Stored source bars, overridden by the ones recomputed in this batch
+                    merged = {row[0]: row for row in db.get_price_bars(symbol, source, since, until)}
+                    merged.update(computed.get((symbol, source), {}))
+                    samples = [merged[ts] for ts in sorted(merged)]
+
+                bars = computed.setdefault((symbol, interval), {})
+                for start, (open_, high, low, close, count) in bucket_bars(samples, seconds).items():
+                    if start in starts:
+                        bars[start] = (start, open_, high, low, close, count)
+
+            # The next resolution recomputes the buckets that contain these
+            if level + 1 < len(RESOLUTIONS):
+                width = RESOLUTIONS[level + 1][1]
+                touched = {symbol: {start // width * width for start in starts} for symbol, starts in touched.items()}
+
+        db.save_price_bars(
+            [(symbol, interval, *bar) for (symbol, interval), bars in computed.items() for bar in bars.values()],
+            WATERMARK, rows[-1][0]
+        )
+        return len(rows)
+
+    def stats(self):
+        return {
+            'rows_rolled': self.rows_rolled,
+            'rows_deleted': self.rows_deleted,
+            'pages_freed': self.pages_freed,
+            'last_pass_seconds': self.last_pass_seconds
+        }
@@ -1,113 +1,257 @@
-import schedule
 import time
 import logging
 import asyncio
-from threading import Thread
 from database import Database
+from alarm_index import AlarmIndex, format_duration
 from api_handler import APIHandler
-from config import PRICE_CHECK_INTERVAL
-
-def run_async_notification(coro):
-    """Safely runs an async function from within a thread."""
-    try:
-        print("📤 Starting async notification...")
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(coro)
-        loop.close()
-        print("✅ Async notification completed.")
-    except Exception as e:
-        print(f"❌ Async notification error: {e}")
-        logging.error(f"❌ Async notification error: {e}")
+from price_stream import PriceStream
+from price_recorder import PriceRecorder
+from indicator_state import IndicatorBook
+from metrics import Counter, Histogram
+from config import (
+    PRICE_CHECK_INTERVAL, PRICE_SOURCE, INDICATOR_SNAPSHOT_SECONDS, INDICATOR_IDLE_SECONDS,
+    ALARM_STATE_FLUSH_SECONDS
+)
+
+CYCLE_SECONDS = Histogram("alarm_cycle_seconds", "Time to evaluate one batch of prices", ["mode"])
+TRIGGERS = Counter("alarm_triggers_total", "Alarms triggered", ["condition"])
 
 class AlarmScheduler:
-    def __init__(self, telegram_bot=None):
-        self.db = Database()
-        self.api = APIHandler()
+    def __init__(self, telegram_bot=None, alarm_index=None, api=None, db=None, indicator_book=None):
+        self.db = db or Database()
+        self.api = api or APIHandler()
+        self.price_recorder = PriceRecorder(self.db)
         self.telegram_bot = telegram_bot
         self.is_running = False
+        self.price_stream = None
+        self.next_run = None
+        self._task = None
+        self._last_recorded = {}
+
+        if alarm_index is None:
+            alarm_index = AlarmIndex()
+            alarm_index.load(self.db.get_all_active_alarms())
+        self.alarm_index = alarm_index
+
+        if indicator_book is None:
+            indicator_book = IndicatorBook()
+            indicator_book.load(self.db.get_indicator_states())
+        self.indicator_book = indicator_book
+        self._last_snapshot = time.monotonic()
+        self._last_state_flush = time.monotonic()
+        # Held from evaluating a batch until its fired alarms and state changes are written;
+        # whoever takes alarms out of the index holds it to not cut a batch in half
+        self.evaluating = asyncio.Lock()
+
+    def process_price(self, symbol, current_price):
+        """Evaluates the alarms on symbol; returns (user_id, message) pairs and the ids of fired one-shot alarms."""
+        notifications = []
+        alarm_ids = []
+
+        for alarm, move in self.alarm_index.pop_triggered(symbol, current_price):
+            TRIGGERS.labels(alarm.condition).inc()
+            if alarm.condition == 'move':
+                detail = f"📐 Move: {move:+.2f}% within {format_duration(alarm.move_window)}"
+            else:
+                condition_text = "exceeded" if alarm.condition == 'above' else "fell below"
+                detail = f"🎯 Target: ${alarm.target_price:,.2f}\n📈 Status: {condition_text}"
+            repeat = "\n🔁 Recurring alarm, stays active" if alarm.recurring else ""
+
+            message = f"""
+🚨 *ALARM TRIGGERED!*
+
+📊 {symbol}
+{detail}
+💰 Current: ${current_price:,.2f}{repeat}
+
+⏰ {time.strftime('%H:%M:%S')}
+            """
+
+            if alarm.platform == 'telegram' and self.telegram_bot:
+                notifications.append((alarm.user_id, message))
+
+            if not alarm.recurring:
+                alarm_ids.append(alarm.id)
+            logging.info(f"✅ Alarm triggered: {symbol} - {alarm.user_id}")
+
+        return notifications, alarm_ids
+
+    async def deactivate_alarms(self, alarm_ids):
+        if alarm_ids:
+            await self.db.run(self.db.deactivate_alarms, alarm_ids)
+            logging.info(f"✅ {len(alarm_ids)} alarms deactivated")
+
+    async def save_alarm_states(self):
+        """Writes the trigger/re-arm transitions of recurring alarms in one batch."""
+        self._last_state_flush = time.monotonic()
+        rows = self.alarm_index.drain_state_changes()
+        if rows:
+            await self.db.run(self.db.update_alarm_states, rows)
+
+    async def send_notifications(self, notifications):
+        if not notifications:
+            return
 
-    def check_alarms(self):
+        results = await asyncio.gather(
+            *(self.telegram_bot.send_notification(user_id, message) for user_id, message in notifications),
+            return_exceptions=True
+        )
+        for (user_id, _), result in zip(notifications, results):
+            if isinstance(result, Exception):
+                logging.error(f"❌ Notification error for {user_id}: {result}")
+            else:
+                logging.info(f"📩 Notification sent: {user_id}")
+
+    async def check_alarms(self):
+        started = time.perf_counter()
         try:
-            print("⏰ check_alarms called")  # Test log
-            alarms = self.db.get_all_active_alarms()
-            if not alarms:
+            # Symbols with indicator state are priced too, to keep their indicators current
+            symbols = self.alarm_index.symbols() | self.indicator_book.symbols()
+            if not symbols:
                 logging.info("🔕 No active alarms.")
                 return
 
-            logging.info(f"🔍 Checking {len(alarms)} alarms...")
+            logging.info(f"🔍 Checking {len(self.alarm_index)} alarms on {len(symbols)} symbols...")
 
-            for alarm in alarms:
-                # If there are extra columns, take only the first 6
-                alarm_id, user_id, symbol, target_price, condition, platform, *_ = alarm
+            prices = await self.api.get_prices(symbols)
+            if prices:
+                # Restored or seeded indicator symbols the providers cannot price
+                # would only make every poll ask for them again
+                for symbol in self.indicator_book.symbols() - prices.keys():
+                    self.indicator_book.discard(symbol)
+            self.indicator_book.update_prices(prices)
+            notifications = []
+            triggered_ids = []
 
-                current_price = self.api.get_price(symbol)
+            async with self.evaluating:
+                for symbol in symbols:
+                    current_price = prices.get(symbol)
 
-                if current_price is None:
-                    logging.warning(f"⚠️ Could not retrieve price for: {symbol}")
-                    continue
+                    if current_price is None:
+                        logging.warning(f"⚠️ Could not retrieve price for: {symbol}")
+                        continue
 
-                alarm_triggered = (
-                    condition == 'above' and current_price >= target_price or
-                    condition == 'below' and current_price <= target_price
-                )
+                    symbol_notifications, alarm_ids = self.process_price(symbol, current_price)
+                    notifications.extend(symbol_notifications)
+                    triggered_ids.extend(alarm_ids)
+                    self.price_recorder.record(symbol, current_price)
 
-                if alarm_triggered:
-                    condition_text = "exceeded" if condition == 'above' else "fell below"
-                    message = f"""
-🚨 *ALARM TRIGGERED!*
+                # Persist the state change before anyone is told about it
+                await self.deactivate_alarms(triggered_ids)
+                await self.save_alarm_states()
+            await self.send_notifications(notifications)
+            await self.save_indicators()
 
-📊 {symbol}
-🎯 Target: ${target_price:,.2f}
-💰 Current: ${current_price:,.2f}
-📈 Status: {condition_text}
+        except Exception as e:
+            logging.error(f"🚫 Alarm check error: {e}")
+        finally:
+            CYCLE_SECONDS.labels("poll").observe(time.perf_counter() - started)
 
-⏰ {time.strftime('%H:%M:%S')}
-                    """
+    async def process_prices(self, prices):
+        """Evaluates a batch of streamed prices."""
+        started = time.perf_counter()
+        try:
+            symbols = self.alarm_index.symbols()
+            tracked = self.indicator_book.symbols()
+            # Streamed prices are fresher than anything /price could fetch
+            self.api.update_prices(prices)
+            notifications = []
+            triggered_ids = []
 
-                    if platform == 'telegram' and self.telegram_bot:
-                        print(f"📤 Sending notification to: {user_id}")
-                        run_async_notification(
-                            self.telegram_bot.send_notification(user_id, message)
-                        )
-                        print(f"📩 Notification sent: {user_id}")
-                        logging.info(f"📩 Notification sent: {user_id}")
+            async with self.evaluating:
+                for symbol, current_price in prices.items():
+                    if symbol in tracked:
+                        self.indicator_book.update(symbol, current_price)
+                    if symbol not in symbols:
+                        continue
 
-                    self.db.deactivate_alarm(alarm_id)
-                    logging.info(f"✅ Alarm triggered and deactivated: {symbol} - {user_id}")
+                    symbol_notifications, alarm_ids = self.process_price(symbol, current_price)
+                    notifications.extend(symbol_notifications)
+                    triggered_ids.extend(alarm_ids)
+                    self._record_price(symbol, current_price)
 
-                self.db.add_price_data(symbol, current_price)
+                await self.deactivate_alarms(triggered_ids)
+                # Re-arms happen on most ticks; batch them unless something just fired
+                if notifications or time.monotonic() - self._last_state_flush >= ALARM_STATE_FLUSH_SECONDS:
+                    await self.save_alarm_states()
+            await self.send_notifications(notifications)
 
+            if time.monotonic() - self._last_snapshot >= INDICATOR_SNAPSHOT_SECONDS:
+                await self.save_indicators()
         except Exception as e:
-            logging.error(f"🚫 Alarm check error: {e}")
-            print(f"🚫 Alarm check error: {e}")
+            logging.error(f"🚫 Streamed alarm check error: {e}")
+        finally:
+            CYCLE_SECONDS.labels("stream").observe(time.perf_counter() - started)
+
+    async def save_indicators(self):
+        """Snapshots changed indicator state so it survives restarts, and forgets idle symbols."""
+        self._last_snapshot = time.monotonic()
+        self.indicator_book.evict_idle(INDICATOR_IDLE_SECONDS)
+        rows = self.indicator_book.snapshot()
+        if rows:
+            await self.db.run(self.db.save_indicator_states, rows)
+        removed = self.indicator_book.drain_removed()
+        if removed:
+            await self.db.run(self.db.delete_indicator_states, removed)
+
+    def _record_price(self, symbol, price):
+        # Streaming delivers a tick per second; keep price_data at the polling density,
+        # which is also the finest bar the retention rollup builds (PRICE_BAR_INTERVAL)
+        now = time.monotonic()
+        last = self._last_recorded.get(symbol)
+        if last is not None and now - last < PRICE_CHECK_INTERVAL * 60:
+            return
+        self._last_recorded[symbol] = now
+        self.price_recorder.record(symbol, price)
+
+    async def run_polling(self):
+        logging.info(f"⏳ Scheduler started - Checking every {PRICE_CHECK_INTERVAL} minutes")
+        while self.is_running:
+            self.next_run = time.time() + PRICE_CHECK_INTERVAL * 60
+            await self.check_alarms()
+            await asyncio.sleep(max(0, self.next_run - time.time()))
+
+    async def run_stream(self):
+        """Runs the alarm checks from the Binance price stream, polling REST while it is down."""
+        self.price_stream = PriceStream(
+            on_prices=self.process_prices,
+            on_fallback=self.check_alarms
+        )
+        logging.info("📡 Scheduler started in streaming mode")
+        await self.price_stream.run()
 
     def start_scheduler(self):
+        """Starts the scheduler as a task on the running event loop."""
         if self.is_running:
             logging.warning("⚠️ Scheduler is already running!")
             return
 
         self.is_running = True
-        schedule.every(PRICE_CHECK_INTERVAL).minutes.do(self.check_alarms)
-        logging.info(f"⏳ Scheduler started - Checking every {PRICE_CHECK_INTERVAL} minutes")
-
-        def run_scheduler():
-            while self.is_running:
-                schedule.run_pending()
-                time.sleep(30)
-
-        scheduler_thread = Thread(target=run_scheduler, daemon=True)
-        scheduler_thread.start()
-        logging.info("📡 Scheduler thread started")
+        self.price_recorder.start()
+        runner = self.run_stream if PRICE_SOURCE == "streaming" else self.run_polling
+        self._task = asyncio.get_running_loop().create_task(runner())
 
-    def stop_scheduler(self):
+    async def stop_scheduler(self):
         self.is_running = False
-        schedule.clear()
+        if self.price_stream:
+            self.price_stream.stop()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Write out buffered price rows and indicator state before the database closes
+        await self.price_recorder.stop()
+        await self.save_alarm_states()
+        await self.save_indicators()
         logging.info("⏹️ Scheduler stopped")
 
     def get_scheduler_status(self):
         return {
             'is_running': self.is_running,
-            'next_run': schedule.next_run() if schedule.jobs else None,
-            'jobs_count': len(schedule.jobs)
+            'mode': PRICE_SOURCE,
+            'stream_connected': bool(self.price_stream and self.price_stream.connected),
+            'next_run': self.next_run if PRICE_SOURCE != "streaming" else None
         }
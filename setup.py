@@ -26,8 +26,9 @@ def print_colored(text, color='white'):
 
 def check_python_version():
     """Checks the Python version."""
-    if sys.version_info < (3, 8):
-        print_colored("❌ Python 3.8 or higher is required!", 'red')
+    # asyncio.to_thread needs 3.9; the pinned numpy and websockets releases need 3.11
+    if sys.version_info < (3, 11):
+        print_colored("❌ Python 3.11 or higher is required!", 'red')
         sys.exit(1)
     print_colored(f"✅ Python {sys.version.split()[0]} is available", 'green')
 
@@ -0,0 +1,381 @@
+"""
+Sharded alarm evaluation across worker processes.
+
+Symbols are hashed (crc32) into a fixed number of shards and every shard is
+owned by one worker process. Each worker runs its own AlarmScheduler, price
+feed and AlarmIndex over the alarms of its shards, and sends triggered alarm
+messages back to the bot process over a multiprocessing queue, where the
+single NotificationDispatcher delivers them.
+
+Shards stay with their worker for as long as it lives. When a worker dies
+only its shards move, to the least loaded survivors; a replacement is
+started after SHARD_RESPAWN_SECONDS and takes over shards from the busiest
+workers until the counts are even again. A worker that gains shards loads
+just their alarms and one that loses shards drops just theirs. A shard is
+handed to its new owner only after the old owner has confirmed that it
+stopped evaluating it (and wrote out what it fired), so no alarm is ever
+evaluated by two workers at once.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import queue
+import signal
+import time
+import zlib
+from log_setup import configure_logging, stop_logging
+from config import DATABASE_PATH, SCHEDULER_WORKERS, SHARD_COUNT, SHARD_RESPAWN_SECONDS, PRICE_SOURCE
+
+def shard_for(symbol, shard_count=SHARD_COUNT):
+    """Deterministic shard of a symbol; the same in every process and across restarts."""
+    return zlib.crc32(symbol.encode()) % shard_count
+
+def assign_shards(slots, shard_count=SHARD_COUNT, previous=None):
+    """Maps every shard to one of the live worker slots, moving as few shards as possible.
+
+    Shards keep their owner in `previous` while it is live. Orphaned shards go to
+    the least loaded slots, then shards move from the most to the least loaded
+    slot until the counts differ by at most one.
+    """
+    slots = sorted(slots)
+    if not slots:
+        return {}
+    previous = previous or {}
+    owned = {slot: [] for slot in slots}
+    orphans = []
+    for shard in range(shard_count):
+        owner = previous.get(shard)
+        (owned[owner] if owner in owned else orphans).append(shard)
+
+    def load(slot):
+        return len(owned[slot]), slot
+
+    for shard in orphans:
+        owned[min(slots, key=load)].append(shard)
+    while True:
+        busiest, idlest = max(slots, key=load), min(slots, key=load)
+        if len(owned[busiest]) - len(owned[idlest]) <= 1:
+            break
+        owned[idlest].append(owned[busiest].pop())
+    return {shard: slot for slot, shards in owned.items() for shard in shards}
+
+class QueueNotifier:
+    """Stands in for TelegramBot inside a worker: hands notifications to the bot process."""
+
+    def __init__(self, events):
+        self.events = events
+
+    async def send_notification(self, user_id, message):
+        self.events.put(('notify', user_id, message))
+
+class ShardWorker:
+    def __init__(self, slot, db_path, commands, events):
+        # Imported here so the coordinator process does not need them to start workers
+        from alarm_index import AlarmIndex
+        from api_handler import APIHandler
+        from database import Database
+        from indicator_state import IndicatorBook
+        from scheduler import AlarmScheduler
+
+        self.slot = slot
+        self.commands = commands
+        self.events = events
+        self.db = Database(db_path)
+        self.api = APIHandler()
+        self.alarm_index = AlarmIndex()
+        self.shards = set()
+        self.shard_count = SHARD_COUNT
+        # Indicators stay with the bot process; workers only evaluate alarms
+        self.scheduler = AlarmScheduler(
+            telegram_bot=QueueNotifier(events),
+            alarm_index=self.alarm_index,
+            api=self.api,
+            db=self.db,
+            indicator_book=IndicatorBook()
+        )
+
+    async def run(self):
+        status_task = asyncio.get_running_loop().create_task(self._report_status())
+        try:
+            while True:
+                command = await asyncio.to_thread(self.commands.get)
+                if command[0] == 'stop':
+                    break
+                await self._handle(command)
+        finally:
+            status_task.cancel()
+            await self.scheduler.stop_scheduler()
+            await self.api.close()
+            self.db.close()
+
+    async def _handle(self, command):
+        kind = command[0]
+        if kind == 'assign':
+            _, seq, shards, self.shard_count = command
+            shards = set(shards)
+            lost, gained = self.shards - shards, shards - self.shards
+            self.shards = shards
+            if lost:
+                await self._drop(lost)
+            if gained:
+                await self._load(gained)
+            self.events.put(('assigned', self.slot, seq, sorted(self.shards)))
+            self._send_status()
+            if not self.scheduler.is_running:
+                self.scheduler.start_scheduler()
+        elif kind == 'add':
+            alarm = command[1]
+            if shard_for(alarm[2], self.shard_count) in self.shards:
+                self.alarm_index.add(alarm)
+        elif kind == 'remove':
+            self.alarm_index.remove(command[1])
+
+    async def _load(self, shards):
+        symbols = [
+            symbol for symbol in await self.db.run(self.db.get_active_symbols)
+            if shard_for(symbol, self.shard_count) in shards
+        ]
+        rows = await self.db.run(self.db.get_active_alarms_for_symbols, symbols)
+        self.alarm_index.extend(rows)
+        logging.info(
+            f"🧩 Worker {self.slot}: +{len(shards)} shards ({len(rows)} alarms on {len(symbols)} symbols), "
+            f"{len(self.shards)} shards in total"
+        )
+
+    async def _drop(self, shards):
+        # Wait out a batch in progress, then write the state of the alarms being let go
+        async with self.scheduler.evaluating:
+            symbols = [symbol for symbol in self.alarm_index.symbols() if shard_for(symbol, self.shard_count) in shards]
+            # Removing an alarm discards its pending state, so write that first
+            await self.scheduler.save_alarm_states()
+            removed = self.alarm_index.remove_symbols(symbols)
+        logging.info(f"🧩 Worker {self.slot}: -{len(shards)} shards ({removed} alarms)")
+
+    def _send_status(self):
+        self.events.put(('status', self.slot, len(self.alarm_index), len(self.alarm_index.symbols())))
+
+    async def _report_status(self):
+        while True:
+            await asyncio.sleep(5)
+            self._send_status()
+
+def run_shard_worker(slot, db_path, commands, events):
+    """Entry point of a worker process."""
+    # Shutdown is driven by the coordinator, not by the terminal's Ctrl+C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Console only: several processes must not rotate the same file
+    configure_logging(path=None, console_format=f"%(asctime)s - shard-worker-{slot} - %(levelname)s - %(message)s")
+    try:
+        asyncio.run(ShardWorker(slot, db_path, commands, events).run())
+    finally:
+        stop_logging()
+
+class ShardCoordinator:
+    """Runs alarm evaluation in worker processes; a drop-in for AlarmScheduler and AlarmIndex.
+
+    The bot calls add()/remove() as it would on an AlarmIndex and they are
+    routed to the owning worker; main.py starts and stops it like the scheduler.
+    """
+
+    def __init__(self, telegram_bot=None, db_path=DATABASE_PATH, workers=SCHEDULER_WORKERS,
+                 shard_count=SHARD_COUNT, respawn_delay=SHARD_RESPAWN_SECONDS):
+        self.telegram_bot = telegram_bot
+        self.db_path = db_path
+        self.workers = max(1, workers)
+        self.shard_count = shard_count
+        self.respawn_delay = respawn_delay
+        self.is_running = False
+        self._reading = False
+
+        self._context = multiprocessing.get_context("spawn")
+        self._events = self._context.Queue()
+        self._processes = {}  # slot -> (process, command queue)
+        self._status = {}     # slot -> (alarms, symbols)
+        self._respawn_at = {}  # slot -> monotonic time to restart a dead worker
+        self._failures = {}    # slot -> deaths since the worker last reported in
+        self._granted = {}     # slot -> shards the worker has been told to own
+        self._may_hold = {}    # slot -> shards the worker may still be evaluating
+        self._sent_seq = {}    # slot -> sequence number of its latest assign command
+        self._seq = 0
+        self.shard_map = {}
+        self._tasks = []
+        self.restarts = 0
+
+    # AlarmIndex interface used by the bot handlers
+
+    def add(self, alarm):
+        slot = self.shard_map.get(shard_for(alarm[2], self.shard_count))
+        if slot in self._processes:
+            self._processes[slot][1].put(('add', tuple(alarm)))
+
+    def remove(self, alarm_id):
+        # Alarm ids do not say which shard they are on; removes are rare, so tell everyone
+        for _, commands in self._processes.values():
+            commands.put(('remove', alarm_id))
+
+    def __len__(self):
+        return sum(alarms for alarms, _ in self._status.values())
+
+    # Scheduler interface used by main.py
+
+    def start_scheduler(self):
+        if self.is_running:
+            logging.warning("⚠️ Scheduler is already running!")
+            return
+
+        self.is_running = True
+        self._reading = True
+        for slot in range(self.workers):
+            self._spawn(slot)
+        self._rebalance()
+
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._monitor()), loop.create_task(self._read_events())]
+        logging.info(f"🧩 Sharded scheduler started: {self.workers} workers, {self.shard_count} shards")
+
+    async def stop_scheduler(self):
+        self.is_running = False
+        monitor, reader = self._tasks or (None, None)
+        if monitor:
+            monitor.cancel()
+            await asyncio.gather(monitor, return_exceptions=True)
+
+        for _, commands in self._processes.values():
+            commands.put(('stop',))
+        for process, _ in self._processes.values():
+            # Workers flush their buffered price rows before exiting; keep reading
+            # events meanwhile so a full queue cannot block them
+            await asyncio.to_thread(process.join, 10)
+            if process.is_alive():
+                process.terminate()
+        for slot in list(self._processes):
+            self._forget(slot)
+        self._processes.clear()
+        self.shard_map = {}
+
+        self._reading = False
+        if reader:
+            await reader
+        self._tasks = []
+        # Deliver whatever the workers reported on their way out
+        await self._dispatch(self._drain_events(block=False))
+        logging.info("⏹️ Scheduler stopped")
+
+    def get_scheduler_status(self):
+        return {
+            'is_running': self.is_running,
+            'mode': f"sharded/{PRICE_SOURCE}",
+            'workers': {slot: process.is_alive() for slot, (process, _) in self._processes.items()},
+            'alarms': len(self),
+            'restarts': self.restarts
+        }
+
+    def _start_worker(self, slot):
+        """Starts a worker process; returns it with its command queue."""
+        commands = self._context.Queue()
+        process = self._context.Process(
+            target=run_shard_worker,
+            args=(slot, self.db_path, commands, self._events),
+            name=f"shard-worker-{slot}",
+            daemon=True
+        )
+        process.start()
+        return process, commands
+
+    def _spawn(self, slot):
+        self._processes[slot] = self._start_worker(slot)
+        self._granted[slot] = set()
+        self._may_hold[slot] = set()
+
+    def _forget(self, slot):
+        for state in (self._status, self._granted, self._may_hold, self._sent_seq):
+            state.pop(slot, None)
+
+    def _assign(self, slot, shards):
+        self._seq += 1
+        self._sent_seq[slot] = self._seq
+        self._granted[slot] = set(shards)
+        self._may_hold[slot] |= self._granted[slot]
+        self._processes[slot][1].put(('assign', self._seq, sorted(shards), self.shard_count))
+
+    def _rebalance(self):
+        self.shard_map = assign_shards(self._processes, self.shard_count, previous=self.shard_map)
+        # Take shards away first; their new owners get them in _grant() once this is confirmed
+        for slot in self._processes:
+            kept = {shard for shard in self._granted[slot] if self.shard_map.get(shard) == slot}
+            if kept != self._granted[slot]:
+                self._assign(slot, kept)
+        self._grant()
+
+    def _grant(self):
+        """Hands out every shard whose previous owner has let go of it (or died)."""
+        for slot in self._processes:
+            wanted = {shard for shard, owner in self.shard_map.items() if owner == slot}
+            free = {
+                shard for shard in wanted - self._granted[slot]
+                if not any(shard in held for other, held in self._may_hold.items() if other != slot)
+            }
+            if free:
+                self._assign(slot, self._granted[slot] | free)
+
+    async def _monitor(self):
+        while self.is_running:
+            await asyncio.sleep(1)
+            changed = False
+
+            for slot, (process, _) in list(self._processes.items()):
+                if not process.is_alive():
+                    logging.error(f"💥 Shard worker {slot} died (exit code {process.exitcode}), reassigning its shards")
+                    del self._processes[slot]
+                    self._forget(slot)
+                    # Back off when a worker keeps dying before it gets going
+                    failures = self._failures[slot] = self._failures.get(slot, 0) + 1
+                    self._respawn_at[slot] = time.monotonic() + self.respawn_delay * 2 ** min(failures - 1, 6)
+                    changed = True
+
+            for slot, respawn_at in list(self._respawn_at.items()):
+                if time.monotonic() >= respawn_at:
+                    del self._respawn_at[slot]
+                    self._spawn(slot)
+                    self.restarts += 1
+                    changed = True
+
+            if changed:
+                self._rebalance()
+
+    def _drain_events(self, block=True, limit=1000):
+        events = []
+        try:
+            events.append(self._events.get(timeout=0.5) if block else self._events.get_nowait())
+            while len(events) < limit:
+                events.append(self._events.get_nowait())
+        except queue.Empty:
+            pass
+        return events
+
+    async def _read_events(self):
+        while self._reading:
+            events = await asyncio.to_thread(self._drain_events)
+            await self._dispatch(events)
+
+    async def _dispatch(self, events):
+        for event in events:
+            if event[0] == 'notify':
+                _, user_id, message = event
+                if self.telegram_bot:
+                    try:
+                        await self.telegram_bot.send_notification(user_id, message)
+                    except Exception as e:
+                        logging.error(f"❌ Notification error for {user_id}: {e}")
+            elif event[0] == 'assigned':
+                _, slot, seq, shards = event
+                # Only the answer to the latest command says what the worker holds now
+                if slot in self._processes and seq == self._sent_seq.get(slot):
+                    self._may_hold[slot] = set(shards)
+                    self._grant()
+            elif event[0] == 'status':
+                _, slot, alarms, symbols = event
+                if slot in self._processes:
+                    self._status[slot] = (alarms, symbols)
+                    self._failures.pop(slot, None)
@@ -0,0 +1,59 @@
+import pytest
+
+import admission
+from admission import AdmissionController
+
+LIMITS = {
+    'heavy': {'rate': 0.5, 'burst': 2, 'concurrency': 2},
+    'light': {'rate': 1.0, 'burst': 3, 'concurrency': 10},
+}
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    # rate_limit and admission share the time module
+    monkeypatch.setattr(admission.time, 'monotonic', lambda: now[0])
+    return now
+
+def test_user_bucket_limits_each_command(clock):
+    controller = AdmissionController(LIMITS)
+    results = [controller.admit('light', 1, 'price', [f"SYM{i}"]) for i in range(4)]
+    assert [isinstance(r, tuple) for r in results] == [True, True, True, False]
+    assert results[3] == 'rate'
+
+    # Another command and another user have their own buckets
+    assert isinstance(controller.admit('light', 1, 'alarms'), tuple)
+    assert isinstance(controller.admit('light', 2, 'price', ["SYM0"]), tuple)
+
+    clock[0] += 1
+    assert isinstance(controller.admit('light', 1, 'price', ["SYM9"]), tuple)
+    assert controller.rejected['light']['rate'] == 1
+
+def test_class_concurrency_cap(clock):
+    controller = AdmissionController(LIMITS)
+    first = controller.admit('heavy', 1, 'chart', ["BTCUSDT"])
+    controller.admit('heavy', 2, 'chart', ["BTCUSDT"])
+    assert controller.admit('heavy', 3, 'chart', ["BTCUSDT"]) == 'busy'
+    # The light class is not affected
+    assert isinstance(controller.admit('light', 3, 'price', ["BTCUSDT"]), tuple)
+
+    controller.release(first)
+    assert isinstance(controller.admit('heavy', 3, 'chart', ["BTCUSDT"]), tuple)
+    assert controller.stats()['heavy']['running'] == 2
+
+def test_identical_request_in_flight_is_a_duplicate(clock):
+    controller = AdmissionController(LIMITS)
+    ticket = controller.admit('heavy', 1, 'chart', ["btcusdt"])
+    assert controller.admit('heavy', 1, 'chart', ["BTCUSDT"]) == 'duplicate'
+    controller.release(ticket)
+    assert isinstance(controller.admit('heavy', 1, 'chart', ["BTCUSDT"]), tuple)
+
+def test_rejection_notices_are_suppressed(clock):
+    controller = AdmissionController(LIMITS, notice_seconds=10)
+    assert controller.should_notify(1, 'chart')
+    clock[0] += 9.9
+    assert not controller.should_notify(1, 'chart')
+    assert controller.should_notify(1, 'price')
+    assert controller.should_notify(2, 'chart')
+    clock[0] += 0.1
+    assert controller.should_notify(1, 'chart')
@@ -0,0 +1,126 @@
+import time
+
+import pytest
+
+from alarm_index import Alarm, AlarmIndex
+from database import Database
+
+def price_alarm(alarm_id, target, condition="above", symbol="BTCUSDT", **options):
+    return Alarm(alarm_id, 7, symbol, target, condition, 'telegram', **options)
+
+def fired(index, price, symbol="BTCUSDT", now=1000.0):
+    return sorted(alarm.id for alarm, _ in index.pop_triggered(symbol, price, now=now))
+
+def test_price_alarms_fire_once_on_their_side():
+    index = AlarmIndex()
+    for alarm in (price_alarm(1, 100), price_alarm(2, 50), price_alarm(3, 80, "below"), price_alarm(4, 40, "below"),
+                  price_alarm(5, 10, symbol="ETHUSDT")):
+        index.add(alarm)
+
+    assert fired(index, 70) == [2, 3]
+    assert fired(index, 70) == []
+    assert fired(index, 100) == [1]
+    assert fired(index, 40) == [4]
+    assert index.symbols() == {"ETHUSDT"}
+    assert len(index) == 1
+
+def test_remove_takes_the_alarm_out():
+    index = AlarmIndex()
+    index.add(price_alarm(1, 100))
+    assert index.remove(1).id == 1
+    assert index.remove(1) is None
+    assert fired(index, 200) == []
+    assert not index.symbols()
+
+@pytest.mark.parametrize("target", [float('nan'), float('inf'), float('-inf'), 0, -5])
+def test_invalid_targets_are_never_indexed(target):
+    index = AlarmIndex()
+    index.add(price_alarm(1, 100))
+    index.add(price_alarm(2, target))
+    index.add(price_alarm(3, 50))
+
+    assert 2 not in index
+    # A NaN in the sorted list used to make 70 fire the alarm at 100 as well
+    assert fired(index, 70) == [3]
+
+def test_load_skips_invalid_rows():
+    index = AlarmIndex()
+    index.load([price_alarm(1, 100), price_alarm(2, float('nan')), price_alarm(3, float('inf'), "below"),
+                price_alarm(4, 50)])
+
+    assert len(index) == 2
+    assert fired(index, 70) == [4]
+
+def test_recurring_alarm_rearms_after_leaving_the_band():
+    index = AlarmIndex()
+    index.add(price_alarm(1, 100, recurring=True, hysteresis=5.0))
+
+    assert fired(index, 101, now=1000) == [1]
+    assert index.drain_state_changes() == [(0, 1000, 1000, 1, 1)]
+    # Parked until the price drops below 95
+    assert fired(index, 102, now=1010) == []
+    assert fired(index, 96, now=1020) == []
+    assert fired(index, 101, now=1030) == []
+    assert fired(index, 94, now=1040) == []
+    assert index.drain_state_changes() == [(1, 1000, None, 0, 1)]
+    assert fired(index, 101, now=1050) == [1]
+    assert 1 in index
+
+def test_cooldown_suppresses_until_eligible():
+    index = AlarmIndex()
+    index.add(price_alarm(1, 50, "below", recurring=True, cooldown=600))
+
+    assert fired(index, 49, now=1000) == [1]
+    # Back above the target re-arms it, but only once the cooldown is over
+    assert fired(index, 51, now=1100) == []
+    assert fired(index, 49, now=1200) == []
+    assert fired(index, 49, now=1599) == []
+    assert fired(index, 49, now=1600) == [1]
+
+def test_move_window_forgets_old_prices():
+    index = AlarmIndex()
+    index.add(price_alarm(1, 5.0, "move", move_window=60))
+
+    assert fired(index, 100, now=0) == []
+    assert fired(index, 104, now=30) == []
+    # 6% above the low at t=0, but that low has left the 60s window
+    assert fired(index, 106, now=100) == []
+    [(alarm, change)] = index.pop_triggered("BTCUSDT", 112, now=110)
+    assert alarm.id == 1
+    assert change == pytest.approx((112 / 106 - 1) * 100)
+    assert len(index) == 0
+
+def test_recurring_move_alarm_fires_once_per_window():
+    index = AlarmIndex()
+    index.add(price_alarm(1, 5.0, "move", move_window=60, recurring=True))
+
+    assert fired(index, 100, now=0) == []
+    assert fired(index, 90, now=10) == [1]
+    assert fired(index, 80, now=20) == []
+    assert fired(index, 90, now=71) == [1]
+
+def test_trigger_state_survives_a_reload(tmp_path):
+    db = Database(str(tmp_path / "alarms.db"))
+    alarm_id = db.add_alarm(7, "BTCUSDT", 100.0, "above", recurring=True, cooldown=600, hysteresis=2.0)
+    # load() compares cooldowns with the wall clock
+    start = int(time.time())
+    index = AlarmIndex()
+    index.load(db.get_all_active_alarms())
+
+    assert fired(index, 101, now=start) == [alarm_id]
+    db.update_alarm_states(index.drain_state_changes())
+
+    reloaded = AlarmIndex()
+    reloaded.load(db.get_all_active_alarms())
+    # Still parked: above the target fires nothing until it drops below 98
+    assert fired(reloaded, 105, now=start + 1) == []
+    assert fired(reloaded, 97, now=start + 2) == []
+    db.update_alarm_states(reloaded.drain_state_changes())
+
+    # Re-armed, but cooling down until start + 600, also after another reload
+    reloaded = AlarmIndex()
+    reloaded.load(db.get_all_active_alarms())
+    assert fired(reloaded, 101, now=start + 3) == []
+    assert fired(reloaded, 101, now=start + 600) == [alarm_id]
+    assert db.conn.execute("SELECT trigger_count FROM alarms WHERE id = ?", (alarm_id,)).fetchone()[0] == 1
+    db.close()
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+import api_handler
+from api_handler import APIHandler
+from price_providers import StubProvider
+
+class CountingProvider(StubProvider):
+    def __init__(self, prices, delay=0.0, fail=False):
+        super().__init__(prices, delay=delay, fail=fail)
+        self.calls = []
+
+    async def fetch(self, symbols):
+        self.calls.append(sorted(symbols))
+        return await super().fetch(symbols)
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(api_handler.time, 'monotonic', lambda: now[0])
+    return now
+
+def test_cached_within_ttl_then_refetched(clock):
+    async def scenario():
+        provider = CountingProvider({'BTCUSDT': 65000.0, 'ETHUSDT': 3000.0})
+        api = APIHandler(cache_ttl=10, providers=[provider])
+
+        assert await api.get_price('BTCUSDT') == 65000.0
+        clock[0] += 10
+        assert await api.get_price('BTCUSDT') == 65000.0
+        # Only the symbol that is not cached is fetched
+        assert await api.get_prices(['BTCUSDT', 'ETHUSDT']) == {'BTCUSDT': 65000.0, 'ETHUSDT': 3000.0}
+        assert provider.calls == [['BTCUSDT'], ['ETHUSDT']]
+        assert (api.hits, api.misses) == (2, 2)
+
+        clock[0] += 0.5
+        provider.prices['BTCUSDT'] = 66000.0
+        assert await api.get_price('BTCUSDT') == 66000.0
+        assert provider.calls[-1] == ['BTCUSDT']
+        await api.close()
+
+    asyncio.run(scenario())
+
+def test_pushed_prices_are_served_from_the_cache(clock):
+    async def scenario():
+        provider = CountingProvider({})
+        api = APIHandler(cache_ttl=10, providers=[provider])
+        api.update_prices({'BTCUSDT': 65000.0})
+
+        assert await api.get_price('BTCUSDT') == 65000.0
+        assert provider.calls == []
+        await api.close()
+
+    asyncio.run(scenario())
+
+def test_concurrent_callers_share_one_fetch():
+    async def scenario():
+        provider = CountingProvider({'BTCUSDT': 65000.0, 'ETHUSDT': 3000.0}, delay=0.05)
+        api = APIHandler(cache_ttl=10, providers=[provider])
+
+        results = await asyncio.gather(
+            api.get_prices(['BTCUSDT', 'ETHUSDT']), *(api.get_price('BTCUSDT') for _ in range(9))
+        )
+
+        assert results[0] == {'BTCUSDT': 65000.0, 'ETHUSDT': 3000.0}
+        assert results[1:] == [65000.0] * 9
+        assert provider.calls == [['BTCUSDT', 'ETHUSDT']]
+        assert api.requests == 1
+        assert api.coalesced == 9
+        await api.close()
+
+    asyncio.run(scenario())
+
+def test_failed_fetch_reaches_every_waiter_and_is_not_cached():
+    async def scenario():
+        provider = CountingProvider({'BTCUSDT': 65000.0}, delay=0.05, fail=True)
+        api = APIHandler(cache_ttl=10, providers=[provider])
+
+        results = await asyncio.gather(*(api.get_price('BTCUSDT') for _ in range(5)))
+        assert results == [None] * 5
+        assert len(provider.calls) == 1
+        assert api.coalesced == 4
+
+        provider.fail = False
+        assert await api.get_price('BTCUSDT') == 65000.0
+        assert len(provider.calls) == 2
+        await api.close()
+
+    asyncio.run(scenario())
+
+def test_waiters_are_answered_when_the_fetch_raises(monkeypatch):
+    async def scenario():
+        api = APIHandler(cache_ttl=10, providers=[])
+
+        async def broken(symbols):
+            await asyncio.sleep(0.05)
+            raise RuntimeError("router bug")
+        monkeypatch.setattr(api.router, 'fetch', broken)
+
+        first = asyncio.ensure_future(api.get_price('BTCUSDT'))
+        await asyncio.sleep(0)
+        waiters = await asyncio.gather(*(api.get_price('BTCUSDT') for _ in range(3)))
+        with pytest.raises(RuntimeError):
+            await first
+
+        assert waiters == [None] * 3
+        assert not api._in_flight
+        assert 'BTCUSDT' not in api._cache
+        await api.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,55 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from alarm_index import AlarmIndex
+from bot_telegram import TelegramBot
+from database import Database
+
+class Message:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+@pytest.fixture
+def bot(tmp_path):
+    telegram_bot = TelegramBot.__new__(TelegramBot)
+    telegram_bot.db = Database(str(tmp_path / "alarms.db"))
+    telegram_bot.alarm_index = AlarmIndex()
+    yield telegram_bot
+    telegram_bot.db.close()
+
+def set_alarm(bot, *args):
+    update = SimpleNamespace(effective_chat=SimpleNamespace(id=7), message=Message())
+    asyncio.run(bot.set_alarm(update, SimpleNamespace(args=list(args))))
+    return update.message.replies[-1]
+
+@pytest.mark.parametrize("option", ["band=0", "band=-1%", "band=100%", "band=150", "band=nan", "cooldown=0", "cooldown=-5m"])
+def test_rejects_out_of_range_options(bot, option):
+    reply = set_alarm(bot, "BTCUSDT", "70000", "above", option)
+    assert reply.startswith("❗ Correct usage")
+    assert len(bot.alarm_index) == 0
+    assert bot.db.get_user_alarms(7) == []
+
+def test_accepts_band_and_cooldown(bot):
+    reply = set_alarm(bot, "BTCUSDT", "70000", "above", "band=1.5%", "cooldown=30m")
+    assert reply.startswith("✅ Alarm added")
+    assert "cooldown 30m" in reply and "band 1.5%" in reply
+    assert len(bot.alarm_index) == 1
+
+@pytest.mark.parametrize("price", ["nan", "inf", "-inf", "0", "-100"])
+def test_rejects_invalid_prices(bot, price):
+    reply = set_alarm(bot, "BTCUSDT", price, "above")
+    assert reply == "❗ Price must be a positive number."
+    assert len(bot.alarm_index) == 0
+    assert bot.db.get_user_alarms(7) == []
+
+@pytest.mark.parametrize("threshold", ["nan%", "inf", "-inf%", "0%", "-3%"])
+def test_rejects_invalid_move_thresholds(bot, threshold):
+    reply = set_alarm(bot, "BTCUSDT", "move", threshold, "1h")
+    assert reply.startswith("❗ Move must be above 0%")
+    assert len(bot.alarm_index) == 0
+    assert bot.db.get_user_alarms(7) == []
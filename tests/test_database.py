@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+
+import database
+from database import MIGRATIONS, Database
+
+# The schema the first release created, before versioned migrations
+BASELINE_SCHEMA = """
+    CREATE TABLE alarms (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        symbol TEXT NOT NULL,
+        target_price REAL NOT NULL,
+        condition TEXT CHECK(condition IN ('above', 'below')) NOT NULL,
+        platform TEXT DEFAULT 'telegram',
+        active INTEGER DEFAULT 1,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE price_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        symbol TEXT NOT NULL,
+        price REAL NOT NULL,
+        timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO alarms (user_id, symbol, target_price, condition, active, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        [(1, "BTCUSDT", 65000.0, "above", 1, "2024-05-01 10:00:00"),
+         (2, "ETHUSDT", 3000.0, "below", 0, "2024-05-02 11:00:00")]
+    )
+    conn.executemany(
+        "INSERT INTO price_data (symbol, price, timestamp) VALUES (?, ?, ?)",
+        [("BTCUSDT", 64000.0, "2024-05-01 10:00:00"), ("ETHUSDT", 3100.0, "2024-05-01 10:05:00")]
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+def tables(db):
+    return {row[0] for row in db.conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")}
+
+def test_upgrades_a_baseline_database(baseline_db):
+    db = Database(baseline_db)
+
+    assert db.schema_version() == MIGRATIONS[-1][0]
+    assert {'candles', 'indicator_state', 'price_bars', 'retention_state', 'idx_price_data_symbol_time',
+            'idx_alarms_active_symbol', 'idx_alarms_active_user'} <= tables(db)
+
+    # Alarms keep their data and get the new columns' defaults
+    assert db.get_all_active_alarms() == [(1, 1, "BTCUSDT", 65000.0, "above", "telegram", 0, 0, 0.0, None, 1, 0)]
+    assert db.conn.execute("SELECT active, created_at FROM alarms WHERE id = 2").fetchone() == (0, "2024-05-02 11:00:00")
+    # Text timestamps become epoch seconds
+    assert db.conn.execute("SELECT symbol, price, timestamp FROM price_data ORDER BY id").fetchall() == [
+        ("BTCUSDT", 64000.0, 1714557600), ("ETHUSDT", 3100.0, 1714557900)
+    ]
+    # New rows fit the new schema
+    alarm_id = db.add_alarm(3, "BTCUSDT", 2.5, "move", recurring=True, move_window=3600)
+    assert alarm_id == 3
+    db.close()
+
+def test_reopening_applies_nothing_again(baseline_db):
+    Database(baseline_db).close()
+    conn = sqlite3.connect(baseline_db)
+    before = conn.execute("SELECT version, applied_at FROM schema_version ORDER BY version").fetchall()
+    schema = conn.execute("SELECT sql FROM sqlite_master ORDER BY name").fetchall()
+    conn.close()
+
+    db = Database(baseline_db)
+    db.create_tables()
+    assert db.conn.execute("SELECT version, applied_at FROM schema_version ORDER BY version").fetchall() == before
+    assert db.conn.execute("SELECT sql FROM sqlite_master ORDER BY name").fetchall() == schema
+    assert len(db.get_all_active_alarms()) == 1
+    db.close()
+
+def test_new_database_gets_every_migration(tmp_path):
+    db = Database(str(tmp_path / "new.db"))
+    versions = [row[0] for row in db.conn.execute("SELECT version FROM schema_version ORDER BY version")]
+    assert versions == [version for version, _, _ in MIGRATIONS]
+    db.close()
+
+def test_failed_migration_is_rolled_back(tmp_path, monkeypatch):
+    path = str(tmp_path / "broken.db")
+    Database(path).close()
+
+    def broken(c):
+        c.execute("CREATE TABLE half_done (id INTEGER)")
+        raise sqlite3.OperationalError("boom")
+    next_version = MIGRATIONS[-1][0] + 1
+    monkeypatch.setattr(database, 'MIGRATIONS', MIGRATIONS + [(next_version, "broken", broken)])
+
+    with pytest.raises(sqlite3.OperationalError):
+        Database(path)
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] == next_version - 1
+    assert not conn.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchall()
+    conn.close()
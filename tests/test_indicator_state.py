@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import pandas as pd
+
+from api_handler import APIHandler
+from bot_telegram import TelegramBot
+from database import Database
+import indicator_state
+from indicator_state import IndicatorBook
+from price_providers import StubProvider
+from scheduler import AlarmScheduler
+
+class RecordingProvider(StubProvider):
+    def __init__(self, prices):
+        super().__init__(prices)
+        self.requested = []
+
+    async def fetch(self, symbols):
+        self.requested.append(set(symbols))
+        return await super().fetch(symbols)
+
+class FakeCandles:
+    def __init__(self, frame):
+        self.frame = frame
+
+    async def get(self, symbol, interval, period):
+        return self.frame
+
+def daily_frame(days=30, start_price=100.0):
+    index = pd.date_range(end=pd.Timestamp.now(tz='UTC').floor('D'), periods=days, freq='D')
+    closes = [start_price + i for i in range(days)]
+    return pd.DataFrame(
+        {'Open': closes, 'High': [c + 1 for c in closes], 'Low': [c - 1 for c in closes], 'Close': closes},
+        index=index
+    )
+
+def make_bot(book, api, frame):
+    bot = TelegramBot.__new__(TelegramBot)
+    bot.indicator_book = book
+    bot.api = api
+    bot.candles = FakeCandles(frame)
+    return bot
+
+def test_unsupported_symbol_is_dropped_after_one_poll(tmp_path):
+    async def scenario():
+        db = Database(str(tmp_path / "bot.db"))
+        provider = RecordingProvider({'BTCUSDT': 65000.0})
+        api = APIHandler(cache_ttl=0, providers=[provider])
+        book = IndicatorBook()
+        bot = make_bot(book, api, daily_frame())
+        scheduler = AlarmScheduler(alarm_index=None, api=api, db=db, indicator_book=book)
+
+        # yfinance knows AAPL, the price provider does not
+        assert await bot._analysis('AAPL', 'performance') is not None
+        assert await bot._analysis('BTCUSDT', 'performance') is not None
+        # The cold path works from the candles alone
+        assert provider.requested == []
+
+        for _ in range(3):
+            await scheduler.check_alarms()
+        await scheduler.save_indicators()
+
+        assert provider.requested[0] == {'AAPL', 'BTCUSDT'}
+        assert all(symbols == {'BTCUSDT'} for symbols in provider.requested[1:])
+        assert 'AAPL' not in book
+        assert [symbol for symbol, _ in db.get_indicator_states()] == ['BTCUSDT']
+
+        await api.close()
+        db.close()
+
+    asyncio.run(scenario())
+
+def test_without_a_book_commands_use_candles():
+    async def scenario():
+        provider = RecordingProvider({'BTCUSDT': 65000.0})
+        api = APIHandler(cache_ttl=0, providers=[provider])
+        bot = make_bot(None, api, daily_frame())
+
+        result = await bot._analysis('BTCUSDT', 'performance')
+        assert result['current_price'] == 129.0
+        assert provider.requested == []
+        await api.close()
+
+    asyncio.run(scenario())
+
+def test_restored_unpriced_symbol_is_dropped(tmp_path):
+    async def scenario():
+        db = Database(str(tmp_path / "bot.db"))
+        seeded = IndicatorBook()
+        seeded.seed('AAPL', [(int(time.time()) - 86400 * i, 2.0, 1.0, 1.5) for i in range(20, 0, -1)])
+        db.save_indicator_states(seeded.snapshot())
+
+        provider = RecordingProvider({'BTCUSDT': 65000.0})
+        api = APIHandler(cache_ttl=0, providers=[provider])
+        book = IndicatorBook()
+        book.load(db.get_indicator_states())
+        book.seed('BTCUSDT', [(int(time.time()), 2.0, 1.0, 1.5)])
+        scheduler = AlarmScheduler(alarm_index=None, api=api, db=db, indicator_book=book)
+
+        await scheduler.check_alarms()
+        await scheduler.check_alarms()
+
+        assert 'AAPL' not in book
+        assert provider.requested[-1] == {'BTCUSDT'}
+        assert [symbol for symbol, _ in db.get_indicator_states()] == ['BTCUSDT']
+
+        await api.close()
+        db.close()
+
+    asyncio.run(scenario())
+
+def test_idle_states_are_evicted(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(indicator_state.time, 'time', lambda: clock[0])
+    book = IndicatorBook()
+    book.seed('BTCUSDT', [(0, 2.0, 1.0, 1.5)])
+    book.seed('ETHUSDT', [(0, 2.0, 1.0, 1.5)])
+
+    clock[0] += 30
+    assert book.evict_idle(60) == []
+    book.get('ETHUSDT')
+
+    clock[0] += 31
+    assert book.evict_idle(60) == ['BTCUSDT']
+    assert book.symbols() == {'ETHUSDT'}
+    assert book.drain_removed() == ['BTCUSDT']
+    assert book.drain_removed() == []
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import indicators
+
+# StockCharts "RSI" ChartSchool worksheet: closes and the 14-period RSI from the 15th close on
+REFERENCE_CLOSES = [
+    44.3389, 44.0902, 44.1497, 43.6124, 44.3278, 44.8264, 45.0955, 45.4245, 45.8433, 46.0826,
+    45.8931, 46.0328, 45.6140, 46.2820, 46.2820, 46.0028, 46.0328, 46.4116, 46.2222, 45.6439,
+]
+REFERENCE_RSI = [70.53, 66.32, 66.55, 69.41, 66.36, 57.97]
+
+@pytest.fixture
+def closes():
+    rng = np.random.default_rng(1)
+    return 100 * np.cumprod(1 + rng.normal(0, 0.02, size=(6, 80)), axis=1)
+
+def seeded_ewm(values, alpha, period):
+    """pandas' recursive EWM, started from the mean of the first `period` values at index period - 1."""
+    series = pd.Series(values, dtype=float)
+    seeded = pd.concat([pd.Series([series.iloc[:period].mean()]), series.iloc[period:]], ignore_index=True)
+    out = seeded.ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    return np.concatenate([np.full(period - 1, np.nan), out])
+
+def assert_close(actual, expected):
+    np.testing.assert_allclose(actual, expected, rtol=1e-10, atol=1e-10, equal_nan=True)
+
+def test_rsi_matches_stockcharts_reference():
+    assert list(np.round(indicators.rsi(REFERENCE_CLOSES, 14)[14:], 2)) == REFERENCE_RSI
+
+def test_rsi_with_period_plus_one_closes_is_the_old_plain_average(closes):
+    # The old /performance loop: plain averages of the last 14 gains and losses
+    for row in closes[:, :15]:
+        changes = np.diff(row)
+        gain, loss = np.clip(changes, 0, None).mean(), np.clip(-changes, 0, None).mean()
+        assert indicators.rsi(row, 14)[-1] == pytest.approx(100 - 100 / (1 + gain / loss))
+
+def test_rsi_matches_pandas_wilder(closes):
+    for row in closes:
+        deltas = np.diff(row)
+        gain = seeded_ewm(np.clip(deltas, 0, None), 1 / 14, 14)
+        loss = seeded_ewm(np.clip(-deltas, 0, None), 1 / 14, 14)
+        assert_close(indicators.rsi(row, 14), np.concatenate([[np.nan], 100 - 100 / (1 + gain / loss)]))
+
+def test_returns_and_volatility_match_pandas(closes):
+    for row in closes:
+        series = pd.Series(row)
+        assert_close(indicators.returns(row), series.pct_change().to_numpy())
+        # The old /performance volatility
+        assert indicators.volatility(row) == pytest.approx(series.pct_change().dropna().std())
+        assert_close(indicators.volatility(row, 10), series.pct_change().rolling(10).std().to_numpy())
+
+@pytest.mark.parametrize("window", [1, 7, 14, 80])
+def test_sma_matches_pandas_rolling_mean(closes, window):
+    for row in closes:
+        assert_close(indicators.sma(row, window), pd.Series(row).rolling(window).mean().to_numpy())
+
+def test_sma_needs_a_full_window():
+    assert np.isnan(indicators.sma([1.0, 2.0], 3)).all()
+
+@pytest.mark.parametrize("span", [5, 12, 26])
+def test_ema_matches_pandas_ewm(closes, span):
+    for row in closes:
+        assert_close(indicators.ema(row, span), seeded_ewm(row, 2 / (span + 1), span))
+
+def test_atr_matches_pandas(closes):
+    rng = np.random.default_rng(2)
+    high = closes * (1 + rng.uniform(0, 0.03, closes.shape))
+    low = closes * (1 - rng.uniform(0, 0.03, closes.shape))
+    for h, l, c in zip(high, low, closes):
+        frame = pd.DataFrame({'high': h, 'low': l, 'prev': pd.Series(c).shift()})
+        true_range = pd.concat(
+            [frame['high'] - frame['low'], (frame['high'] - frame['prev']).abs(), (frame['low'] - frame['prev']).abs()],
+            axis=1
+        ).max(axis=1)
+        assert_close(indicators.atr(h, l, c, 14), seeded_ewm(true_range.to_numpy(), 1 / 14, 14))
+
+def test_bollinger_matches_pandas(closes):
+    for row in closes:
+        rolling = pd.Series(row).rolling(20)
+        middle, std = rolling.mean().to_numpy(), rolling.std(ddof=0).to_numpy()
+        for actual, expected in zip(indicators.bollinger(row, 20, 2.0), (middle, middle + 2 * std, middle - 2 * std)):
+            np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+def test_rows_are_computed_independently(closes):
+    for func in (lambda v: indicators.rsi(v, 14), lambda v: indicators.ema(v, 12), lambda v: indicators.sma(v, 7),
+                 lambda v: indicators.volatility(v, 10), lambda v: indicators.bollinger(v)[1]):
+        batch = func(closes)
+        for i, row in enumerate(closes):
+            assert_close(batch[i], func(row))
@@ -0,0 +1,220 @@
+import asyncio
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from notifier import NotificationDispatcher, build_digests, telegram_length
+
+class FakeBot:
+    """send_message that raises the scripted errors for a chat, in order, then succeeds."""
+
+    def __init__(self, script=None):
+        self.script = {chat_id: list(errors) for chat_id, errors in (script or {}).items()}
+        self.attempts = []   # (loop time, chat_id, text) of every call
+        self.delivered = []  # (loop time, chat_id, text) of the successful ones
+        self.parse_modes = []  # parse_mode of the successful ones
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        now = asyncio.get_running_loop().time()
+        self.attempts.append((now, chat_id, text))
+        errors = self.script.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.delivered.append((now, chat_id, text))
+        self.parse_modes.append(parse_mode)
+
+    def times(self, chat_id, delivered=True):
+        return [t for t, chat, _ in (self.delivered if delivered else self.attempts) if chat == chat_id]
+
+def dispatcher(bot, **options):
+    options.setdefault('digest_window', 0)
+    options.setdefault('rate', 1000)
+    options.setdefault('per_chat_rate', 1000)
+    return NotificationDispatcher(bot, **options)
+
+async def run(notifier, messages, timeout=10):
+    await notifier.start()
+    for chat_id, text in messages:
+        notifier.submit(chat_id, text)
+    await asyncio.wait_for(notifier.drain(), timeout)
+    await notifier.stop(timeout=1)
+
+def test_retry_after_pauses_every_chat():
+    async def scenario():
+        bot = FakeBot({1: [RetryAfter(0.3)]})
+        notifier = dispatcher(bot)
+        await notifier.start()
+        notifier.submit(1, "first")
+        await asyncio.sleep(0.05)
+        # A 429 is for the whole bot, so the other chat waits too
+        notifier.submit(2, "other chat")
+        await asyncio.wait_for(notifier.drain(), 5)
+        await notifier.stop(timeout=1)
+
+        rejected_at = bot.times(1, delivered=False)[0]
+        assert bot.times(2)[0] - rejected_at >= 0.29
+        assert bot.times(1)[0] - rejected_at >= 0.29
+        assert notifier.rate_limited == 1
+        assert notifier.failed == 0
+
+    asyncio.run(scenario())
+
+def test_retry_after_stops_at_max_attempts():
+    async def scenario():
+        bot = FakeBot({1: [RetryAfter(0.01)] * 10})
+        notifier = dispatcher(bot, max_attempts=3)
+        await run(notifier, [(1, "hello")])
+
+        assert len(bot.attempts) == 3
+        assert not bot.delivered
+        assert notifier.failed == 1
+        assert notifier.rate_limited == 3
+
+    asyncio.run(scenario())
+
+def test_throttled_chat_does_not_hold_up_others():
+    async def scenario():
+        bot = FakeBot()
+        # One worker; chat 1 gets a burst of 3, then one message per second
+        notifier = dispatcher(bot, workers=1, per_chat_rate=1)
+        await notifier.start()
+        started = asyncio.get_running_loop().time()
+        for i in range(5):
+            notifier.submit(1, f"burst {i}")
+        notifier.submit(2, "other chat")
+        await asyncio.wait_for(notifier.drain(), 5)
+        await notifier.stop(timeout=1)
+
+        assert bot.times(2)[0] - started < 0.2
+        assert len(bot.times(1)) == 5
+        assert max(bot.times(1)) - started >= 1.9
+
+    asyncio.run(scenario())
+
+def test_network_errors_are_retried_with_backoff():
+    async def scenario():
+        bot = FakeBot({1: [NetworkError("reset"), NetworkError("reset")]})
+        notifier = dispatcher(bot, base_backoff=0.05)
+        await run(notifier, [(1, "hello")])
+
+        attempts = bot.times(1, delivered=False)
+        assert len(attempts) == 3
+        # 0.05 * 2 ** attempt: 0.1s, then 0.2s
+        assert attempts[1] - attempts[0] >= 0.09
+        assert attempts[2] - attempts[1] >= 0.19
+        assert notifier.retried == 2
+        assert notifier.sent == 1
+
+    asyncio.run(scenario())
+
+def test_retries_stop_at_max_attempts():
+    async def scenario():
+        bot = FakeBot({1: [NetworkError("down")] * 10})
+        notifier = dispatcher(bot, base_backoff=0.01, max_attempts=3)
+        await run(notifier, [(1, "hello")])
+
+        assert len(bot.attempts) == 3
+        assert not bot.delivered
+        assert notifier.failed == 1
+
+    asyncio.run(scenario())
+
+def test_forbidden_is_dropped_without_retry():
+    async def scenario():
+        bot = FakeBot({1: [Forbidden("bot was blocked by the user")]})
+        notifier = dispatcher(bot)
+        await run(notifier, [(1, "hello"), (2, "hello")])
+
+        assert bot.times(1, delivered=False) and not bot.times(1)
+        assert len(bot.times(1, delivered=False)) == 1
+        assert len(bot.times(2)) == 1
+        assert notifier.failed == 1
+        assert notifier.retried == 0
+
+    asyncio.run(scenario())
+
+def test_global_rate_ceiling():
+    async def scenario():
+        rate, count = 40, 100
+        bot = FakeBot()
+        notifier = dispatcher(bot, rate=rate)
+        # One message per chat, so only the global bucket can hold them back
+        await run(notifier, [(chat_id, "hello") for chat_id in range(count)])
+
+        times = sorted(t for t, _, _ in bot.delivered)
+        assert len(times) == count
+        # A full bucket (capacity = rate) goes at once, the rest at `rate` per second
+        assert times[-1] - times[0] >= (count - rate) / rate * 0.95
+        for start in range(count):
+            within = sum(1 for t in times[start:] if t - times[start] < 0.5)
+            assert within <= rate + rate * 0.5 + 1
+
+    asyncio.run(scenario())
+
+def test_digests_split_only_between_notifications():
+    texts = [f"🚨 *Alarm {i}* `BTCUSDT` crossed *{i * 1000}*" for i in range(300)]
+    messages = build_digests(texts, limit=500)
+
+    assert len(messages) > 1
+    assert all(telegram_length(text) <= 500 and formatted for text, formatted in messages)
+    # Every notification arrives whole, so no entity is cut open
+    pieces = [piece for text, _ in messages for piece in text.split("\n\n")]
+    assert [piece for piece in pieces if not piece.startswith("🔔")] == texts
+    for text, _ in messages:
+        assert text.count("*") % 2 == 0 and text.count("`") % 2 == 0
+
+def test_oversized_notification_is_sent_plain():
+    async def scenario():
+        bot = FakeBot()
+        notifier = dispatcher(bot)
+        long_text = "\n".join(f"*line {i}* `{'x' * 40}`" for i in range(200))
+        await run(notifier, [(1, "short *one*"), (1, long_text)])
+
+        assert bot.parse_modes[0] == "Markdown"
+        assert len(bot.delivered) > 2
+        assert all(mode is None for mode in bot.parse_modes[1:])
+        assert "".join(text for _, _, text in bot.delivered[1:]) == long_text
+
+    asyncio.run(scenario())
+
+def test_unparseable_markdown_is_resent_plain():
+    async def scenario():
+        bot = FakeBot({1: [BadRequest("Can't parse entities: can't find end of the entity starting at byte offset 3")]})
+        notifier = dispatcher(bot)
+        await run(notifier, [(1, "an *open entity")])
+
+        assert [text for _, _, text in bot.delivered] == ["an *open entity"]
+        assert bot.parse_modes == [None]
+        assert notifier.failed == 0
+
+    asyncio.run(scenario())
+
+def test_other_bad_requests_are_dropped():
+    async def scenario():
+        bot = FakeBot({1: [BadRequest("Chat not found")]})
+        notifier = dispatcher(bot)
+        await run(notifier, [(1, "hello")])
+
+        assert len(bot.attempts) == 1 and not bot.delivered
+        assert notifier.failed == 1
+
+    asyncio.run(scenario())
+
+def test_digest_limit_counts_utf16_units():
+    # 🚨📈🎯 are outside the BMP: one code point each, two UTF-16 units for Telegram
+    texts = [f"🚨 *Alarm triggered!* 🚨\n\n💰 BTCUSDT\n📈 ${i:,}\n🎯 Target: ${i - 1:,}" for i in range(60000, 60400)]
+    messages = build_digests(texts)
+
+    assert len(messages) > 1
+    for text, formatted in messages:
+        assert formatted
+        assert telegram_length(text) <= 4096 - 96
+        assert len(text.encode('utf-16-le')) // 2 > len(text)
+    pieces = [piece for text, _ in messages for piece in text.split("\n\n")]
+    assert sum(piece.startswith("🚨") for piece in pieces) == len(texts)
+
+def test_oversized_emoji_line_is_cut_between_code_points():
+    text = "🚨" * 3000
+    pieces = [piece for piece, _ in build_digests([text], limit=1001)]
+
+    assert "".join(pieces) == text
+    assert all(telegram_length(piece) <= 1001 for piece in pieces)
@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+import httpx
+
+from fake_services import FakeBinance, FakeCoinGecko
+from price_providers import BinanceProvider, CoinGeckoProvider, ProviderRouter
+
+BINANCE_PRICES = {'BTCUSDT': 65000.0, 'ETHUSDT': 3000.0, 'SOLUSDT': 150.0}
+COINGECKO_PRICES = {'bitcoin': 64990.0, 'ethereum': 2999.0}
+
+class Setup:
+    """A router over BinanceProvider and CoinGeckoProvider, each talking to its local fake."""
+
+    def __init__(self, **router_options):
+        self.router_options = router_options
+        self.binance = FakeBinance(BINANCE_PRICES)
+        self.coingecko = FakeCoinGecko(COINGECKO_PRICES)
+
+    async def __aenter__(self):
+        await self.binance.start()
+        await self.coingecko.start()
+        self.client = httpx.AsyncClient(timeout=5)
+        self.binance_provider = BinanceProvider(self.client, base_url=self.binance.url)
+        self.coingecko_provider = CoinGeckoProvider(self.client, base_url=self.coingecko.url)
+        self.router = ProviderRouter([self.binance_provider, self.coingecko_provider], **self.router_options)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+        await self.binance.stop()
+        await self.coingecko.stop()
+
+    def health(self, provider):
+        return self.router.health[provider]
+
+def test_slow_primary_is_hedged():
+    async def scenario():
+        async with Setup(hedge_after=0.05) as s:
+            s.binance.delay = 0.5
+            started = time.perf_counter()
+            prices = await s.router.fetch(['BTCUSDT', 'ETHUSDT'])
+            elapsed = time.perf_counter() - started
+
+            assert prices == {'BTCUSDT': 64990.0, 'ETHUSDT': 2999.0}
+            assert elapsed < 0.3
+            assert s.router.hedged == 1
+            # The abandoned Binance call still counts as at least that slow (once its cancellation ran)
+            await asyncio.sleep(0.01)
+            assert s.health(s.binance_provider).latency >= 0.05
+            assert s.health(s.binance_provider).error_rate == 0
+
+    asyncio.run(scenario())
+
+def test_failed_primary_falls_over_without_waiting():
+    async def scenario():
+        async with Setup(hedge_after=1.0) as s:
+            s.binance.status = 500
+            started = time.perf_counter()
+            prices = await s.router.fetch(['BTCUSDT'])
+
+            assert prices == {'BTCUSDT': 64990.0}
+            assert time.perf_counter() - started < 0.5
+            assert s.router.hedged == 0
+            assert s.health(s.binance_provider).consecutive_failures == 1
+            assert s.health(s.binance_provider).error_rate > 0
+
+    asyncio.run(scenario())
+
+def test_missing_symbols_are_asked_of_the_next_provider():
+    async def scenario():
+        async with Setup(hedge_after=1.0) as s:
+            s.router.providers.reverse()  # CoinGecko first; it has no SOLUSDT
+            prices = await s.router.fetch(['BTCUSDT', 'SOLUSDT'])
+
+            assert prices == {'BTCUSDT': 64990.0, 'SOLUSDT': 150.0}
+            assert s.binance.requests == 1
+
+    asyncio.run(scenario())
+
+def test_ewma_health_orders_providers():
+    async def scenario():
+        async with Setup(hedge_after=0.05) as s:
+            assert s.router.ranked()[0] is s.binance_provider
+
+            s.binance.delay = 0.2
+            for _ in range(3):
+                await s.router.fetch(['BTCUSDT'])
+            assert s.router.ranked()[0] is s.coingecko_provider
+            requests = s.binance.requests
+            await s.router.fetch(['BTCUSDT'])
+            # The faster provider answers first now, no hedge needed
+            assert s.binance.requests == requests
+
+            s.binance.delay = 0.0
+            s.coingecko.delay = 0.2
+            for _ in range(10):
+                await s.router.fetch(['BTCUSDT'])
+            assert s.router.ranked()[0] is s.binance_provider
+
+    asyncio.run(scenario())
+
+def test_circuit_breaker_opens_half_opens_and_closes():
+    async def scenario():
+        async with Setup(hedge_after=1.0, failure_threshold=2, reset_timeout=0.3) as s:
+            health = s.health(s.binance_provider)
+            s.binance.status = 500
+
+            # SOLUSDT is only on Binance, so it is asked every time even once it ranks last
+            for _ in range(2):
+                assert await s.router.fetch(['BTCUSDT', 'SOLUSDT']) == {'BTCUSDT': 64990.0}
+            assert health.is_open
+            assert s.binance.requests == 2
+
+            # Open: Binance is skipped, even for symbols only it has
+            assert await s.router.fetch(['BTCUSDT', 'SOLUSDT']) == {'BTCUSDT': 64990.0}
+            assert s.binance.requests == 2
+            assert s.binance_provider not in s.router.ranked()
+
+            # Half-open: one trial after reset_timeout; it fails and the breaker opens again
+            await asyncio.sleep(0.3)
+            await s.router.fetch(['SOLUSDT'])
+            assert s.binance.requests == 3
+            assert health.is_open
+            await s.router.fetch(['SOLUSDT'])
+            assert s.binance.requests == 3
+
+            # Recovered: the next trial succeeds and closes the breaker
+            s.binance.status = 200
+            await asyncio.sleep(0.3)
+            assert await s.router.fetch(['SOLUSDT']) == {'SOLUSDT': 150.0}
+            assert not health.is_open
+            assert health.consecutive_failures == 0
+            assert await s.router.fetch(['SOLUSDT']) == {'SOLUSDT': 150.0}
+            assert s.binance.requests == 5
+
+    asyncio.run(scenario())
+
+def test_coingecko_maps_symbols_to_coin_ids():
+    async def scenario():
+        async with Setup() as s:
+            prices = await s.coingecko_provider.fetch(['ETHUSDT', 'SOLUSDT', 'BTCUSDT'])
+            assert prices == {'BTCUSDT': 64990.0, 'ETHUSDT': 2999.0}
+            # Unmapped symbols are left out of the request
+            assert s.coingecko.requests == [['bitcoin', 'ethereum']]
+
+            assert await s.coingecko_provider.fetch(['SOLUSDT']) == {}
+            assert len(s.coingecko.requests) == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from database import Database
+from price_recorder import PriceRecorder
+from retention import RetentionEngine
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "prices.db"))
+    yield database
+    database.close()
+
+def stored(db):
+    return db.conn.execute("SELECT symbol, price, timestamp FROM price_data ORDER BY id").fetchall()
+
+def test_flushes_when_max_rows_are_waiting(db):
+    async def scenario():
+        recorder = PriceRecorder(db, max_rows=5, interval=3600)
+        recorder.start()
+        for i in range(4):
+            recorder.record(f"SYM{i}USDT", 1.0 + i, timestamp=1000)
+        await asyncio.sleep(0.05)
+        assert stored(db) == []
+
+        recorder.record("SYM4USDT", 5.0, timestamp=1000)
+        await asyncio.sleep(0.05)
+        assert len(stored(db)) == 5
+        assert recorder.stats()['queue_depth'] == 0
+        assert recorder.flushes == 1
+        await recorder.stop()
+
+    asyncio.run(scenario())
+
+def test_keeps_one_row_per_symbol_and_tick(db):
+    async def scenario():
+        recorder = PriceRecorder(db, max_rows=100, interval=3600)
+        recorder.record("BTCUSDT", 1.0, timestamp=1000.1)
+        recorder.record("BTCUSDT", 2.0, timestamp=1000.9)
+        recorder.record("BTCUSDT", 3.0, timestamp=1001.0)
+        await recorder.flush()
+
+    asyncio.run(scenario())
+    assert stored(db) == [("BTCUSDT", 2.0, 1000), ("BTCUSDT", 3.0, 1001)]
+
+def test_flushes_periodically(db):
+    async def scenario():
+        recorder = PriceRecorder(db, max_rows=100, interval=0.05)
+        recorder.start()
+        recorder.record("BTCUSDT", 1.0, timestamp=1000)
+        recorder.record("ETHUSDT", 2.0, timestamp=1000)
+        await asyncio.sleep(0.2)
+        assert len(stored(db)) == 2
+        recorder.record("BTCUSDT", 1.5, timestamp=1001)
+        await asyncio.sleep(0.2)
+        assert len(stored(db)) == 3
+        await recorder.stop()
+
+    asyncio.run(scenario())
+
+def test_stop_drains_the_buffer_for_the_rollup(db):
+    async def scenario():
+        recorder = PriceRecorder(db, max_rows=100, interval=3600)
+        recorder.start()
+        for i in range(30):
+            recorder.record("BTCUSDT", 100.0 + i, timestamp=1000 + i * 60)
+        await recorder.stop()
+        assert recorder.stats()['queue_depth'] == 0
+
+    asyncio.run(scenario())
+    assert len(stored(db)) == 30
+    # Every recorded tick is behind the retention watermark after one rollup
+    assert RetentionEngine(db, retention={}, batch_rows=1000).rollup_batch() == 30
+
+def test_failed_flush_keeps_the_rows(db, monkeypatch):
+    async def scenario():
+        recorder = PriceRecorder(db, max_rows=100, interval=3600)
+        recorder.record("BTCUSDT", 1.0, timestamp=1000)
+        write = db.add_price_data_many
+
+        def broken(rows):
+            raise RuntimeError("database is locked")
+        monkeypatch.setattr(db, 'add_price_data_many', broken)
+        await recorder.flush()
+        assert recorder.stats()['queue_depth'] == 1
+
+        # A newer price for the same tick, recorded after the failure, wins
+        recorder.record("BTCUSDT", 1.5, timestamp=1000)
+        monkeypatch.setattr(db, 'add_price_data_many', write)
+        await recorder.flush()
+
+    asyncio.run(scenario())
+    assert stored(db) == [("BTCUSDT", 1.5, 1000)]
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+import price_stream
+from fake_services import FakeBinanceStream
+from price_stream import PriceStream
+
+TICKS = [{'BTCUSDT': 65000.0 + i, 'ETHUSDT': 3000.0 + i} for i in range(9)]
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(price_stream.random, 'uniform', lambda low, high: high)
+
+class Recorder:
+    def __init__(self):
+        self.batches = []
+        self.tick_times = []
+        self.fallback_times = []
+
+    async def on_prices(self, prices):
+        self.batches.append(prices)
+        self.tick_times.append(asyncio.get_running_loop().time())
+
+    async def on_fallback(self):
+        self.fallback_times.append(asyncio.get_running_loop().time())
+
+def record_delays(stream):
+    delays = []
+    wait = stream._wait_with_fallback
+
+    async def recording(delay):
+        delays.append(delay)
+        await wait(delay)
+
+    stream._wait_with_fallback = recording
+    return delays
+
+async def wait_for(predicate, timeout=5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+async def stop(stream, task):
+    stream.stop()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+def test_replays_ticks_across_dropped_connections():
+    async def scenario():
+        server = FakeBinanceStream(TICKS, drop_after=3)
+        await server.start()
+        recorder = Recorder()
+        stream = PriceStream(recorder.on_prices, url=server.url, min_backoff=0.05, max_backoff=0.4)
+        delays = record_delays(stream)
+        task = asyncio.create_task(stream.run())
+
+        await wait_for(lambda: len(recorder.batches) == len(TICKS))
+        assert recorder.batches == TICKS
+        assert len(server.connected_at) == 3
+        # A connection that delivered ticks resets the backoff
+        assert delays[:2] == [0.05, 0.05]
+
+        await stop(stream, task)
+        await server.stop()
+
+    asyncio.run(scenario())
+
+def test_backoff_doubles_up_to_the_cap_while_unreachable():
+    async def scenario():
+        server = FakeBinanceStream(TICKS)
+        await server.start()
+        await server.stop()  # keep the port, refuse connections
+
+        recorder = Recorder()
+        stream = PriceStream(recorder.on_prices, url=server.url, min_backoff=0.01, max_backoff=0.04)
+        delays = record_delays(stream)
+        task = asyncio.create_task(stream.run())
+
+        await wait_for(lambda: len(delays) >= 5)
+        assert delays[:5] == [0.01, 0.02, 0.04, 0.04, 0.04]
+        assert not stream.connected
+
+        await stop(stream, task)
+
+    asyncio.run(scenario())
+
+def test_silent_stream_is_detected_as_stale():
+    async def scenario():
+        server = FakeBinanceStream(TICKS, stall_after=2)
+        await server.start()
+        recorder = Recorder()
+        stream = PriceStream(
+            recorder.on_prices, recorder.on_fallback, url=server.url,
+            min_backoff=0.05, fallback_interval=1, stale_timeout=0.3
+        )
+        task = asyncio.create_task(stream.run())
+
+        await wait_for(lambda: len(server.connected_at) == 2)
+        silence = server.connected_at[1] - recorder.tick_times[1]
+        assert silence >= 0.3
+        # The fallback poll covers the gap before the reconnect
+        assert len(recorder.fallback_times) == 1
+        await wait_for(lambda: len(recorder.batches) == 4)
+        assert recorder.batches == TICKS[:4]
+
+        await stop(stream, task)
+        await server.stop()
+
+    asyncio.run(scenario())
+
+def test_rest_fallback_hands_back_to_the_stream():
+    async def scenario():
+        server = FakeBinanceStream(TICKS)
+        await server.start()
+        await server.stop()
+
+        recorder = Recorder()
+        stream = PriceStream(
+            recorder.on_prices, recorder.on_fallback, url=server.url,
+            min_backoff=0.05, max_backoff=0.1, fallback_interval=0.1
+        )
+        task = asyncio.create_task(stream.run())
+
+        # Down: REST polls keep the alarms evaluated, at most once per fallback_interval
+        await wait_for(lambda: len(recorder.fallback_times) >= 3)
+        gaps = [b - a for a, b in zip(recorder.fallback_times, recorder.fallback_times[1:])]
+        assert min(gaps) >= 0.09
+        assert not recorder.batches
+
+        # Back up: ticks flow again and the polls stop
+        await server.start()
+        await wait_for(lambda: len(recorder.batches) == len(TICKS))
+        assert stream.connected
+        polls = len(recorder.fallback_times)
+        await asyncio.sleep(0.3)
+        assert len(recorder.fallback_times) == polls
+        assert recorder.fallback_times[-1] < recorder.tick_times[0]
+
+        await stop(stream, task)
+        await server.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,49 @@
+import pytest
+
+import rate_limit
+from rate_limit import TokenBucket, TokenBuckets
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, 'monotonic', lambda: now[0])
+    return now
+
+def test_bucket_allows_a_burst_then_the_rate(clock):
+    bucket = TokenBucket(2, capacity=3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert bucket.delay() == pytest.approx(0.5)
+
+    clock[0] += 0.5
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    # Never refills past its capacity
+    clock[0] += 100
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+def test_pause_holds_the_bucket_back(clock):
+    bucket = TokenBucket(1, capacity=5)
+    bucket.pause(3)
+    assert bucket.delay() == pytest.approx(4)
+    clock[0] += 3.9
+    assert not bucket.try_acquire()
+    clock[0] += 0.1
+    assert bucket.try_acquire()
+
+def test_buckets_are_per_key(clock):
+    buckets = TokenBuckets(1, capacity=1)
+    assert buckets.get('a').try_acquire()
+    assert not buckets.get('a').try_acquire()
+    assert buckets.get('b').try_acquire()
+    assert buckets.get('a') is buckets.get('a')
+
+def test_only_refilled_buckets_are_evicted(clock):
+    buckets = TokenBuckets(1, capacity=2, max_keys=3)
+    for key in ('idle', 'busy', 'other'):
+        buckets.get(key)
+    buckets.get('busy').try_acquire()
+
+    buckets.get('new')
+    assert len(buckets) == 2
+    busy = buckets.get('busy')
+    assert busy.tokens == pytest.approx(1)
@@ -0,0 +1,88 @@
+import asyncio
+import random
+
+import pandas as pd
+
+from database import Database
+from retention import RESOLUTIONS, WATERMARK, RetentionEngine
+
+DAY = 86400
+START = 1_700_000_000 // DAY * DAY
+
+def raw_rows(rng, symbols=("BTCUSDT", "ETHUSDT", "SOLUSDT"), count=600, days=3):
+    rows = []
+    for symbol in symbols:
+        # Distinct timestamps per symbol, so "first" and "last" are unambiguous
+        for ts in sorted(rng.sample(range(START + 1, START + days * DAY), count)):
+            rows.append((symbol, round(rng.uniform(10, 1000), 4), ts))
+    return sorted(rows, key=lambda row: row[2])
+
+def roll_up(engine):
+    while engine.rollup_batch() == engine.batch_rows:
+        pass
+
+def stored_bars(db):
+    rows = db.conn.execute("SELECT symbol, interval, ts, open, high, low, close, samples FROM price_bars")
+    return {(symbol, interval, ts): bar for symbol, interval, ts, *bar in rows}
+
+def expected_bars(rows):
+    """The same rollup done straight from the raw rows with a pandas groupby."""
+    frame = pd.DataFrame(rows, columns=['symbol', 'price', 'ts']).sort_values(['symbol', 'ts'])
+    expected = {}
+    for interval, seconds, _ in RESOLUTIONS:
+        frame['bucket'] = frame['ts'] // seconds * seconds
+        grouped = frame.groupby(['symbol', 'bucket'])['price'].agg(['first', 'max', 'min', 'last', 'count'])
+        for (symbol, bucket), bar in grouped.iterrows():
+            expected[(symbol, interval, int(bucket))] = [bar['first'], bar['max'], bar['min'], bar['last'],
+                                                         int(bar['count'])]
+    return expected
+
+def database(tmp_path, rows):
+    db = Database(str(tmp_path / "retention.db"))
+    db.add_price_data_many(rows)
+    return db
+
+def test_rollup_matches_pandas_groupby(tmp_path):
+    rows = raw_rows(random.Random(7))
+    db = database(tmp_path, rows)
+    # Small batches, so buckets straddle batch boundaries
+    engine = RetentionEngine(db, retention={}, batch_rows=37)
+    roll_up(engine)
+
+    assert stored_bars(db) == expected_bars(rows)
+    assert db.get_retention_state(WATERMARK) == len(rows)
+    db.close()
+
+def test_late_rows_recompute_their_bars(tmp_path):
+    rng = random.Random(11)
+    rows = raw_rows(rng)
+    db = database(tmp_path, rows)
+    engine = RetentionEngine(db, retention={}, batch_rows=50)
+    roll_up(engine)
+
+    # Arrive after their buckets were rolled up: a new high, a new low and a new open
+    late = [("BTCUSDT", 5000.0, START + DAY + 17), ("ETHUSDT", 1.0, START + 2 * DAY + 3601), ("SOLUSDT", 42.0, START)]
+    db.add_price_data_many(late)
+    roll_up(engine)
+
+    assert stored_bars(db) == expected_bars(rows + late)
+    assert db.get_retention_state(WATERMARK) == len(rows) + len(late)
+
+    # Rolling everything up again from scratch changes nothing
+    before = stored_bars(db)
+    db.save_price_bars([], WATERMARK, 0)
+    roll_up(engine)
+    assert stored_bars(db) == before
+    db.close()
+
+def test_bars_of_retired_tiers_are_deleted(tmp_path):
+    rows = raw_rows(random.Random(3), count=50)
+    db = database(tmp_path, rows)
+    # Left behind by a finer tier that is no longer rolled up
+    db.save_price_bars([("BTCUSDT", "1s", START, 1.0, 1.0, 1.0, 1.0, 1)])
+    engine = RetentionEngine(db, retention={}, batch_rows=50)
+    asyncio.run(engine.run_once())
+
+    assert set(db.get_price_bar_intervals()) == {interval for interval, _, _ in RESOLUTIONS}
+    assert stored_bars(db) == expected_bars(rows)
+    db.close()
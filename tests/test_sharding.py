@@ -0,0 +1,173 @@
+import asyncio
+import queue
+
+import pytest
+
+from sharding import ShardCoordinator, ShardWorker, assign_shards, shard_for
+
+def owners(shard_map):
+    result = {}
+    for shard, slot in shard_map.items():
+        result.setdefault(slot, set()).add(shard)
+    return result
+
+def test_initial_assignment_is_even():
+    counts = [len(shards) for shards in owners(assign_shards(range(5), 64)).values()]
+    assert sorted(counts) == [12, 13, 13, 13, 13]
+
+def test_only_the_dead_workers_shards_move():
+    before = assign_shards(range(8), 64)
+    after = assign_shards([slot for slot in range(8) if slot != 3], 64, previous=before)
+
+    moved = {shard for shard in before if before[shard] != after[shard]}
+    assert moved == owners(before)[3]
+    counts = [len(shards) for shards in owners(after).values()]
+    assert max(counts) - min(counts) <= 1
+
+def test_replacement_takes_just_its_share():
+    before = assign_shards(range(8), 64)
+    degraded = assign_shards([slot for slot in range(8) if slot != 3], 64, previous=before)
+    after = assign_shards(range(8), 64, previous=degraded)
+
+    moved = {shard for shard in degraded if degraded[shard] != after[shard]}
+    assert moved == owners(after)[3]
+    assert len(moved) == 8
+
+class FakeProcess:
+    exitcode = None
+
+    def is_alive(self):
+        return True
+
+def coordinator(workers, shard_count):
+    coord = ShardCoordinator(workers=workers, shard_count=shard_count)
+    coord._start_worker = lambda slot: (FakeProcess(), queue.Queue())
+    return coord
+
+def sent(coord, slot):
+    commands = coord._processes[slot][1]
+    result = []
+    while not commands.empty():
+        result.append(commands.get_nowait())
+    return result
+
+async def ack(coord, slot, command):
+    _, seq, shards, _ = command
+    await coord._dispatch([('assigned', slot, seq, shards)])
+
+def test_handoff_waits_for_the_old_owner():
+    async def scenario():
+        coord = coordinator(3, 12)
+        for slot in range(3):
+            coord._spawn(slot)
+        coord._rebalance()
+        for slot in range(3):
+            (command,) = sent(coord, slot)
+            assert len(command[2]) == 4
+            await ack(coord, slot, command)
+
+        # Worker 1 dies: only its shards move, and at once (nobody else holds them)
+        kept = {slot: set(coord._granted[slot]) for slot in (0, 2)}
+        lost = coord._granted[1]
+        del coord._processes[1]
+        coord._forget(1)
+        coord._rebalance()
+        gained = set()
+        for slot in (0, 2):
+            (command,) = sent(coord, slot)
+            assert set(command[2]) > kept[slot]
+            gained |= set(command[2]) - kept[slot]
+            await ack(coord, slot, command)
+        assert gained == lost
+
+        # The replacement gets shards only as the current owners confirm letting go
+        coord._spawn(1)
+        coord._rebalance()
+        assert sent(coord, 1) == []
+        revoke_0, = sent(coord, 0)
+        revoke_2, = sent(coord, 2)
+        released_0 = coord._may_hold[0] - set(revoke_0[2])
+        released_2 = coord._may_hold[2] - set(revoke_2[2])
+        assert released_0 and released_2
+
+        await ack(coord, 0, revoke_0)
+        (grant,) = sent(coord, 1)
+        assert set(grant[2]) == released_0
+
+        await ack(coord, 2, revoke_2)
+        grant = sent(coord, 1)[-1]
+        assert set(grant[2]) == released_0 | released_2
+        assert sorted(len(shards) for shards in owners(coord.shard_map).values()) == [4, 4, 4]
+
+    asyncio.run(scenario())
+
+def test_stale_acknowledgement_does_not_release_shards():
+    async def scenario():
+        coord = coordinator(2, 4)
+        for slot in range(2):
+            coord._spawn(slot)
+        coord._rebalance()
+        first, = sent(coord, 0)
+        await ack(coord, 1, sent(coord, 1)[0])
+
+        # A second command is in flight when the answer to the first arrives
+        coord._assign(0, set())
+        await ack(coord, 0, first)
+        assert coord._may_hold[0] == set(first[2])
+
+    asyncio.run(scenario())
+
+@pytest.fixture
+def worker(tmp_path):
+    events = queue.Queue()
+    shard_worker = ShardWorker(0, str(tmp_path / "alarms.db"), queue.Queue(), events)
+    shard_worker.scheduler.is_running = True  # evaluate nothing, just hold the index
+    yield shard_worker, events
+    asyncio.run(shard_worker.api.close())
+    shard_worker.db.close()
+
+def test_worker_loads_and_drops_only_changed_shards(worker, monkeypatch):
+    shard_worker, events = worker
+    db = shard_worker.db
+    symbols = [f"SYM{i}USDT" for i in range(40)]
+    for symbol in symbols:
+        db.add_alarm(1, symbol, 100.0, 'above')
+    by_shard = {}
+    for symbol in symbols:
+        by_shard.setdefault(shard_for(symbol, 8), set()).add(symbol)
+
+    async def scenario():
+        await shard_worker._handle(('assign', 1, [0, 1, 2, 3], 8))
+        assert shard_worker.alarm_index.symbols() == set().union(*(by_shard.get(s, set()) for s in (0, 1, 2, 3)))
+
+        monkeypatch.setattr(shard_worker.alarm_index, 'load', lambda rows: pytest.fail("full reload"))
+        await shard_worker._handle(('assign', 2, [2, 3, 4], 8))
+        assert shard_worker.alarm_index.symbols() == set().union(*(by_shard.get(s, set()) for s in (2, 3, 4)))
+
+    asyncio.run(scenario())
+    acks = []
+    while not events.empty():
+        event = events.get_nowait()
+        if event[0] == 'assigned':
+            acks.append(event)
+    assert acks == [('assigned', 0, 1, [0, 1, 2, 3]), ('assigned', 0, 2, [2, 3, 4])]
+
+def test_dropped_alarms_keep_their_trigger_state(worker):
+    shard_worker, _ = worker
+    db = shard_worker.db
+    symbol = next(f"SYM{i}USDT" for i in range(100) if shard_for(f"SYM{i}USDT", 8) == 0)
+    alarm_id = db.add_alarm(1, symbol, 100.0, 'above', recurring=True, cooldown=600)
+
+    async def scenario():
+        await shard_worker._handle(('assign', 1, [0, 1], 8))
+        # Fired and parked, but not written yet
+        [(alarm, _)] = shard_worker.alarm_index.pop_triggered(symbol, 150.0, now=1000)
+        assert alarm.id == alarm_id
+        await shard_worker._handle(('assign', 2, [1], 8))
+        assert symbol not in shard_worker.alarm_index.symbols()
+
+    asyncio.run(scenario())
+    armed, next_eligible_at, last_triggered_at, trigger_count = db.conn.execute(
+        "SELECT armed, next_eligible_at, last_triggered_at, trigger_count FROM alarms WHERE id = ?", (alarm_id,)
+    ).fetchone()
+    assert (armed, next_eligible_at, last_triggered_at, trigger_count) == (0, 1600, 1000, 1)
@@ -0,0 +1,29 @@
+import asyncio
+
+from webhook_server import WebhookServer
+
+class HangingRunner:
+    """AppRunner whose cleanup waits on a request that never finishes."""
+
+    def __init__(self):
+        self.cancelled = False
+
+    async def cleanup(self):
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+def test_stop_gives_up_on_hung_requests():
+    async def scenario():
+        server = WebhookServer(application=None, url=None, secret_token="secret")
+        runner = server._runner = HangingRunner()
+
+        await asyncio.wait_for(server.stop(timeout=0.05), 1)
+
+        assert runner.cancelled
+        assert server._runner is None
+        assert server.draining
+
+    asyncio.run(scenario())
@@ -0,0 +1,89 @@
+import asyncio
+import hmac
+import json
+import logging
+import secrets
+from aiohttp import web
+from telegram import Update
+from config import WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+class WebhookServer:
+    """Receives Telegram updates over HTTP and feeds them to the Application's update queue.
+
+    Replaces getUpdates long polling: Telegram POSTs each update as it happens.
+    Requests without the secret token are rejected. On stop() the server
+    refuses new updates, lets in-flight requests finish, and leaves queued
+    updates for Application.stop() to process.
+    """
+
+    def __init__(self, application, url=WEBHOOK_URL, host=WEBHOOK_LISTEN, port=WEBHOOK_PORT,
+                 path=WEBHOOK_PATH, secret_token=WEBHOOK_SECRET):
+        self.application = application
+        self.url = url
+        self.host = host
+        self.port = port
+        self.path = path
+        # Without a configured secret, make one up; it is registered with set_webhook below
+        self.generated_secret = not secret_token
+        self.secret_token = secret_token or secrets.token_urlsafe(32)
+        self.draining = False
+        self._runner = None
+
+        self.received = 0
+        self.rejected = 0
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get("/healthz", self.health)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        logging.info(f"🪝 Webhook server listening on {self.host}:{self.port}{self.path}")
+
+        if self.url:
+            await self.application.bot.set_webhook(
+                url=f"{self.url.rstrip('/')}{self.path}",
+                secret_token=self.secret_token,
+                allowed_updates=Update.ALL_TYPES
+            )
+            logging.info(f"🪝 Webhook registered at {self.url}")
+        elif self.generated_secret:
+            logging.warning("⚠️ WEBHOOK_URL and WEBHOOK_SECRET are unset; no update will pass the secret check")
+
+    async def stop(self, timeout=10):
+        """Stops accepting updates and waits up to `timeout` seconds for in-flight requests."""
+        self.draining = True
+        if self._runner is not None:
+            # The webhook stays registered, so Telegram holds new updates until we are back
+            try:
+                await asyncio.wait_for(self._runner.cleanup(), timeout)
+            except asyncio.TimeoutError:
+                # A hung request must not stop the rest of the shutdown
+                logging.warning(f"⚠️ Webhook requests still running after {timeout}s; closing anyway")
+            self._runner = None
+
+    async def health(self, request):
+        return web.json_response({'status': 'draining' if self.draining else 'ok', 'received': self.received})
+
+    async def handle_update(self, request):
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret_token):
+            self.rejected += 1
+            return web.Response(status=403)
+        if self.draining:
+            # Telegram retries non-2xx answers, so nothing is lost during shutdown
+            return web.Response(status=503)
+
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except (json.JSONDecodeError, TypeError, KeyError, ValueError) as e:
+            logging.warning(f"⚠️ Invalid webhook payload: {e}")
+            return web.Response(status=400)
+
+        self.received += 1
+        await self.application.update_queue.put(update)
+        return web.Response()